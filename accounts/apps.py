@@ -2,3 +2,14 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "accounts"
+
+    def ready(self):
+        from django.contrib.auth import get_user_model
+        from django.db.models.signals import post_delete, post_save
+        from rest_framework.authtoken.models import Token
+        from .authentication import invalidate_token, invalidate_user
+
+        post_save.connect(invalidate_token, sender=Token, dispatch_uid='auth_cache_token_save')
+        post_delete.connect(invalidate_token, sender=Token, dispatch_uid='auth_cache_token_delete')
+        post_save.connect(invalidate_user, sender=get_user_model(), dispatch_uid='auth_cache_user_save')
+        post_delete.connect(invalidate_user, sender=get_user_model(), dispatch_uid='auth_cache_user_delete')
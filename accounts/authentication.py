@@ -0,0 +1,75 @@
+"""
+Token and JWT authentication that remember who a credential belongs to, so
+authenticated requests (the dashboard polls every second) skip the Token +
+User query. Entries are dropped when a token is created, rotated or deleted
+and when a user is saved or deleted; AUTH_CACHE['TTL'] bounds how long
+other worker processes can lag behind such a change.
+"""
+import copy
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from stocks.cache import TTLCache
+
+_auth_settings = getattr(settings, 'AUTH_CACHE', {})
+
+# ('token', key) -> (user, token); ('user', id) -> user
+auth_cache = TTLCache(
+    ttl=_auth_settings.get('TTL', 60),
+    maxsize=_auth_settings.get('MAXSIZE', 10000),
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        def fetch():
+            token = self.get_model().objects.select_related('user').filter(key=key).first()
+            return None if token is None else (token.user, token)
+
+        found = auth_cache.get(('token', key), fetch)
+        if found is None:
+            raise AuthenticationFailed(_('Invalid token.'))
+        user, token = found
+        if not user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        # Each request gets its own copy: views may change request.user
+        return copy.copy(user), token
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError:
+            return super().get_user(validated_token)  # raises the usual InvalidToken
+
+        user = auth_cache.get(
+            ('user', str(user_id)),
+            lambda: self.user_model.objects.filter(**{jwt_settings.USER_ID_FIELD: user_id}).first(),
+        )
+        if user is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        if jwt_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if jwt_settings.CHECK_REVOKE_TOKEN and (
+                validated_token.get(jwt_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password)):
+            raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        return copy.copy(user)
+
+
+def invalidate_token(sender, instance, **kwargs):
+    auth_cache.invalidate(('token', instance.key))
+
+
+def invalidate_user(sender, instance, **kwargs):
+    auth_cache.invalidate(('user', str(getattr(instance, jwt_settings.USER_ID_FIELD))))
+    # Token entries hold a copy of the user too (is_active, email...)
+    for key in Token.objects.filter(user_id=instance.pk).values_list('key', flat=True):
+        auth_cache.invalidate(('token', key))
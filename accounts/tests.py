@@ -1,3 +1,51 @@
 from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
 
-# Create your tests here.
+from stocks.models import User
+from .authentication import auth_cache
+
+# Needs exactly one query of its own once the caller is authenticated
+HOT_ENDPOINT = '/api/portfolio/history/'
+
+
+class CachedAuthenticationTests(TestCase):
+    def setUp(self):
+        auth_cache.invalidate()
+        self.user = User.objects.create_user(email='auth@example.com', password='secret')
+        self.client = APIClient()
+
+    def test_token_lookups_are_cached_until_the_token_or_user_changes(self):
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(HOT_ENDPOINT).status_code, 200)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(HOT_ENDPOINT).status_code, 200)
+
+        token.delete()
+        new_token = Token.objects.create(user=self.user)
+        self.assertEqual(self.client.get(HOT_ENDPOINT).status_code, 401)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {new_token.key}')
+        self.assertEqual(self.client.get(HOT_ENDPOINT).status_code, 200)
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(HOT_ENDPOINT).status_code, 401)
+
+    def test_login_token_works_with_the_cache(self):
+        response = self.client.post('/api/accounts/login/', {'email': 'auth@example.com', 'password': 'secret'})
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {response.json()["token"]}')
+        self.assertEqual(self.client.get(HOT_ENDPOINT).status_code, 200)
+
+    def test_jwt_user_lookups_are_cached(self):
+        access = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(self.client.get(HOT_ENDPOINT).status_code, 200)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(HOT_ENDPOINT).status_code, 200)
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(HOT_ENDPOINT).status_code, 401)
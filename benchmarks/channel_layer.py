@@ -0,0 +1,95 @@
+"""
+SQLiteChannelLayer throughput with 1, 4 and 8 worker processes on one file.
+
+point-to-point: every worker sends --messages messages to the next worker's
+                channel (a ring) while receiving its own.
+fan-out:        every worker joins one group; worker 0 group_sends
+                --messages messages and each worker receives all of them.
+
+    python benchmarks/channel_layer.py [--workers 1 4 8] [--messages 2000]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import time
+
+from common import setup_django
+
+
+async def ring(path, index, workers, messages, names, barrier):
+    from stocks.channel_layers import SQLiteChannelLayer
+
+    layer = SQLiteChannelLayer(path, capacity=messages, poll_interval=0.005)
+    names[index] = await layer.new_channel()
+    await asyncio.to_thread(barrier.wait)
+    target = names[(index + 1) % workers]
+
+    async def produce():
+        for i in range(messages):
+            await layer.send(target, {'type': 'tick', 'n': i})
+
+    async def consume():
+        for _ in range(messages):
+            await layer.receive(names[index])
+
+    await asyncio.gather(produce(), consume())
+    await layer.close()
+
+
+async def fan_out(path, index, messages, barrier):
+    from stocks.channel_layers import SQLiteChannelLayer
+
+    layer = SQLiteChannelLayer(path, capacity=messages, poll_interval=0.005)
+    channel = await layer.new_channel()
+    await layer.group_add('quote.BENCH', channel)
+    await asyncio.to_thread(barrier.wait)
+    if index == 0:
+        for i in range(messages):
+            await layer.group_send('quote.BENCH', {'type': 'price.update', 'price': i})
+    for _ in range(messages):
+        await layer.receive(channel)
+    await layer.close()
+
+
+def worker(mode, path, index, workers, messages, names, barrier):
+    setup_django()
+    if mode == 'ring':
+        asyncio.run(ring(path, index, workers, messages, names, barrier))
+    else:
+        asyncio.run(fan_out(path, index, messages, barrier))
+
+
+def run(mode, workers, messages):
+    ctx = multiprocessing.get_context('fork')
+    path = os.path.join(tempfile.mkdtemp(), 'channels.sqlite3')
+    names = ctx.Manager().list([None] * workers)
+    barrier = ctx.Barrier(workers + 1)
+    procs = [ctx.Process(target=worker, args=(mode, path, i, workers, messages, names, barrier))
+             for i in range(workers)]
+    for p in procs:
+        p.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - started
+    return workers * messages / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--messages', type=int, default=2000, help='per worker')
+    args = parser.parse_args()
+
+    print(f'{"workers":>7} {"point-to-point":>16} {"fan-out":>16}   (messages delivered/s)')
+    for workers in args.workers:
+        p2p = run('ring', workers, args.messages)
+        fan = run('fan', workers, args.messages)
+        print(f'{workers:>7} {p2p:>16,.0f} {fan:>16,.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+"""
+Per-row Decimal charges vs the NumPy batch engine.
+
+    python benchmarks/charges.py [rows]
+"""
+import random
+import sys
+
+from common import best_of, setup_django
+
+setup_django()
+
+from decimal import Decimal  # noqa: E402
+
+from stocks.charges import charges_batch, charges_for, rates_for  # noqa: E402
+
+
+def main(rows=200_000):
+    rng = random.Random(42)
+    prices = [rng.randint(100, 500_000) for _ in range(rows)]      # paise
+    quantities = [rng.randint(100, 200_000) for _ in range(rows)]  # hundredths
+    buys = [rng.random() < 0.5 for _ in range(rows)]
+    rates = rates_for()
+
+    decimal_prices = [Decimal(p).scaleb(-2) for p in prices]
+    decimal_quantities = [Decimal(q).scaleb(-2) for q in quantities]
+
+    def per_row():
+        for price, quantity, buy in zip(decimal_prices, decimal_quantities, buys):
+            charges_for(price, quantity, 'BUY' if buy else 'SELL', rates)
+
+    def batch():
+        charges_batch(prices, quantities, buys, rates)
+
+    row_time = best_of(per_row, repeat=3)
+    batch_time = best_of(batch, repeat=3)
+    print(f"rows:            {rows:,}")
+    print(f"per-row Decimal: {rows / row_time:14,.0f} rows/s")
+    print(f"NumPy batch:     {rows / batch_time:14,.0f} rows/s  ({row_time / batch_time:.0f}x)")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
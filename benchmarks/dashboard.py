@@ -0,0 +1,65 @@
+"""
+Async DashboardView under concurrency: N dashboards served by one event
+loop while every quote batch takes --latency seconds upstream.
+
+    python benchmarks/dashboard.py [--users 20] [--holdings 5] [--latency 0.2]
+"""
+import argparse
+import asyncio
+import time
+from decimal import Decimal
+from unittest import mock
+
+from common import setup_django, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--holdings', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.2)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.test import AsyncClient, override_settings
+    from rest_framework.authtoken.models import Token
+    from stocks.cache import quote_cache
+    from stocks.models import Portfolio, Stock, User
+
+    def slow_quotes(pairs, max_staleness=None):
+        time.sleep(args.latency)
+        return {symbol: 100.0 for symbol, _ in pairs}
+
+    with test_database():
+        stocks = [Stock.objects.create(symbol=f'B{i}.NS', name=f'Bench {i}') for i in range(args.holdings)]
+        tokens = []
+        for u in range(args.users):
+            user = User.objects.create_user(email=f'bench{u}@example.com', password='x')
+            Portfolio.objects.bulk_create([Portfolio(user=user, stock=s, quantity=Decimal('1'),
+                                                     average_price=Decimal('90')) for s in stocks])
+            tokens.append(Token.objects.create(user=user).key)
+
+        async def dashboard(token):
+            return await AsyncClient().get('/api/dashboard/', headers={'Authorization': f'Token {token}'})
+
+        async def run_all():
+            return await asyncio.gather(*(dashboard(t) for t in tokens))
+
+        # One symbol per batch, so a sequential page would wait holdings x latency
+        with mock.patch('stocks.utils.get_live_stock_prices', side_effect=slow_quotes), \
+                mock.patch('stocks.utils.QUOTE_BATCH_SIZE', 1), \
+                override_settings(QUOTE_CACHE={**settings.QUOTE_CACHE, 'DEADLINE': 5}):
+            quote_cache.invalidate()
+            started = time.perf_counter()
+            responses = asyncio.run(run_all())
+            elapsed = time.perf_counter() - started
+
+    assert all(r.status_code == 200 for r in responses), [r.status_code for r in responses]
+    sequential = args.users * args.holdings * args.latency
+    print(f'{args.users} dashboards x {args.holdings} holdings, {args.latency * 1000:.0f}ms per quote batch')
+    print(f'one event loop: {elapsed:.2f}s   (one-at-a-time sequential fetches: {sequential:.1f}s)')
+
+
+if __name__ == '__main__':
+    main()
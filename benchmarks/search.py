@@ -0,0 +1,41 @@
+"""
+search_stocks: in-memory ranked index vs the old icontains ORM query,
+over the NSE list in stocks/EQUITY_L.csv.
+
+    python benchmarks/search.py
+"""
+import csv
+import os
+
+from common import ROOT, best_of, setup_django, test_database
+
+QUERIES = ['i', 'ta', 'infy', 'tata mot', 'bank', 'reliance', 'pharma', 'ltd', 'zzzz']
+
+
+def main():
+    setup_django()
+    from django.db.models import Q
+    from stocks.models import Stock
+    from stocks.search import StockIndex, search_stocks, stock_index
+
+    with test_database():
+        with open(os.path.join(ROOT, 'stocks', 'EQUITY_L.csv'), newline='', encoding='utf-8-sig') as f:
+            rows = [{k.strip(): v for k, v in row.items() if k} for row in csv.DictReader(f)]
+        Stock.objects.bulk_create(
+            [Stock(symbol=row['SYMBOL'] + '.NS', name=row['NAME OF COMPANY']) for row in rows],
+            batch_size=500,
+        )
+        catalog = list(Stock.objects.values_list('id', 'symbol', 'name'))
+        print(f'{len(catalog)} stocks, index build {best_of(lambda: StockIndex(catalog), 3) * 1000:.1f} ms\n')
+        index = stock_index.get()
+
+        print(f'{"query":<10} {"ORM":>10} {"index":>10} {"index+fetch":>12}')
+        for query in QUERIES:
+            orm = best_of(lambda: list(Stock.objects.filter(Q(name__icontains=query) | Q(symbol__icontains=query))[:20]), 20)
+            lookup = best_of(lambda: index.search(query, 20), 200)
+            fetched = best_of(lambda: search_stocks(query, 20), 20)
+            print(f'{query:<10} {orm * 1e6:>8.0f}us {lookup * 1e6:>8.0f}us {fetched * 1e6:>10.0f}us')
+
+
+if __name__ == '__main__':
+    main()
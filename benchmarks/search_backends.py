@@ -0,0 +1,63 @@
+"""
+search_stocks backends at catalog sizes of 2k, 20k and 200k instruments:
+the old icontains ORM query, the in-memory index and the database backend
+(FTS5 on SQLite, pg_trgm on Postgres). Catalogs beyond the NSE list are
+synthesized from it as numbered series with BSE-style numeric codes.
+
+    python benchmarks/search_backends.py [--sizes 2000 20000 200000]
+"""
+import argparse
+import csv
+import os
+
+from common import ROOT, best_of, setup_django, test_database
+
+QUERIES = ['infy', 'tata mot', 'bank', 'relaince', 'pharma', 'zzzz']
+
+
+def catalog(size):
+    with open(os.path.join(ROOT, 'stocks', 'EQUITY_L.csv'), newline='', encoding='utf-8-sig') as f:
+        nse = [(row['SYMBOL'] + '.NS', row['NAME OF COMPANY']) for row in csv.DictReader(f)]
+    rows = nse[:size]
+    series = 1
+    while len(rows) < size:
+        for _, name in nse:
+            if len(rows) >= size:
+                break
+            rows.append((f'{len(rows):06d}.BO', f'{name} Series {series}'))
+        series += 1
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[2000, 20000, 200000])
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db.models import Q
+    from stocks.models import Stock
+    from stocks.search import database_search, stock_index
+
+    with test_database() as connection:
+        print(f'backend: {connection.vendor}')
+        for size in args.sizes:
+            Stock.objects.all().delete()
+            Stock.objects.bulk_create([Stock(symbol=s, name=n) for s, n in catalog(size)], batch_size=2000)
+            stock_index.invalidate()
+            index = stock_index.get()
+
+            print(f'\n{size} stocks\n{"query":<10} {"ORM":>10} {"memory":>10} {"database":>10}  top database hit')
+            for query in QUERIES:
+                orm = best_of(lambda: list(
+                    Stock.objects.filter(Q(name__icontains=query) | Q(symbol__icontains=query))
+                    .values_list('id', flat=True)[:20]), 10)
+                memory = best_of(lambda: index.search(query, 20), 10)
+                database = best_of(lambda: database_search.search(query, 20), 10)
+                hits = database_search.search(query, 1)
+                top = Stock.objects.get(pk=hits[0]).name if hits else '-'
+                print(f'{query:<10} {orm * 1e3:>8.2f}ms {memory * 1e3:>8.2f}ms {database * 1e3:>8.2f}ms  {top}')
+
+
+if __name__ == '__main__':
+    main()
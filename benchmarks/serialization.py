@@ -0,0 +1,58 @@
+"""
+Serializing a page of --rows transactions (and stocks) to JSON bytes:
+ModelSerializer + DRF's JSONRenderer against the read-only list serializers
++ FastJSONRenderer (orjson when installed). Rows are read from a throwaway
+database first, so both paths see the same column-scaled Decimals.
+
+    python benchmarks/serialization.py [--rows 1000]
+"""
+import argparse
+from datetime import timedelta
+from decimal import Decimal
+
+from common import best_of, setup_django, test_database
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.utils import timezone
+    from rest_framework.renderers import JSONRenderer
+    from stocks import renderers
+    from stocks.models import Stock, Transaction, User
+    from stocks.serializers import (StockListSerializer, StockSerializer, TransactionListSerializer,
+                                    TransactionSerializer)
+
+    with test_database():
+        user = User.objects.create_user(email='bench@example.com', password='x')
+        Stock.objects.bulk_create([Stock(symbol=f'B{i}.NS', name=f'Bench Industries {i} Limited',
+                                         current_price=Decimal(i) + Decimal('0.35')) for i in range(args.rows)])
+        stocks = list(Stock.objects.all())
+        now = timezone.now()
+        Transaction.objects.bulk_create([
+            Transaction(user=user, stock=stocks[i % len(stocks)], transaction_type='BUY' if i % 3 else 'SELL',
+                        quantity=Decimal(i % 50 + 1), price=Decimal('1234.55'), date=now - timedelta(minutes=i),
+                        brokerage=Decimal('20'), stt=Decimal('1.23'), gst=Decimal('3.60'),
+                        sebi_charges=Decimal('0.01'), stamp_duty=Decimal('0.19'))
+            for i in range(args.rows)
+        ])
+        trades = list(Transaction.objects.all())
+
+    print(f'orjson: {"yes" if renderers.orjson else "no (stdlib fallback)"}')
+    print(f'{args.rows} rows       {"serialize":>10} {"render":>10} {"total":>10}')
+    for label, rows, slow, fast in (('transactions', trades, TransactionSerializer, TransactionListSerializer),
+                                    ('stocks', stocks, StockSerializer, StockListSerializer)):
+        for name, serializer, renderer in (('default', slow, JSONRenderer()),
+                                           ('fast', fast, renderers.FastJSONRenderer())):
+            data = serializer(rows, many=True).data
+            serialize = best_of(lambda: serializer(rows, many=True).data)
+            render = best_of(lambda: renderer.render(data))
+            print(f'{label:<12} {name:<7} {serialize * 1000:>8.1f}ms {render * 1000:>8.1f}ms '
+                  f'{(serialize + render) * 1000:>8.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
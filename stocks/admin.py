@@ -3,11 +3,16 @@ from django.contrib import admin
 # Register your models here.
 
 from django.contrib import admin
-from .models import User, Stock, Transaction, Portfolio, CapitalGains, Watchlist
+from .models import User, Stock, Transaction, Portfolio, CapitalGains, Watchlist, TaxLot, RealizedGain, CapitalGainsYear, PriceBar, PortfolioSnapshot
 
 admin.site.register(User)
 admin.site.register(Stock)
 admin.site.register(Transaction)
 admin.site.register(Portfolio)
 admin.site.register(CapitalGains)
-admin.site.register(Watchlist)
\ No newline at end of file
+admin.site.register(Watchlist)
+admin.site.register(TaxLot)
+admin.site.register(RealizedGain)
+admin.site.register(CapitalGainsYear)
+admin.site.register(PriceBar)
+admin.site.register(PortfolioSnapshot)
\ No newline at end of file
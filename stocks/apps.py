@@ -4,3 +4,20 @@ from django.apps import AppConfig
 class StocksConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "stocks"
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_migrate, post_save
+        from .models import Stock
+        from .search import invalidate_stock_index
+
+        post_save.connect(invalidate_stock_index, sender=Stock, dispatch_uid='stock_search_index_save')
+        post_delete.connect(invalidate_stock_index, sender=Stock, dispatch_uid='stock_search_index_delete')
+        post_migrate.connect(restore_search_triggers, sender=self, dispatch_uid='stock_search_triggers')
+
+
+def restore_search_triggers(using, **kwargs):
+    """SQLite drops stocks_stock's FTS triggers when a migration rebuilds the table."""
+    from django.db import connections
+    from .search_schema import ensure_search_triggers
+
+    ensure_search_triggers(connections[using])
@@ -0,0 +1,156 @@
+"""
+One polling loop for live prices, however many dashboards are open.
+
+WebSocket consumers tell the broadcaster which symbols they watch by sending
+`subscribe` / `unsubscribe` messages to the BROADCASTER_CHANNEL channel.
+Every PRICE_BROADCASTER['INTERVAL'] seconds the broadcaster fetches each
+watched symbol once, through the configured price source, and group_sends
+one `price.update` message per changed price to that symbol's group
+(`quote_group`), so only connections watching the symbol receive it.
+
+Run it with `manage.py run_price_broadcaster`, or let the first dashboard
+connection start it inside the ASGI process (PRICE_BROADCASTER['IN_PROCESS'],
+needed while CHANNEL_LAYERS is the in-memory layer).
+"""
+import asyncio
+import logging
+import re
+import time
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .cache import quote_cache
+from .utils import QUOTE_BATCH_SIZE, fetch_quotes, yahoo_ticker
+
+logger = logging.getLogger(__name__)
+
+BROADCASTER_CHANNEL = 'price-broadcaster'
+_GROUP_UNSAFE = re.compile(r'[^A-Za-z0-9.\-]')
+
+
+def quote_group(symbol):
+    """Group for one symbol's ticks: quote.RELIANCE.NS, quote.M_26M.NS for M&M.NS."""
+    return 'quote.' + _GROUP_UNSAFE.sub(lambda m: '_%02X' % ord(m.group()), symbol)
+
+
+class YahooPriceSource:
+    """Latest closes from yfinance, one multi-ticker download per batch."""
+
+    async def fetch(self, symbols):
+        return await asyncio.to_thread(self.fetch_sync, symbols)
+
+    def fetch_sync(self, symbols):
+        tickers = {yahoo_ticker(symbol): symbol for symbol in symbols}
+        names = list(tickers)
+        prices = {}
+        for i in range(0, len(names), QUOTE_BATCH_SIZE):
+            chunk = names[i:i + QUOTE_BATCH_SIZE]
+            try:
+                found = fetch_quotes(chunk)
+            except Exception as e:
+                logger.warning('Error fetching prices for %s: %s', ', '.join(chunk), e)
+                continue
+            for ticker, price in found.items():
+                # Keeps HTTP reads in this process from refetching
+                quote_cache.set(ticker, price)
+                prices[tickers[ticker]] = price
+        return prices
+
+
+class PriceBroadcaster:
+    def __init__(self, source=None, layer=None, interval=None, lease=None, clock=time.monotonic):
+        config = settings.PRICE_BROADCASTER
+        self.source = source or import_string(config['SOURCE'])()
+        self.layer = layer or get_channel_layer()
+        self.interval = config['INTERVAL'] if interval is None else interval
+        # Subscriptions not renewed within `lease` seconds are dropped, so a
+        # worker that dies without unsubscribing doesn't keep symbols polled
+        self.lease = config['LEASE'] if lease is None else lease
+        self._clock = clock
+        self.subscribers = {}  # symbol -> {channel_name: lease expiry}
+        self.last_prices = {}
+
+    async def handle(self, message):
+        channel = message['channel']
+        symbols = message.get('symbols', ())
+        if message['type'] == 'subscribe':
+            expires = self._clock() + self.lease
+            for symbol in symbols:
+                channels = self.subscribers.setdefault(symbol, {})
+                joined = channel not in channels
+                channels[channel] = expires
+                # Late joiners get the last price now rather than on the next change
+                if joined and symbol in self.last_prices:
+                    await self.layer.send(channel, self.update(symbol, self.last_prices[symbol]))
+        elif message['type'] == 'unsubscribe':
+            for symbol in symbols or list(self.subscribers):
+                self.subscribers.get(symbol, {}).pop(channel, None)
+
+    @staticmethod
+    def update(symbol, price):
+        return {'type': 'price.update', 'symbol': symbol, 'price': price}
+
+    def watched(self):
+        """Symbols with at least one live subscriber; expired leases are pruned."""
+        now = self._clock()
+        for symbol in list(self.subscribers):
+            channels = self.subscribers[symbol]
+            for channel in [c for c, expires in channels.items() if expires < now]:
+                del channels[channel]
+            if not channels:
+                del self.subscribers[symbol]
+                self.last_prices.pop(symbol, None)
+        return sorted(self.subscribers)
+
+    async def tick(self):
+        """Poll every watched symbol once. Returns the number of updates published."""
+        symbols = self.watched()
+        if not symbols:
+            return 0
+        prices = await self.source.fetch(symbols)
+        published = 0
+        for symbol in symbols:
+            price = prices.get(symbol)
+            if price is None or self.last_prices.get(symbol) == price:
+                continue
+            self.last_prices[symbol] = price
+            await self.layer.group_send(quote_group(symbol), self.update(symbol, price))
+            published += 1
+        return published
+
+    async def listen(self):
+        while True:
+            message = await self.layer.receive(BROADCASTER_CHANNEL)
+            try:
+                await self.handle(message)
+            except Exception:
+                logger.exception('Bad broadcaster message %r', message)
+
+    async def run(self):
+        listener = asyncio.create_task(self.listen())
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                started = loop.time()
+                try:
+                    await self.tick()
+                except Exception:
+                    logger.exception('Price broadcaster tick failed')
+                await asyncio.sleep(max(0.0, self.interval - (loop.time() - started)))
+        finally:
+            listener.cancel()
+
+
+_in_process = None
+
+
+def ensure_broadcaster():
+    """Start the broadcaster on the running event loop, once, if configured to."""
+    global _in_process
+    if not settings.PRICE_BROADCASTER['IN_PROCESS']:
+        return None
+    if _in_process is None or _in_process.done():
+        _in_process = asyncio.get_running_loop().create_task(PriceBroadcaster().run())
+    return _in_process
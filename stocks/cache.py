@@ -0,0 +1,183 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class _Flight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries go stale after `ttl` seconds.
+
+    Stale entries are kept until they are evicted so callers can still
+    peek at the last known value. Concurrent misses for the same key are
+    coalesced: one caller runs the fetch, the others wait for its result.
+    """
+
+    def __init__(self, ttl=15, maxsize=1024, clock=time.monotonic):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._clock = clock
+        self._data = OrderedDict()  # key -> (value, stored_at)
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def _fresh(self, key, max_staleness):
+        entry = self._data.get(key)
+        if entry is None:
+            return False, None
+        limit = self.ttl if max_staleness is None else max_staleness
+        if self._clock() - entry[1] > limit:
+            return False, None
+        self._data.move_to_end(key)
+        return True, entry[0]
+
+    def _store(self, key, value):
+        self._data[key] = (value, self._clock())
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key, fetch, max_staleness=None):
+        """
+        Return the cached value for `key`, calling `fetch()` on a miss.
+
+        `max_staleness` (seconds) overrides the cache TTL for this read.
+        A `None` result from `fetch` is handed back but not cached.
+        """
+        with self._lock:
+            found, value = self._fresh(key, max_staleness)
+            if found:
+                self.hits += 1
+                return value
+            self.misses += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = fetch()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if flight.error is None and flight.value is not None:
+                    self._store(key, flight.value)
+                del self._flights[key]
+            flight.event.set()
+        return flight.value
+
+    def get_many(self, keys, fetch_many, max_staleness=None):
+        """
+        Batch form of `get`. `fetch_many(missing_keys)` must return a dict of
+        the values it could resolve; keys it leaves out are simply absent
+        from the result. Keys already being fetched by another caller are
+        waited on rather than fetched again.
+        """
+        results = {}
+        leading = {}
+        waiting = {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                found, value = self._fresh(key, max_staleness)
+                if found:
+                    self.hits += 1
+                    results[key] = value
+                    continue
+                self.misses += 1
+                flight = self._flights.get(key)
+                if flight is None:
+                    leading[key] = self._flights[key] = _Flight()
+                else:
+                    self.coalesced += 1
+                    waiting[key] = flight
+
+        if leading:
+            fetched = {}
+            error = None
+            try:
+                fetched = fetch_many(list(leading)) or {}
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                with self._lock:
+                    for key, flight in leading.items():
+                        flight.error = error
+                        flight.value = fetched.get(key)
+                        if flight.value is not None:
+                            self._store(key, flight.value)
+                        del self._flights[key]
+                for flight in leading.values():
+                    flight.event.set()
+            results.update((k, v) for k, v in fetched.items() if k in leading and v is not None)
+
+        for key, flight in waiting.items():
+            flight.event.wait()
+            if flight.error is None and flight.value is not None:
+                results[key] = flight.value
+        return results
+
+    def peek(self, key):
+        """Return `(value, age_in_seconds)` for `key`, stale or not, or `(None, None)`."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None, None
+            return entry[0], self._clock() - entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._store(key, value)
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+            }
+
+
+_quote_settings = getattr(settings, 'QUOTE_CACHE', {})
+
+# Shared by every live price lookup, keyed by Yahoo ticker (e.g. "RELIANCE.NS")
+quote_cache = TTLCache(
+    ttl=_quote_settings.get('TTL', 15),
+    maxsize=_quote_settings.get('MAXSIZE', 4096),
+)
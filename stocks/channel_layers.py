@@ -0,0 +1,290 @@
+"""
+A channel layer for several ASGI worker processes on one host, with no
+broker: messages and group memberships live in a shared SQLite file in WAL
+mode. Same semantics as the in-memory layer: groups, per-channel capacity
+(ChannelFull on send, silently skipped by group_send), message and group
+expiry.
+
+    CHANNEL_LAYERS = {'default': {
+        'BACKEND': 'stocks.channel_layers.SQLiteChannelLayer',
+        'CONFIG': {'path': BASE_DIR / 'channels.sqlite3'},
+    }}
+
+Each process polls the file once for all of its own consumer channels
+(new_channel() names are tagged with a per-process prefix) and hands the
+messages out through local queues, so polling cost doesn't grow with the
+number of open sockets. Named channels such as the price broadcaster's are
+polled directly. Idle polling backs off to `poll_interval` seconds. Local
+queues are dropped once idle; a channel left with an expired message and
+nobody receiving (its consumer died without group_discard) also leaves its
+groups.
+
+Message bodies are pickled: only point `path` at a file the app user alone
+can write.
+"""
+import asyncio
+import pickle
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS channel_messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    channel TEXT NOT NULL,
+    owner TEXT NOT NULL,  -- who receives it: the channel, or "prefix.<process>!" for process-specific ones
+    body BLOB NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS channel_messages_owner ON channel_messages (owner, id);
+CREATE INDEX IF NOT EXISTS channel_messages_channel ON channel_messages (channel, expires);
+CREATE INDEX IF NOT EXISTS channel_messages_expires ON channel_messages (expires);
+CREATE TABLE IF NOT EXISTS channel_groups (
+    grp TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    expires REAL NOT NULL,
+    PRIMARY KEY (grp, channel)
+) WITHOUT ROWID;
+"""
+
+# Insert only while the channel holds fewer than `capacity` live messages
+INSERT_BOUNDED = """
+INSERT INTO channel_messages (channel, owner, body, expires)
+SELECT ?, ?, ?, ? WHERE (
+    SELECT COUNT(*) FROM channel_messages WHERE channel = ? AND expires > ?
+) < ?
+"""
+
+MIN_POLL = 0.001
+DRAIN_BATCH = 1000
+
+
+class SQLiteChannelLayer(BaseChannelLayer):
+    extensions = ['groups', 'flush']
+
+    def __init__(self, path, expiry=60, group_expiry=86400, capacity=100, channel_capacity=None,
+                 poll_interval=0.05, **kwargs):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity, **kwargs)
+        self.channel_capacity = self.compile_capacities(self.channel_capacity)
+        self.path = str(path)
+        self.group_expiry = group_expiry
+        self.poll_interval = poll_interval
+        self.client_prefix = uuid.uuid4().hex
+        # One thread owns the connection; SQLite calls never block the event loop
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite-channel-layer')
+        self._db = None
+        self._next_cleanup = 0.0
+        self._owners = set()  # non-local names of this process's channels
+        self._local = {}  # channel -> asyncio.Queue of (expires, message)
+        self._waiting = {}  # channel -> receive() calls awaiting its local queue
+        self._next_local_cleanup = 0.0
+        self._pump = None
+
+    # Blocking side, run on the layer's thread
+
+    def _connection(self):
+        if self._db is None:
+            if sqlite3.sqlite_version_info < (3, 35):
+                raise RuntimeError('SQLiteChannelLayer needs SQLite 3.35+ (DELETE ... RETURNING)')
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.executescript(SCHEMA)
+            self._db = db
+        return self._db
+
+    def _cleanup(self, db, now):
+        if now >= self._next_cleanup:
+            self._next_cleanup = now + 1.0
+            db.execute('DELETE FROM channel_messages WHERE expires <= ?', (now,))
+            db.execute('DELETE FROM channel_groups WHERE expires <= ?', (now,))
+
+    def _send(self, channel, body):
+        db = self._connection()
+        now = time.time()
+        self._cleanup(db, now)
+        cursor = db.execute(INSERT_BOUNDED, (channel, self.non_local_name(channel), body, now + self.expiry,
+                                             channel, now, self.get_capacity(channel)))
+        return cursor.rowcount == 1
+
+    def _group_send(self, group, body):
+        db = self._connection()
+        now = time.time()
+        self._cleanup(db, now)
+        channels = [row[0] for row in db.execute(
+            'SELECT channel FROM channel_groups WHERE grp = ? AND expires > ?', (group, now))]
+        if channels:
+            expires = now + self.expiry
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                db.executemany(INSERT_BOUNDED, [
+                    (channel, self.non_local_name(channel), body, expires, channel, now, self.get_capacity(channel))
+                    for channel in channels
+                ])
+                db.execute('COMMIT')
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+
+    def _pop(self, owners, limit):
+        db = self._connection()
+        now = time.time()
+        marks = ','.join('?' * len(owners))
+        rows = db.execute(
+            f'DELETE FROM channel_messages WHERE id IN ('
+            f'SELECT id FROM channel_messages WHERE owner IN ({marks}) AND expires > ? ORDER BY id LIMIT ?'
+            f') RETURNING id, channel, body, expires',
+            (*owners, now, limit),
+        ).fetchall()
+        rows.sort()  # RETURNING order is unspecified
+        return [(channel, body, expires) for _, channel, body, expires in rows]
+
+    def _group_add(self, group, channel):
+        self._connection().execute(
+            'INSERT OR REPLACE INTO channel_groups (grp, channel, expires) VALUES (?, ?, ?)',
+            (group, channel, time.time() + self.group_expiry),
+        )
+
+    def _group_discard(self, group, channel):
+        self._connection().execute('DELETE FROM channel_groups WHERE grp = ? AND channel = ?', (group, channel))
+
+    def _forget_channels(self, channels):
+        marks = ','.join('?' * len(channels))
+        self._connection().execute(f'DELETE FROM channel_groups WHERE channel IN ({marks})', channels)
+
+    def _flush(self):
+        db = self._connection()
+        db.execute('DELETE FROM channel_messages')
+        db.execute('DELETE FROM channel_groups')
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    # Channel layer API
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), 'message is not a dict'
+        self.require_valid_channel_name(channel)
+        assert '__asgi_channel__' not in message
+        if not await self._run(self._send, channel, pickle.dumps(message)):
+            raise ChannelFull(channel)
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        if '!' in channel and self.non_local_name(channel) in self._owners:
+            return await self._receive_local(channel)
+
+        delay = MIN_POLL
+        while True:
+            rows = await self._run(self._pop, (self.non_local_name(channel),), 1)
+            if rows:
+                return pickle.loads(rows[0][1])
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.poll_interval)
+
+    async def _receive_local(self, channel):
+        self._ensure_pump()
+        queue = self._local.setdefault(channel, asyncio.Queue())
+        self._waiting[channel] = self._waiting.get(channel, 0) + 1
+        try:
+            while True:
+                expires, message = await queue.get()
+                if expires > time.time():
+                    return message
+        finally:
+            self._waiting[channel] -= 1
+            if not self._waiting[channel]:
+                del self._waiting[channel]
+
+    def _clean_local(self, now):
+        """
+        Like InMemoryChannelLayer._clean_expired for the local queues: drop
+        expired messages, and queues that are empty with no receive() waiting.
+        A channel whose message expired with nobody waiting belongs to a
+        consumer that is gone without a group_discard (it crashed): its queue
+        is dropped and its group memberships are returned for removal, so the
+        pump stops filling a queue nobody reads.
+        """
+        dead = []
+        for channel, queue in list(self._local.items()):
+            kept = []
+            expired = False
+            while not queue.empty():
+                item = queue.get_nowait()
+                if item[0] > now:
+                    kept.append(item)
+                else:
+                    expired = True
+            if channel in self._waiting:
+                for item in kept:
+                    queue.put_nowait(item)
+            elif expired:
+                del self._local[channel]
+                dead.append(channel)
+            elif kept:
+                for item in kept:
+                    queue.put_nowait(item)
+            else:
+                del self._local[channel]
+        return dead
+
+    def _ensure_pump(self):
+        loop = asyncio.get_running_loop()
+        if self._pump is None or self._pump.done() or self._pump.get_loop() is not loop:
+            self._pump = loop.create_task(self._run_pump())
+
+    async def _run_pump(self):
+        """Move this process's messages from the file into the local queues."""
+        delay = MIN_POLL
+        while True:
+            rows = await self._run(self._pop, tuple(self._owners), DRAIN_BATCH)
+            for channel, body, expires in rows:
+                queue = self._local.setdefault(channel, asyncio.Queue())
+                if queue.qsize() >= self.get_capacity(channel):
+                    queue.get_nowait()  # drop the oldest rather than grow without bound
+                queue.put_nowait((expires, pickle.loads(body)))
+            now = time.time()
+            if now >= self._next_local_cleanup:
+                self._next_local_cleanup = now + 1.0
+                dead = self._clean_local(now)
+                if dead:
+                    await self._run(self._forget_channels, dead)
+            if len(rows) < DRAIN_BATCH:
+                await asyncio.sleep(delay)
+                delay = MIN_POLL if rows else min(delay * 2, self.poll_interval)
+
+    async def new_channel(self, prefix='specific'):
+        owner = f'{prefix}.{self.client_prefix}!'
+        self._owners.add(owner)
+        return owner + uuid.uuid4().hex
+
+    async def flush(self):
+        await self._run(self._flush)
+        for channel in [c for c in self._local if c not in self._waiting]:
+            del self._local[channel]
+
+    async def close(self):
+        if self._pump is not None:
+            self._pump.cancel()
+        if self._db is not None:
+            await self._run(self._db.close)
+            self._db = None
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._run(self._group_add, group, channel)
+
+    async def group_discard(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        await self._run(self._group_discard, group, channel)
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), 'message is not a dict'
+        self.require_valid_group_name(group)
+        await self._run(self._group_send, group, pickle.dumps(message))
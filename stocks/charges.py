@@ -0,0 +1,169 @@
+"""
+Brokerage, STT, GST, SEBI and stamp duty for equity delivery trades.
+
+`charges_for` prices a single trade with Decimal arithmetic. `charges_batch`
+prices whole arrays of trades at once with NumPy int64 fixed-point math
+and returns exactly the same paise, including round-half-even ties.
+"""
+from collections import namedtuple
+from datetime import date, datetime
+from decimal import Decimal
+from fractions import Fraction
+
+import numpy as np
+
+CHARGE_FIELDS = ('brokerage', 'stt', 'gst', 'sebi_charges', 'stamp_duty')
+
+ChargeRates = namedtuple('ChargeRates', [
+    'version',
+    'effective_from',
+    'brokerage_rate',  # fraction of turnover...
+    'brokerage_cap',   # ...capped at this many rupees per order
+    'stt_rate',
+    'gst_rate',        # on brokerage
+    'sebi_rate',
+    'stamp_rate',      # BUY side only
+])
+
+# Oldest first. Add a row when a regulator changes a rate; trades are priced
+# with the version in force on their trade date.
+RATE_TABLE = [
+    ChargeRates(
+        version='v1',
+        effective_from=date(2000, 1, 1),
+        brokerage_rate=Decimal('0.0003'),
+        brokerage_cap=Decimal('20'),
+        stt_rate=Decimal('0.001'),
+        gst_rate=Decimal('0.18'),
+        sebi_rate=Decimal('10') / Decimal('10000000'),
+        stamp_rate=Decimal('0.00003'),
+    ),
+]
+
+
+def rates_for(when=None, table=None):
+    """The rate version in force on `when` (a date or datetime; default today)."""
+    table = table or RATE_TABLE
+    if when is None:
+        when = date.today()
+    elif isinstance(when, datetime):
+        when = when.date()
+    current = table[0]
+    for rates in table:
+        if rates.effective_from <= when:
+            current = rates
+    return current
+
+
+def charges_for(price, quantity, transaction_type, rates=None):
+    """Charges for one trade as a dict of Decimals rounded to paise."""
+    rates = rates or rates_for()
+    amount = Decimal(str(price)) * Decimal(str(quantity))
+
+    brokerage = min(rates.brokerage_cap, rates.brokerage_rate * amount)
+    stt = rates.stt_rate * amount
+    gst = rates.gst_rate * brokerage
+    sebi = rates.sebi_rate * amount
+    stamp = rates.stamp_rate * amount if transaction_type == 'BUY' else Decimal('0')
+
+    return {
+        'brokerage': round(brokerage, 2),
+        'stt': round(stt, 2),
+        'gst': round(gst, 2),
+        'sebi_charges': round(sebi, 2),
+        'stamp_duty': round(stamp, 2),
+    }
+
+
+def _ratio(value):
+    f = Fraction(value)
+    return f.numerator, f.denominator
+
+
+def _round_div(num, den):
+    """num / den rounded half-to-even, for non-negative int64 arrays and a positive int."""
+    q, r = np.divmod(num, den)
+    twice = 2 * r
+    return q + ((twice > den) | ((twice == den) & (q % 2 == 1)))
+
+
+# Largest numerator multiplier used below must keep amount * multiplier < 2**63
+_INT64_MAX = np.iinfo(np.int64).max
+
+
+def charges_batch(price_paise, quantity_hundredths, is_buy, rates=None):
+    """
+    Vectorized charges. Prices come in paise and quantities in hundredths
+    (both int64 arrays, i.e. the DecimalField values times 100). Returns
+    {field: int64 array of paise}. Rows whose turnover is too large for
+    exact int64 math come back as -1; `price_trades` reprices those with
+    `charges_for`.
+    """
+    rates = rates or rates_for()
+    price_paise = np.asarray(price_paise, dtype=np.int64)
+    quantity_hundredths = np.asarray(quantity_hundredths, dtype=np.int64)
+    is_buy = np.asarray(is_buy, dtype=bool)
+
+    # Turnover in units of 1/100 paise, so each charge in paise is turnover * rate / 100
+    bn, bd = _ratio(rates.brokerage_rate)
+    sn, sd = _ratio(rates.stt_rate)
+    gn, gd = _ratio(rates.gst_rate)
+    en, ed = _ratio(rates.sebi_rate)
+    mn, md = _ratio(rates.stamp_rate)
+    cn, cd = _ratio(rates.brokerage_cap * 100)
+    if cd != 1:
+        raise ValueError('Brokerage cap must be a whole number of paise')
+
+    brokerage_den = bd * 100
+    cap_num = cn * brokerage_den
+    limit = _INT64_MAX // max(bn * gn, sn, en, mn, 1)
+    safe = (price_paise.astype(np.float64) * quantity_hundredths < limit * 0.5) & (cap_num * gn < _INT64_MAX)
+
+    turnover = np.where(safe, price_paise, 0) * np.where(safe, quantity_hundredths, 0)
+    brokerage_num = np.minimum(turnover * bn, cap_num)
+
+    result = {
+        'brokerage': _round_div(brokerage_num, brokerage_den),
+        'stt': _round_div(turnover * sn, sd * 100),
+        'gst': _round_div(brokerage_num * gn, brokerage_den * gd),
+        'sebi_charges': _round_div(turnover * en, ed * 100),
+        'stamp_duty': np.where(is_buy, _round_div(turnover * mn, md * 100), 0),
+    }
+    for field in CHARGE_FIELDS:
+        result[field] = np.where(safe, result[field], -1)
+    return result
+
+
+def _hundredths(value):
+    return int(Decimal(str(value)).scaleb(2).to_integral_value())
+
+
+def price_trades(trades):
+    """
+    Set the five charge fields on every Transaction-like object in `trades`,
+    batching by rate version. Returns the list of objects whose charges changed.
+    """
+    by_version = {}
+    for trade in trades:
+        by_version.setdefault(rates_for(trade.date), []).append(trade)
+
+    changed = []
+    for rates, group in by_version.items():
+        paise = charges_batch(
+            [_hundredths(t.price) for t in group],
+            [_hundredths(t.quantity) for t in group],
+            [t.transaction_type == 'BUY' for t in group],
+            rates,
+        )
+        columns = [paise[field].tolist() for field in CHARGE_FIELDS]
+        for i, trade in enumerate(group):
+            row = [column[i] for column in columns]
+            if row[0] < 0:
+                values = charges_for(trade.price, trade.quantity, trade.transaction_type, rates)
+            else:
+                values = dict(zip(CHARGE_FIELDS, (Decimal(v).scaleb(-2) for v in row)))
+            if any(getattr(trade, field) != value for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(trade, field, value)
+                changed.append(trade)
+    return changed
@@ -1,18 +1,153 @@
+import asyncio
 import json
+from channels.db import database_sync_to_async
+from channels.exceptions import ChannelFull
 from channels.generic.websocket import AsyncWebsocketConsumer
-from .models import Portfolio
+from django.conf import settings
+from .broadcaster import BROADCASTER_CHANNEL, ensure_broadcaster, quote_group
+from .models import Portfolio, Stock
 from .services import get_live_stock_price
+from .throttling import UpstreamBusy
 from decimal import Decimal
 from datetime import date
 
+MAX_SYMBOLS = 200  # per connection
+
+
 class DashboardConsumer(AsyncWebsocketConsumer):
+    """
+    Live dashboard socket. Starts out watching the user's holdings; the client
+    can change that with {"action": "subscribe" | "unsubscribe", "symbols": [...]}.
+    Symbols that aren't in the Stock catalog are refused and listed back as
+    "unknown".
+    Price ticks are coalesced into at most one {"quotes": {symbol: price}}
+    frame per PRICE_BROADCASTER['FRAME_INTERVAL'] seconds. Any other message
+    gets a net worth snapshot back.
+    """
+
     async def connect(self):
-        if self.scope["user"].is_authenticated:
-            await self.accept()
-        else:
+        if not self.scope["user"].is_authenticated:
             await self.close()
+            return
+        await self.accept()
+
+        self.symbols = set()
+        self.pending = {}  # symbol -> latest price not yet sent
+        self.flusher = None
+        self.last_frame = float('-inf')
+
+        await self.subscribe(await self.held_symbols())
+        ensure_broadcaster()
+        self.renewal = asyncio.create_task(self.keep_subscribed())
+
+    async def disconnect(self, code):
+        renewal = getattr(self, 'renewal', None)
+        if renewal is None:
+            return
+        renewal.cancel()
+        if self.flusher is not None:
+            self.flusher.cancel()
+        await self.unsubscribe(set(self.symbols))
+
+    async def subscribe(self, symbols):
+        new = [s for s in symbols if s not in self.symbols][:MAX_SYMBOLS - len(self.symbols)]
+        for symbol in new:
+            await self.channel_layer.group_add(quote_group(symbol), self.channel_name)
+        self.symbols.update(new)
+        await self.tell_broadcaster('subscribe', new)
+
+    async def unsubscribe(self, symbols):
+        gone = [s for s in symbols if s in self.symbols]
+        for symbol in gone:
+            await self.channel_layer.group_discard(quote_group(symbol), self.channel_name)
+            self.symbols.discard(symbol)
+            self.pending.pop(symbol, None)
+        await self.tell_broadcaster('unsubscribe', gone)
+
+    async def tell_broadcaster(self, message_type, symbols):
+        if not symbols:
+            return
+        try:
+            await self.channel_layer.send(BROADCASTER_CHANNEL, {
+                'type': message_type,
+                'channel': self.channel_name,
+                'symbols': sorted(symbols),
+            })
+        except ChannelFull:
+            pass  # no broadcaster is draining the channel; nothing to tell
+
+    async def keep_subscribed(self):
+        while True:
+            await asyncio.sleep(settings.PRICE_BROADCASTER['LEASE'] / 3)
+            await self.tell_broadcaster('subscribe', self.symbols)
+
+    async def price_update(self, event):
+        if event["symbol"] not in self.symbols:
+            return
+        self.pending[event["symbol"]] = event["price"]
+        if self.flusher is None:
+            self.flusher = asyncio.create_task(self.flush())
+
+    async def flush(self):
+        """Send everything pending as one frame, no sooner than FRAME_INTERVAL after the last."""
+        loop = asyncio.get_running_loop()
+        try:
+            wait = self.last_frame + settings.PRICE_BROADCASTER['FRAME_INTERVAL'] - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            quotes, self.pending = self.pending, {}
+            if quotes:
+                self.last_frame = loop.time()
+                await self.send(json.dumps({"quotes": quotes}))
+        finally:
+            self.flusher = None
+        # Ticks that arrived during the send found a flusher running and left it to us
+        if self.pending:
+            self.flusher = asyncio.create_task(self.flush())
+
+    @database_sync_to_async
+    def known_symbols(self, symbols):
+        # Only catalog stocks: anything else would have the broadcaster poll arbitrary tickers
+        return set(Stock.objects.filter(symbol__in=symbols).values_list('symbol', flat=True))
+
+    @database_sync_to_async
+    def held_symbols(self):
+        return list(
+            Portfolio.objects.filter(user=self.scope["user"], quantity__gt=0)
+            .values_list('stock__symbol', flat=True)
+        )
 
     async def receive(self, text_data):
+        try:
+            message = json.loads(text_data or 'null')
+        except ValueError:
+            message = None
+        action = message.get('action') if isinstance(message, dict) else None
+
+        if action in ('subscribe', 'unsubscribe'):
+            symbols = message.get('symbols')
+            if not isinstance(symbols, list) or not all(
+                    isinstance(s, str) and 0 < len(s) <= Stock._meta.get_field('symbol').max_length for s in symbols):
+                await self.send(json.dumps({"error": "symbols must be a list of symbol strings"}))
+                return
+            symbols = list(dict.fromkeys(s.strip().upper() for s in symbols))[:MAX_SYMBOLS]
+            reply = {}
+            if action == 'subscribe':
+                known = await self.known_symbols(symbols)
+                await self.subscribe([s for s in symbols if s in known])
+                unknown = [s for s in symbols if s not in known]
+                if unknown:
+                    reply["unknown"] = unknown
+            else:
+                await self.unsubscribe(symbols)
+            await self.send(json.dumps({"subscribed": sorted(self.symbols), **reply}))
+            return
+
+        data = await self.dashboard_snapshot()
+        await self.send(json.dumps(data))
+
+    @database_sync_to_async
+    def dashboard_snapshot(self):
         user = self.scope["user"]
         portfolios = Portfolio.objects.filter(user=user, quantity__gt=0).select_related('stock')
 
@@ -22,13 +157,14 @@ class DashboardConsumer(AsyncWebsocketConsumer):
         today = date.today()
 
         for p in portfolios:
-            latest_price = get_live_stock_price(p.stock.symbol) or p.average_price
-            net_worth += p.quantity * latest_price
+            try:
+                latest_price = get_live_stock_price(p.stock.symbol) or p.average_price
+            except UpstreamBusy:
+                latest_price = p.average_price
+            net_worth += p.quantity * Decimal(str(latest_price))
 
-        data = {
+        return {
             "net_worth": float(net_worth),
             "todays_pnl": float(todays_pnl),
             "alerts": alerts or ["No alerts for today!"],
         }
-
-        await self.send(json.dumps(data))
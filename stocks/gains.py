@@ -0,0 +1,122 @@
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models import DecimalField, F, Value
+from django.utils import timezone
+
+from .models import CapitalGains, CapitalGainsYear, RealizedGain
+
+STCG_TAX_RATE = Decimal('0.15')
+LTCG_TAX_RATE = Decimal('0.10')
+LONG_TERM_DAYS = 365
+
+
+def financial_year(when):
+    """Indian financial year (April to March) a datetime falls in, e.g. "2025-26"."""
+    day = timezone.localtime(when).date() if timezone.is_aware(when) else when.date()
+    start = day.year if day.month >= 4 else day.year - 1
+    return f"{start}-{(start + 1) % 100:02d}"
+
+
+def realized_gain(sell_transaction, lot, quantity):
+    """Unsaved RealizedGain for selling `quantity` shares of `lot`."""
+    holding_days = max((sell_transaction.date - lot.acquired_at).days, 0)
+    return RealizedGain(
+        user_id=sell_transaction.user_id,
+        stock_id=sell_transaction.stock_id,
+        sell_transaction=sell_transaction,
+        lot=lot,
+        quantity=quantity,
+        buy_price=lot.cost,
+        sell_price=sell_transaction.price,
+        gain=((Decimal(str(sell_transaction.price)) - lot.cost) * quantity).quantize(Decimal('0.01')),
+        acquired_at=lot.acquired_at,
+        sold_at=sell_transaction.date,
+        holding_days=holding_days,
+        term='STCG' if holding_days < LONG_TERM_DAYS else 'LTCG',
+        financial_year=financial_year(sell_transaction.date),
+    )
+
+
+ROLLUP_FIELDS = ('realized_gain', 'short_term_gain', 'long_term_gain', 'tax_liability')
+
+
+def _upsert_rollup(model, key_fields, amounts):
+    """
+    Add {key values: (short_term, long_term)} to `model`'s rollup rows in one
+    INSERT ... ON CONFLICT DO UPDATE (SQLite 3.24+, PostgreSQL), creating
+    the rows that don't exist yet.
+    """
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    keys = [qn(model._meta.get_field(name).column) for name in key_fields]
+    columns = keys + [qn(name) for name in ROLLUP_FIELDS]
+    row = '(%s)' % ', '.join(['%s'] * len(columns))
+    params = []
+    for key, (short_term, long_term) in amounts.items():
+        params += [*key, short_term + long_term, short_term, long_term,
+                   short_term * STCG_TAX_RATE + long_term * LTCG_TAX_RATE]
+
+    def added(name):
+        return f'{table}.{qn(name)} + EXCLUDED.{qn(name)}'
+
+    # The SET expressions see the existing row, so tax is computed on the new totals
+    sql = (
+        f'INSERT INTO {table} ({", ".join(columns)}) VALUES {", ".join([row] * len(amounts))} '
+        f'ON CONFLICT ({", ".join(keys)}) DO UPDATE SET '
+        + ', '.join(f'{qn(name)} = {added(name)}' for name in ROLLUP_FIELDS[:3])
+        + f', {qn("tax_liability")} = ({added("short_term_gain")}) * %s + ({added("long_term_gain")}) * %s'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params + [STCG_TAX_RATE, LTCG_TAX_RATE])
+
+
+def _add_to_rollup(model, short_term, long_term, **lookup):
+    # Backends without ON CONFLICT: find or create the row, then add in place
+    row, _ = model.objects.get_or_create(**lookup)
+    money = DecimalField(max_digits=12, decimal_places=2)
+    model.objects.filter(pk=row.pk).update(
+        realized_gain=F('realized_gain') + Value(short_term + long_term, output_field=money),
+        short_term_gain=F('short_term_gain') + Value(short_term, output_field=money),
+        long_term_gain=F('long_term_gain') + Value(long_term, output_field=money),
+        tax_liability=(
+            (F('short_term_gain') + Value(short_term, output_field=money)) * Value(STCG_TAX_RATE, output_field=money)
+            + (F('long_term_gain') + Value(long_term, output_field=money)) * Value(LTCG_TAX_RATE, output_field=money)
+        ),
+    )
+
+
+def record_realized_gains(gains):
+    """
+    Append RealizedGain rows and fold them into the all-time CapitalGains and
+    per-financial-year CapitalGainsYear rollups.
+    """
+    if not gains:
+        return []
+    RealizedGain.objects.bulk_create(gains)
+
+    totals = {}
+    for g in gains:
+        key = (g.user_id, g.stock_id, g.financial_year)
+        short_term, long_term = totals.get(key, (Decimal('0'), Decimal('0')))
+        if g.term == 'STCG':
+            short_term += g.gain
+        else:
+            long_term += g.gain
+        totals[key] = (short_term, long_term)
+
+    if connection.features.supports_update_conflicts_with_target:
+        # One upsert per rollup table, however many positions and years the gains span
+        positions = {}
+        for (user_id, stock_id, year), (short_term, long_term) in totals.items():
+            st, lt = positions.get((user_id, stock_id), (Decimal('0'), Decimal('0')))
+            positions[(user_id, stock_id)] = (st + short_term, lt + long_term)
+        _upsert_rollup(CapitalGains, ('user', 'stock'), positions)
+        _upsert_rollup(CapitalGainsYear, ('user', 'stock', 'financial_year'), totals)
+        return gains
+
+    for (user_id, stock_id, year), (short_term, long_term) in totals.items():
+        _add_to_rollup(CapitalGains, short_term, long_term, user_id=user_id, stock_id=stock_id)
+        _add_to_rollup(CapitalGainsYear, short_term, long_term,
+                       user_id=user_id, stock_id=stock_id, financial_year=year)
+    return gains
@@ -0,0 +1,79 @@
+"""
+Reading stored PriceBars back out, coarser if asked: a 5m or 1d series is
+built from the finest stored interval that divides it, one pass over rows
+already in ts order, so nothing but the bar being built is held in memory.
+"""
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from .models import PriceBar
+
+INTERVALS = {'1m': 60, '5m': 300, '15m': 900, '1h': 3600, '1d': 86400}
+DAY = INTERVALS['1d']
+
+# How far back a request without ?from= reaches
+DEFAULT_SPAN = {
+    '1m': timedelta(days=1),
+    '5m': timedelta(days=5),
+    '15m': timedelta(days=15),
+    '1h': timedelta(days=60),
+    '1d': timedelta(days=365),
+}
+
+BAR_FIELDS = ('ts', 'open', 'high', 'low', 'close', 'volume')
+
+
+def source_interval(stock, interval, start, end):
+    """
+    The stored interval to read for `interval` bars between start and end:
+    the interval itself if there are bars for it, else the coarsest stored
+    interval that divides it evenly. One indexed EXISTS per candidate.
+    """
+    seconds = INTERVALS[interval]
+    candidates = sorted((name for name, s in INTERVALS.items() if s <= seconds and seconds % s == 0),
+                        key=INTERVALS.get, reverse=True)
+    bars = PriceBar.objects.filter(stock=stock, ts__gte=start, ts__lt=end)
+    for candidate in candidates:
+        if bars.filter(interval=candidate).exists():
+            return candidate
+    return interval
+
+
+def bucket_start(ts, seconds):
+    if seconds >= DAY:
+        # Daily bars follow the local calendar day, not UTC epoch days
+        day = timezone.localtime(ts).date()
+        return timezone.make_aware(datetime.combine(day, time()))
+    return ts - timedelta(seconds=ts.timestamp() % seconds)
+
+
+def downsample(rows, interval):
+    """Merge (ts, open, high, low, close, volume) rows, oldest first, into `interval` bars."""
+    seconds = INTERVALS[interval]
+    bar = None
+    for ts, open_, high, low, close, volume in rows:
+        start = bucket_start(ts, seconds)
+        if bar is not None and bar[0] == start:
+            bar[2] = max(bar[2], high)
+            bar[3] = min(bar[3], low)
+            bar[4] = close
+            bar[5] += volume
+            continue
+        if bar is not None:
+            yield tuple(bar)
+        bar = [start, open_, high, low, close, volume]
+    if bar is not None:
+        yield tuple(bar)
+
+
+def price_history(stock, interval, start, end, chunk_size=2000):
+    """Stream `interval` bars for start <= ts < end, downsampled from finer ones if needed."""
+    source = source_interval(stock, interval, start, end)
+    rows = (
+        PriceBar.objects.filter(stock=stock, interval=source, ts__gte=start, ts__lt=end)
+        .order_by('ts')
+        .values_list(*BAR_FIELDS)
+        .iterator(chunk_size=chunk_size)
+    )
+    return rows if source == interval else downsample(rows, interval)
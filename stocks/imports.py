@@ -0,0 +1,152 @@
+import csv
+import json
+from datetime import datetime, time
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction as db_transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Stock, Transaction
+from .charges import price_trades
+from .trading import LegacyHistoryError, rebuild_positions
+
+TRADE_TYPES = {'BUY': 'BUY', 'B': 'BUY', 'SELL': 'SELL', 'S': 'SELL'}
+# Contract notes from Indian brokers mostly use day-first dates
+DATE_FORMATS = ('%d-%m-%Y', '%d/%m/%Y', '%d-%b-%Y', '%d-%m-%Y %H:%M:%S', '%d/%m/%Y %H:%M:%S')
+TWO_PLACES = Decimal('0.01')
+
+
+def read_trade_file(path):
+    """Rows from a .json (list of objects) or .csv trade file."""
+    if str(path).lower().endswith('.json'):
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        return [{(k or '').strip(): v for k, v in row.items()} for row in csv.DictReader(f)]
+
+
+def _parse_amount(value, field, errors):
+    try:
+        amount = Decimal(str(value).replace(',', '').strip())
+    except (InvalidOperation, ValueError):
+        errors[field] = 'A valid number is required.'
+        return None
+    if not amount.is_finite() or amount <= 0:
+        errors[field] = 'Must be greater than zero.'
+    elif amount.quantize(TWO_PLACES) != amount:
+        errors[field] = 'At most 2 decimal places are allowed.'
+    else:
+        return amount
+    return None
+
+
+def _parse_date(value, errors):
+    value = str(value or '').strip()
+    parsed = None
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None and parse_date(value):
+            parsed = datetime.combine(parse_date(value), time())
+    except ValueError:
+        pass
+    if parsed is None:
+        for fmt in DATE_FORMATS:
+            try:
+                parsed = datetime.strptime(value, fmt)
+                break
+            except ValueError:
+                continue
+    if parsed is None:
+        errors['date'] = 'Expected YYYY-MM-DD, DD-MM-YYYY or an ISO 8601 datetime.'
+        return None
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    if parsed > timezone.now():
+        errors['date'] = 'Trade date is in the future.'
+        return None
+    return parsed
+
+
+def _stock_lookup(rows):
+    """{SYMBOL: stock_id} for every symbol the rows could refer to, in one query."""
+    candidates = set()
+    for row in rows:
+        symbol = str(row.get('symbol') or '').strip().upper()
+        if symbol:
+            candidates.update({symbol, symbol + '.NS', symbol + '.BO'})
+    return {
+        symbol.upper(): pk
+        for pk, symbol in Stock.objects.filter(symbol__in=candidates).values_list('id', 'symbol')
+    }
+
+
+def validate_trades(rows):
+    """
+    Validate every row before anything is written.
+    Returns (trades, errors): trades are dicts ready for Transaction(...),
+    errors is a list of {"row": n, "errors": {field: message}} (rows numbered from 1).
+    """
+    if not isinstance(rows, list):
+        return [], [{'row': None, 'errors': {'non_field_errors': 'Expected a list of trades.'}}]
+
+    stocks = _stock_lookup([row for row in rows if isinstance(row, dict)])
+    trades, errors = [], []
+
+    for number, row in enumerate(rows, start=1):
+        if not isinstance(row, dict):
+            errors.append({'row': number, 'errors': {'non_field_errors': 'Expected an object.'}})
+            continue
+        row_errors = {}
+
+        symbol = str(row.get('symbol') or '').strip().upper()
+        exchange = str(row.get('exchange') or '').strip().upper()
+        suffixes = {'NSE': ('.NS',), 'BSE': ('.BO',)}.get(exchange, ('.NS', '.BO'))
+        stock_id = stocks.get(symbol) or next((stocks[symbol + s] for s in suffixes if symbol + s in stocks), None)
+        if not symbol:
+            row_errors['symbol'] = 'This field is required.'
+        elif stock_id is None:
+            row_errors['symbol'] = f'Unknown stock "{symbol}".'
+
+        transaction_type = TRADE_TYPES.get(str(row.get('transaction_type') or '').strip().upper())
+        if transaction_type is None:
+            row_errors['transaction_type'] = 'Must be BUY or SELL.'
+
+        quantity = _parse_amount(row.get('quantity'), 'quantity', row_errors)
+        price = _parse_amount(row.get('price'), 'price', row_errors)
+        date = _parse_date(row.get('date'), row_errors)
+
+        if row_errors:
+            errors.append({'row': number, 'errors': row_errors})
+        else:
+            trades.append({
+                'stock_id': stock_id,
+                'transaction_type': transaction_type,
+                'quantity': quantity,
+                'price': price,
+                'date': date,
+            })
+    return trades, errors
+
+
+def import_trades(user, rows, batch_size=500):
+    """
+    Validate and bulk insert historical trades for `user`, then replay each
+    affected position once. Nothing is written if any row is invalid.
+    """
+    trades, errors = validate_trades(rows)
+    if errors:
+        return {'imported': 0, 'errors': errors}
+
+    objs = [Transaction(user=user, **trade) for trade in trades]
+    price_trades(objs)
+
+    try:
+        with db_transaction.atomic():
+            Transaction.objects.bulk_create(objs, batch_size=batch_size)
+            rebuild_positions({(user.pk, obj.stock_id) for obj in objs}, batch_size=batch_size,
+                              new_sells=[obj.pk for obj in objs if obj.transaction_type == 'SELL'])
+    except LegacyHistoryError as e:
+        return {'imported': 0, 'errors': [{'row': None, 'errors': {'non_field_errors': str(e)}}]}
+
+    return {'imported': len(objs), 'errors': []}
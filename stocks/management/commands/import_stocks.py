@@ -1,33 +1,105 @@
 import csv
 import os
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
 from stocks.models import Stock
+from stocks.search import invalidate_stock_index
+
+# (exchange, yahoo suffix, symbol column, name column) per master file layout
+NSE_LAYOUT = ('NSE', '.NS', 'SYMBOL', 'NAME OF COMPANY')
+BSE_LAYOUT = ('BSE', '.BO', 'Security Id', 'Security Name')
+
 
 class Command(BaseCommand):
-    help = 'Import stocks from EQUITY_L.csv'
+    help = 'Import stocks from EQUITY_L.csv (and optionally a BSE scrip master)'
 
-    def handle(self, *args, **kwargs):
-        csv_path = os.path.join(settings.BASE_DIR, 'stocks', 'EQUITY_L.csv')
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=os.path.join(settings.BASE_DIR, 'stocks', 'EQUITY_L.csv'),
+                            help='NSE EQUITY_L.csv path')
+        parser.add_argument('--bse-file', help='BSE scrip master CSV path')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report new and changed stocks without writing anything')
 
-        try:
-            with open(csv_path, newline='', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                count = 0
+    def handle(self, *args, **options):
+        sources = [(options['file'], NSE_LAYOUT)]
+        if options['bse_file']:
+            sources.append((options['bse_file'], BSE_LAYOUT))
 
-                for row in reader:
-                    symbol = row['SYMBOL'].strip() + '.NS'
-                    name = row['NAME OF COMPANY'].strip()
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+
+        # symbol -> (id, name, exchange), one query for the whole catalog
+        existing = {
+            symbol: (pk, name, exchange)
+            for pk, symbol, name, exchange in Stock.objects.values_list('id', 'symbol', 'name', 'exchange')
+        }
+        seen = set()
+        to_create, to_update = [], []
+        created = updated = unchanged = 0
+
+        for symbol, name, exchange in self.read_rows(sources):
+            if symbol in seen:
+                continue
+            seen.add(symbol)
 
-                    stock, created = Stock.objects.get_or_create(symbol=symbol, defaults={'name': name})
+            current = existing.get(symbol)
+            if current is None:
+                created += 1
+                if dry_run:
+                    self.stdout.write(f'+ {symbol} - {name} ({exchange})')
+                    continue
+                to_create.append(Stock(symbol=symbol, name=name, exchange=exchange))
+            elif current[1:] != (name, exchange):
+                updated += 1
+                if dry_run:
+                    self.stdout.write(f'~ {symbol}: {current[1]} ({current[2]}) -> {name} ({exchange})')
+                    continue
+                to_update.append(Stock(id=current[0], symbol=symbol, name=name, exchange=exchange))
+            else:
+                unchanged += 1
 
-                    if created:
-                        count += 1
-                        self.stdout.write(self.style.SUCCESS(f'Added: {symbol} - {name}'))
-                    else:
-                        self.stdout.write(f'Skipped (already exists): {symbol}')
+            if len(to_create) >= batch_size:
+                Stock.objects.bulk_create(to_create, batch_size=batch_size, ignore_conflicts=True)
+                to_create = []
+            if len(to_update) >= batch_size:
+                Stock.objects.bulk_update(to_update, ['name', 'exchange'], batch_size=batch_size)
+                to_update = []
 
-                self.stdout.write(self.style.SUCCESS(f'\n✅ Imported {count} new stocks successfully.'))
+        if to_create:
+            Stock.objects.bulk_create(to_create, batch_size=batch_size, ignore_conflicts=True)
+        if to_update:
+            Stock.objects.bulk_update(to_update, ['name', 'exchange'], batch_size=batch_size)
+        if not dry_run:
+            invalidate_stock_index()  # bulk writes send no post_save
 
-        except FileNotFoundError:
-            self.stderr.write(f'❌ File not found: {csv_path}')
+        summary = f'{created} new, {updated} changed, {unchanged} unchanged'
+        if dry_run:
+            self.stdout.write(self.style.WARNING(f'\nDry run, nothing written: {summary}.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'\n✅ Imported stocks: {summary}.'))
+
+    def read_rows(self, sources):
+        """Stream (symbol, name, exchange) tuples from every master file in turn."""
+        for path, (exchange, suffix, symbol_col, name_col) in sources:
+            try:
+                csvfile = open(path, newline='', encoding='utf-8-sig')
+            except FileNotFoundError:
+                raise CommandError(f'❌ File not found: {path}')
+
+            with csvfile:
+                reader = csv.DictReader(csvfile)
+                # Exchange files pad their headers with spaces
+                reader.fieldnames = [field.strip() for field in reader.fieldnames or []]
+                if symbol_col not in reader.fieldnames or name_col not in reader.fieldnames:
+                    raise CommandError(f'❌ {path} has no {symbol_col!r}/{name_col!r} columns')
+
+                max_length = Stock._meta.get_field('symbol').max_length
+                for row in reader:
+                    symbol = (row[symbol_col] or '').strip()
+                    name = (row[name_col] or '').strip()
+                    if len(symbol + suffix) > max_length:
+                        # Postgres would reject the whole batch over one row
+                        self.stdout.write(self.style.WARNING(f'Skipping {symbol + suffix}: symbol too long'))
+                    elif symbol and name:
+                        yield symbol + suffix, name, exchange
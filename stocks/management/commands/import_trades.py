@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from stocks.imports import import_trades, read_trade_file
+from stocks.models import User
+
+
+class Command(BaseCommand):
+    help = 'Import historical trades for one user from a broker CSV or JSON export'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSON file with symbol, transaction_type, quantity, price, date')
+        parser.add_argument('--user', required=True, help='Email of the user the trades belong to')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(email=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"❌ No user with email {options['user']}")
+
+        try:
+            rows = read_trade_file(options['path'])
+        except FileNotFoundError:
+            raise CommandError(f"❌ File not found: {options['path']}")
+        except ValueError as e:
+            raise CommandError(f"❌ Could not read {options['path']}: {e}")
+
+        result = import_trades(user, rows, batch_size=options['batch_size'])
+        if result['errors']:
+            for error in result['errors']:
+                details = ', '.join(f'{field}: {message}' for field, message in error['errors'].items())
+                self.stderr.write(f"Row {error['row']}: {details}")
+            raise CommandError(f"❌ {len(result['errors'])} invalid rows, nothing imported.")
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Imported {result['imported']} trades for {user.email}."))
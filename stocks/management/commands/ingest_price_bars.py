@@ -0,0 +1,158 @@
+import csv
+import math
+from datetime import datetime, time
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from stocks.history import INTERVALS
+from stocks.models import PriceBar, Stock
+
+TS_COLUMNS = ('datetime', 'date', 'timestamp', 'ts', 'time')
+PRICE_COLUMNS = ('open', 'high', 'low', 'close')
+TWO_PLACES = Decimal('0.01')
+
+
+class Command(BaseCommand):
+    help = 'Load OHLCV history from CSV or Parquet files into PriceBar'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='.csv or .parquet files')
+        parser.add_argument('--interval', required=True, choices=list(INTERVALS))
+        parser.add_argument('--symbol', help='Stock for files without a symbol column (yfinance downloads)')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        self.interval = options['interval']
+        self.default_symbol = (options['symbol'] or '').strip().upper()
+        self.stock_ids = {}  # symbol as written in the file -> stock id or None
+        batch_size = options['batch_size']
+
+        written = skipped = 0
+        unknown = set()
+        # Keyed like the unique constraint: PostgreSQL refuses to upsert the
+        # same row twice in one statement, so a repeated bar keeps its last value
+        batch = {}
+        for path in options['paths']:
+            for row in self.read_rows(path):
+                bar = self.to_bar(row, unknown)
+                if bar is None:
+                    skipped += 1
+                    continue
+                batch[bar.stock_id, bar.interval, bar.ts] = bar
+                if len(batch) >= batch_size:
+                    written += self.write(list(batch.values()))
+                    batch = {}
+        if batch:
+            written += self.write(list(batch.values()))
+
+        if unknown:
+            self.stdout.write(self.style.WARNING(f'Unknown symbols skipped: {", ".join(sorted(unknown))}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'\n✅ Loaded {written} {self.interval} bars ({skipped} rows skipped).'))
+
+    def write(self, bars):
+        # Re-running over an overlapping file corrects bars instead of failing
+        PriceBar.objects.bulk_create(
+            bars, update_conflicts=True,
+            unique_fields=['stock', 'interval', 'ts'],
+            update_fields=['open', 'high', 'low', 'close', 'volume'],
+        )
+        return len(bars)
+
+    def read_rows(self, path):
+        """Stream rows as dicts with lower-cased keys."""
+        if str(path).lower().endswith('.parquet'):
+            yield from self.read_parquet(path)
+            return
+        try:
+            csvfile = open(path, newline='', encoding='utf-8-sig')
+        except FileNotFoundError:
+            raise CommandError(f'❌ File not found: {path}')
+        with csvfile:
+            reader = csv.DictReader(csvfile)
+            reader.fieldnames = [(field or '').strip().lower() for field in reader.fieldnames or []]
+            self.check_columns(path, reader.fieldnames)
+            yield from reader
+
+    def read_parquet(self, path):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise CommandError('❌ Reading Parquet needs pyarrow: pip install pyarrow')
+        try:
+            parquet = pq.ParquetFile(path)
+        except FileNotFoundError:
+            raise CommandError(f'❌ File not found: {path}')
+        names = [name.strip().lower() for name in parquet.schema_arrow.names]
+        self.check_columns(path, names)
+        for record_batch in parquet.iter_batches(batch_size=10000):
+            for values in zip(*(column.to_pylist() for column in record_batch.columns)):
+                yield dict(zip(names, values))
+
+    def check_columns(self, path, columns):
+        missing = [c for c in PRICE_COLUMNS if c not in columns]
+        if not any(c in columns for c in TS_COLUMNS):
+            missing.append('date')
+        if 'symbol' not in columns and not self.default_symbol:
+            raise CommandError(f'❌ {path} has no symbol column; pass --symbol')
+        if missing:
+            raise CommandError(f'❌ {path} is missing columns: {", ".join(missing)}')
+
+    def to_bar(self, row, unknown):
+        symbol = str(row.get('symbol') or self.default_symbol).strip().upper()
+        stock_id = self.stock_id(symbol)
+        if stock_id is None:
+            unknown.add(symbol)
+            return None
+        ts = parse_ts(next((row[c] for c in TS_COLUMNS if row.get(c) not in (None, '')), None))
+        prices = [parse_price(row.get(c)) for c in PRICE_COLUMNS]
+        if ts is None or None in prices:
+            return None  # holidays in yfinance exports come through as empty rows
+        try:
+            volume = int(float(row.get('volume') or 0))
+        except (TypeError, ValueError):
+            volume = 0
+        return PriceBar(stock_id=stock_id, interval=self.interval, ts=ts, open=prices[0], high=prices[1],
+                        low=prices[2], close=prices[3], volume=volume)
+
+    def stock_id(self, symbol):
+        if symbol not in self.stock_ids:
+            # Exact symbol first, then the NSE and BSE listings
+            found = dict(Stock.objects.filter(symbol__in=[symbol, symbol + '.NS', symbol + '.BO'])
+                         .values_list('symbol', 'id'))
+            self.stock_ids[symbol] = next(
+                (found[s] for s in (symbol, symbol + '.NS', symbol + '.BO') if s in found), None)
+        return self.stock_ids[symbol]
+
+
+def parse_ts(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        value = str(value).strip()
+        try:
+            parsed = parse_datetime(value)
+            if parsed is None and parse_date(value):
+                parsed = datetime.combine(parse_date(value), time())
+        except ValueError:
+            return None
+        if parsed is None:
+            return None
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+def parse_price(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    try:
+        price = Decimal(str(value).replace(',', '').strip())
+    except InvalidOperation:
+        return None
+    if not price.is_finite() or price < 0:
+        return None
+    return price.quantize(TWO_PLACES)
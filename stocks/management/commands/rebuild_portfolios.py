@@ -0,0 +1,128 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Q
+from django.db.models.functions import Mod
+from stocks.models import CapitalGains, Portfolio, Transaction, User
+from stocks.trading import LegacyHistoryError, PositionReplay, legacy_replays, write_positions
+
+
+def rebuild_shard(shard, shards, user_ids=None, chunk_size=5000, users_per_batch=200):
+    """
+    Replay every position of the users where user_id % shards == shard.
+    Trades are streamed in (user, stock, date) order and written back every
+    `users_per_batch` users. Positions with pre-0009 history (see
+    legacy_replays) are left untouched. Returns (users, positions, trades)
+    counts and the untouched (user_id, stock_id) pairs.
+    """
+    def scoped(qs):
+        if user_ids:
+            qs = qs.filter(user_id__in=user_ids)
+        if shards > 1:
+            qs = qs.annotate(shard=Mod('user_id', shards)).filter(shard=shard)
+        return qs
+
+    replays = {}
+    batch_users = set()
+    seen_users = set()
+    totals = [0, 0, 0]
+    legacy = []
+
+    def flush():
+        # Positions with rows left over but no trades any more get zeroed too
+        leftovers = Q(user_id__in=batch_users)
+        for model in (Portfolio, CapitalGains):
+            for pair in model.objects.filter(leftovers).values_list('user_id', 'stock_id'):
+                replays.setdefault(pair, PositionReplay(*pair))
+        skipped = {(r.user_id, r.stock_id) for r in legacy_replays(replays.values())}
+        legacy.extend(skipped)
+        rebuilt = [r for pair, r in replays.items() if pair not in skipped]
+        write_positions(rebuilt)
+        totals[0] += len(batch_users)
+        totals[1] += len(rebuilt)
+        replays.clear()
+        batch_users.clear()
+
+    trades = scoped(Transaction.objects.only('id', 'user_id', 'stock_id', 'transaction_type', 'quantity', 'price', 'date'))
+    for trade in trades.order_by('user_id', 'stock_id', 'date', 'id').iterator(chunk_size=chunk_size):
+        if trade.user_id not in batch_users:
+            if len(batch_users) >= users_per_batch:
+                flush()
+            batch_users.add(trade.user_id)
+            seen_users.add(trade.user_id)
+        pair = (trade.user_id, trade.stock_id)
+        replay = replays.get(pair)
+        if replay is None:
+            replay = replays[pair] = PositionReplay(*pair)
+        replay.apply(trade)
+        totals[2] += 1
+    if batch_users:
+        flush()
+
+    # Users with portfolio or gains rows but no trades at all
+    for model in (Portfolio, CapitalGains):
+        for user_id in scoped(model.objects.all()).values_list('user_id', flat=True).distinct():
+            if user_id not in seen_users:
+                seen_users.add(user_id)
+                batch_users.add(user_id)
+                if len(batch_users) >= users_per_batch:
+                    flush()
+    if batch_users:
+        flush()
+
+    return (*totals, legacy)
+
+
+def _init_worker():
+    # Forked workers must not share the parent's DB connections
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Rebuild Portfolio, tax lots, realized gains and CapitalGains by replaying every transaction'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', nargs='+', help='Only rebuild these users (emails or ids)')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Processes to shard users across by id (default 1; PostgreSQL only)')
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Transactions fetched per round trip (default 5000)')
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options['users']:
+            ids = {int(u) for u in options['users'] if u.isdigit()}
+            emails = [u for u in options['users'] if not u.isdigit()]
+            user_ids = list(User.objects.filter(Q(id__in=ids) | Q(email__in=emails)).values_list('id', flat=True))
+            if not user_ids:
+                raise CommandError('❌ None of the given users exist.')
+
+        workers = max(1, options['workers'])
+        if workers > 1 and connection.vendor == 'sqlite':
+            # SQLite takes one writer at a time: parallel shards would fail with "database is locked"
+            raise CommandError('❌ --workers > 1 needs a database with concurrent writers (PostgreSQL); '
+                               'SQLite rebuilds run in one process.')
+        started = time.monotonic()
+
+        if workers == 1 or 'fork' not in multiprocessing.get_all_start_methods():
+            results = [rebuild_shard(0, 1, user_ids, options['chunk_size'])]
+        else:
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'),
+                                     initializer=_init_worker) as pool:
+                futures = [pool.submit(rebuild_shard, shard, workers, user_ids, options['chunk_size'])
+                           for shard in range(workers)]
+                results = [f.result() for f in futures]
+
+        users, positions, trades = (sum(result[i] for result in results) for i in range(3))
+        legacy = sorted(pair for result in results for pair in result[3])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Rebuilt {positions} positions for {users} users from {trades} transactions "
+            f"in {elapsed:.1f}s ({trades / elapsed if elapsed else 0:,.0f} transactions/s)."
+        ))
+        if legacy:
+            raise CommandError(f'❌ Left untouched: {LegacyHistoryError(legacy)}')
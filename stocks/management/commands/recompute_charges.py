@@ -0,0 +1,53 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from stocks.charges import CHARGE_FIELDS, price_trades
+from stocks.models import Transaction
+
+
+class Command(BaseCommand):
+    help = 'Re-price brokerage, STT, GST, SEBI and stamp duty on stored transactions with the current rate table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--since', help='Only transactions on or after this date (YYYY-MM-DD)')
+        parser.add_argument('--dry-run', action='store_true', help='Count changes without writing them')
+
+    def handle(self, *args, **options):
+        trades = Transaction.objects.only('id', 'price', 'quantity', 'transaction_type', 'date', *CHARGE_FIELDS)
+        if options['since']:
+            try:
+                since = datetime.strptime(options['since'], '%Y-%m-%d')
+            except ValueError:
+                raise CommandError('--since must be YYYY-MM-DD')
+            trades = trades.filter(date__gte=timezone.make_aware(since))
+
+        chunk_size = max(1, options['chunk_size'])
+        started = time.monotonic()
+        seen = changed = 0
+        chunk = []
+
+        for trade in trades.order_by('id').iterator(chunk_size=chunk_size):
+            chunk.append(trade)
+            if len(chunk) >= chunk_size:
+                changed += self.reprice(chunk, options['dry_run'])
+                seen += len(chunk)
+                chunk = []
+        if chunk:
+            changed += self.reprice(chunk, options['dry_run'])
+            seen += len(chunk)
+
+        elapsed = time.monotonic() - started
+        rate = seen / elapsed if elapsed else 0
+        verb = 'Would update' if options['dry_run'] else 'Updated'
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {verb} {changed} of {seen} transactions in {elapsed:.1f}s ({rate:,.0f} rows/s)."
+        ))
+
+    def reprice(self, chunk, dry_run):
+        changed = price_trades(chunk)
+        if changed and not dry_run:
+            Transaction.objects.bulk_update(changed, CHARGE_FIELDS, batch_size=1000)
+        return len(changed)
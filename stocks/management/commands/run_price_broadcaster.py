@@ -0,0 +1,26 @@
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from stocks.broadcaster import PriceBroadcaster
+
+
+class Command(BaseCommand):
+    help = 'Poll every symbol with live dashboard subscribers once per tick and push changed prices'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float,
+                            help=f"Seconds between polls (default {settings.PRICE_BROADCASTER['INTERVAL']})")
+
+    def handle(self, *args, **options):
+        if 'InMemoryChannelLayer' in settings.CHANNEL_LAYERS['default']['BACKEND']:
+            raise CommandError('❌ The in-memory channel layer is per process; a separate broadcaster '
+                               'would never reach the ASGI workers. Keep PRICE_BROADCASTER["IN_PROCESS"] '
+                               'on, or configure a cross-process CHANNEL_LAYERS backend.')
+
+        broadcaster = PriceBroadcaster(interval=options['interval'])
+        self.stdout.write(self.style.SUCCESS(f'✅ Price broadcaster polling every {broadcaster.interval}s.'))
+        try:
+            asyncio.run(broadcaster.run())
+        except KeyboardInterrupt:
+            self.stdout.write('Stopped.')
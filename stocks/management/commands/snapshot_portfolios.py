@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from stocks.models import PortfolioSnapshot, User
+from stocks.snapshots import plan_snapshots, write_snapshots
+
+
+def _day(value):
+    day = parse_date(value)
+    if day is None:
+        raise CommandError(f'❌ Expected YYYY-MM-DD, got "{value}".')
+    return day
+
+
+class Command(BaseCommand):
+    help = 'Add daily PortfolioSnapshot rows for every user, redoing only days whose trades changed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Last day to snapshot (default today)')
+        parser.add_argument('--since', help='Also redo every day from this date, e.g. after backfilling prices')
+        parser.add_argument('--users', nargs='+', help='Only these users (emails or ids)')
+        parser.add_argument('--users-per-batch', type=int, default=200)
+
+    def handle(self, *args, **options):
+        end = _day(options['date']) if options['date'] else timezone.localdate()
+        since = _day(options['since']) if options['since'] else None
+
+        user_ids = None
+        if options['users']:
+            ids = {int(u) for u in options['users'] if u.isdigit()}
+            emails = [u for u in options['users'] if not u.isdigit()]
+            user_ids = list(User.objects.filter(Q(id__in=ids) | Q(email__in=emails)).values_list('id', flat=True))
+            if not user_ids:
+                raise CommandError('❌ None of the given users exist.')
+
+        started = time.monotonic()
+        plan, state, orphaned = plan_snapshots(end, user_ids=user_ids, since=since)
+        if orphaned:
+            PortfolioSnapshot.objects.filter(user_id__in=orphaned).delete()
+
+        written = 0
+        pending = sorted(plan)
+        batch_size = max(1, options['users_per_batch'])
+        for i in range(0, len(pending), batch_size):
+            batch = {user_id: plan[user_id] for user_id in pending[i:i + batch_size]}
+            written += write_snapshots(batch, state, end)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Wrote {written} snapshots for {len(plan)} users through {end} '
+            f'({len(state) - len(plan)} already up to date) in {elapsed:.1f}s.'
+        ))
@@ -1,30 +1,103 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from decimal import Decimal
+
 from django.core.management.base import BaseCommand
 from stocks.models import Stock
-import yfinance as yf
-from decimal import Decimal
+from stocks.utils import fetch_quotes, yahoo_ticker
+
 
 class Command(BaseCommand):
     help = 'Update current stock prices using yfinance'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=100,
+                            help='Tickers per yfinance download (default 100)')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Chunks fetched in parallel (default 4)')
+        parser.add_argument('--retries', type=int, default=1,
+                            help='Times failed symbols are retried, backing off each time (default 1)')
+        parser.add_argument('--retry-delay', type=float, default=5.0,
+                            help='Base seconds before the first retry, doubled each attempt (default 5)')
+        parser.add_argument('--max-retry-delay', type=float, default=60.0,
+                            help='Upper bound on a single retry wait (default 60)')
+        target = parser.add_mutually_exclusive_group()
+        target.add_argument('--symbols', nargs='+', help='Only update these symbols')
+        target.add_argument('--held-only', action='store_true',
+                            help='Only update stocks someone currently holds')
+
     def handle(self, *args, **options):
-        stocks = Stock.objects.all()
+        stocks = Stock.objects.only('id', 'symbol', 'exchange')
+        if options['symbols']:
+            stocks = stocks.filter(symbol__in=options['symbols'])
+        elif options['held_only']:
+            stocks = stocks.filter(portfolios__quantity__gt=0).distinct()
+
+        stocks = list(stocks)
+        chunk_size = max(1, options['chunk_size'])
+        started = time.monotonic()
+
+        updated_count, failed = self.update(stocks, chunk_size, options['workers'])
+        for attempt in range(max(0, options['retries'])):
+            if not failed:
+                break
+            delay = backoff(attempt, options['retry_delay'], options['max_retry_delay'])
+            self.stdout.write(self.style.WARNING(
+                f"Retrying {len(failed)} failed symbols in {delay:.1f}s "
+                f"(attempt {attempt + 1}/{options['retries']})..."
+            ))
+            time.sleep(delay)
+            retried, failed = self.update(failed, chunk_size, options['workers'])
+            updated_count += retried
+
+        elapsed = time.monotonic() - started
+        rate = updated_count / elapsed if elapsed else 0
+        for stock in failed:
+            self.stdout.write(self.style.ERROR(f"Price not found for {stock.symbol}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"\n✅ Updated {updated_count}/{len(stocks)} stocks in {elapsed:.1f}s "
+            f"({rate:.1f} stocks/s, {len(failed)} failed)."
+        ))
+
+    def update(self, stocks, chunk_size, workers):
+        """Fetch `stocks` chunk by chunk in a thread pool; returns (updated count, failed stocks)."""
+        chunks = [stocks[i:i + chunk_size] for i in range(0, len(stocks), chunk_size)]
         updated_count = 0
+        failed = []
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = {pool.submit(self.fetch_chunk, chunk): chunk for chunk in chunks}
+            for future in as_completed(futures):
+                chunk = futures[future]
+                try:
+                    prices = future.result()
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f"Error fetching chunk of {len(chunk)}: {e}"))
+                    failed.extend(chunk)
+                    continue
+
+                changed = []
+                for stock in chunk:
+                    price = prices.get(yahoo_ticker(stock.symbol, stock.exchange))
+                    if price:
+                        stock.current_price = round(Decimal(str(price)), 2)
+                        changed.append(stock)
+                    else:
+                        failed.append(stock)
 
-        for stock in stocks:
-            try:
-                ticker = yf.Ticker(stock.symbol)
-                price = ticker.history(period='1d')['Close'].iloc[-1]
+                # Written from this thread so only one connection does the UPDATEs
+                Stock.objects.bulk_update(changed, ['current_price'])
+                updated_count += len(changed)
+                self.stdout.write(f"Updated {len(changed)}/{len(chunk)} in chunk")
 
-                if price:
-                    stock.current_price = Decimal(price)
-                    stock.save()
-                    updated_count += 1
-                    self.stdout.write(self.style.SUCCESS(f"{stock.symbol} updated to {price}"))
-                else:
-                    self.stdout.write(self.style.WARNING(f"Price not found for {stock.symbol}"))
+        return updated_count, failed
 
-            except Exception as e:
-                self.stdout.write(self.style.ERROR(f"Error updating {stock.symbol}: {str(e)}"))
+    def fetch_chunk(self, chunk):
+        return fetch_quotes([yahoo_ticker(stock.symbol, stock.exchange) for stock in chunk])
 
-        self.stdout.write(self.style.SUCCESS(f"\n✅ Updated {updated_count} stocks."))
 
+def backoff(attempt, base, cap):
+    """Seconds before retry `attempt` (0-based): base * 2**attempt, capped, with the upper half jittered."""
+    delay = min(cap, base * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
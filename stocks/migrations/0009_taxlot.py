@@ -0,0 +1,64 @@
+# Generated by Django 4.2.23 on 2026-10-18 07:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_tax_lots(apps, schema_editor):
+    # Sells used to consume BUY transactions in place, so a BUY's remaining
+    # quantity is exactly what is still open. The originally bought quantity
+    # of partly sold buys is gone; it is recorded as the open quantity.
+    Transaction = apps.get_model('stocks', 'Transaction')
+    TaxLot = apps.get_model('stocks', 'TaxLot')
+
+    buys = Transaction.objects.filter(transaction_type='BUY', quantity__gt=0).order_by('id')
+    lots = (
+        TaxLot(
+            user_id=buy.user_id,
+            stock_id=buy.stock_id,
+            buy_transaction_id=buy.id,
+            quantity=buy.quantity,
+            open_quantity=buy.quantity,
+            cost=buy.price,
+            acquired_at=buy.date,
+            is_open=True,
+        )
+        for buy in buys.iterator(chunk_size=2000)
+    )
+    batch = []
+    for lot in lots:
+        batch.append(lot)
+        if len(batch) >= 2000:
+            TaxLot.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        TaxLot.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0008_watchlist'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaxLot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('open_quantity', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('cost', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('acquired_at', models.DateTimeField()),
+                ('is_open', models.BooleanField(default=True)),
+                ('buy_transaction', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tax_lot', to='stocks.transaction')),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tax_lots', to='stocks.stock')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tax_lots', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'stock', 'is_open', 'acquired_at'], name='taxlot_fifo_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_tax_lots, migrations.RunPython.noop),
+    ]
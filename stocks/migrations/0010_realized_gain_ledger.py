@@ -0,0 +1,54 @@
+# Generated by Django 4.2.23 on 2026-10-18 07:11
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0009_taxlot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CapitalGainsYear',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('financial_year', models.CharField(max_length=7)),
+                ('realized_gain', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('short_term_gain', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('long_term_gain', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('tax_liability', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='capital_gains_years', to='stocks.stock')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='capital_gains_years', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RealizedGain',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('buy_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('sell_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('gain', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('acquired_at', models.DateTimeField()),
+                ('sold_at', models.DateTimeField()),
+                ('holding_days', models.PositiveIntegerField()),
+                ('term', models.CharField(choices=[('STCG', 'Short term'), ('LTCG', 'Long term')], max_length=4)),
+                ('financial_year', models.CharField(max_length=7)),
+                ('lot', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='realized_gains', to='stocks.taxlot')),
+                ('sell_transaction', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='realized_gains', to='stocks.transaction')),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='realized_gains', to='stocks.stock')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='realized_gains', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'financial_year'], name='realizedgain_user_fy_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='capitalgainsyear',
+            constraint=models.UniqueConstraint(fields=('user', 'financial_year', 'stock'), name='unique_capital_gains_year'),
+        ),
+    ]
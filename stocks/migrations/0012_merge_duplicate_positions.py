@@ -0,0 +1,50 @@
+# Generated by Django 4.2.23 on 2026-10-18 07:18
+
+from decimal import Decimal
+
+from django.db import migrations
+
+
+def _duplicates(model):
+    """Rows sharing a (user, stock), grouped, oldest first; singletons skipped."""
+    groups = {}
+    for row in model.objects.order_by('id'):
+        groups.setdefault((row.user_id, row.stock_id), []).append(row)
+    return [rows for rows in groups.values() if len(rows) > 1]
+
+
+def merge_duplicate_positions(apps, schema_editor):
+    Portfolio = apps.get_model('stocks', 'Portfolio')
+    CapitalGains = apps.get_model('stocks', 'CapitalGains')
+    Watchlist = apps.get_model('stocks', 'Watchlist')
+
+    for keep, *extra in _duplicates(Portfolio):
+        quantity = sum((p.quantity for p in [keep, *extra]), Decimal('0'))
+        cost = sum((p.quantity * p.average_price for p in [keep, *extra]), Decimal('0'))
+        keep.quantity = quantity
+        keep.average_price = round(cost / quantity, 2) if quantity else Decimal('0')
+        keep.save()
+        Portfolio.objects.filter(id__in=[p.id for p in extra]).delete()
+
+    for keep, *extra in _duplicates(CapitalGains):
+        for field in ('realized_gain', 'short_term_gain', 'long_term_gain', 'tax_liability'):
+            setattr(keep, field, sum((getattr(c, field) for c in [keep, *extra]), Decimal('0')))
+        keep.save()
+        CapitalGains.objects.filter(id__in=[c.id for c in extra]).delete()
+
+    for keep, *extra in _duplicates(Watchlist):
+        Watchlist.objects.filter(id__in=[w.id for w in extra]).delete()
+
+
+class Migration(migrations.Migration):
+    # Kept apart from the index and constraint changes in
+    # 0013_position_indexes_and_constraints: on PostgreSQL, ALTER TABLE in
+    # the same transaction as these deletes fails with "pending trigger events".
+
+    dependencies = [
+        ('stocks', '0011_alter_transaction_date'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_positions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.23 on 2026-10-18 07:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0012_merge_duplicate_positions'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='portfolio',
+            index=models.Index(condition=models.Q(('quantity__gt', 0)), fields=['user'], name='portfolio_open_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'stock', 'date'], name='txn_user_stock_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='capitalgains',
+            constraint=models.UniqueConstraint(fields=('user', 'stock'), name='unique_capital_gains_position'),
+        ),
+        migrations.AddConstraint(
+            model_name='portfolio',
+            constraint=models.UniqueConstraint(fields=('user', 'stock'), name='unique_portfolio_position'),
+        ),
+        migrations.AddConstraint(
+            model_name='watchlist',
+            constraint=models.UniqueConstraint(fields=('user', 'stock'), name='unique_watchlist_item'),
+        ),
+    ]
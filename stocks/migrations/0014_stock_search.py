@@ -0,0 +1,26 @@
+from django.db import migrations
+
+# Full text search for search_stocks' "database" backend; the SQL lives in
+# stocks/search_schema.py. Later migrations that rebuild stocks_stock on
+# SQLite drop its sync triggers: StocksConfig puts them back after migrate,
+# or a migration can call ensure_search_triggers itself.
+from stocks.search_schema import create_search_index, drop_search_index
+
+
+def forwards(apps, schema_editor):
+    create_search_index(schema_editor.connection)
+
+
+def backwards(apps, schema_editor):
+    drop_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0013_position_indexes_and_constraints'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
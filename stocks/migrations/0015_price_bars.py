@@ -0,0 +1,32 @@
+# Generated by Django 4.2.23 on 2026-10-18 07:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0014_stock_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceBar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('interval', models.CharField(choices=[('1m', '1 minute'), ('5m', '5 minutes'), ('15m', '15 minutes'), ('1h', '1 hour'), ('1d', '1 day')], max_length=3)),
+                ('ts', models.DateTimeField()),
+                ('open', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('high', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('low', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('close', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('volume', models.BigIntegerField(default=0)),
+                ('stock', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='price_bars', to='stocks.stock')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='pricebar',
+            constraint=models.UniqueConstraint(fields=('stock', 'interval', 'ts'), name='unique_price_bar'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.23 on 2026-10-18 07:37
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0015_price_bars'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PortfolioSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('market_value', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('cost_basis', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('realized_pnl', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('unrealized_pnl', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('transaction_count', models.PositiveIntegerField(default=0)),
+                ('last_transaction_id', models.PositiveBigIntegerField(default=0)),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='portfolio_snapshots', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='portfoliosnapshot',
+            constraint=models.UniqueConstraint(fields=('user', 'date'), name='unique_portfolio_snapshot'),
+        ),
+    ]
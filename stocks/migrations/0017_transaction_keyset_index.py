@@ -0,0 +1,17 @@
+# Generated by Django 4.2.23 on 2026-10-18 07:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0016_portfolio_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'date', 'id'], name='txn_user_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.23 on 2026-10-18 07:54
+
+from django.db import migrations, models
+
+from stocks.search_schema import ensure_search_triggers
+
+
+def restore_search_triggers(apps, schema_editor):
+    # SQLite rebuilds stocks_stock for the ALTER, dropping its FTS triggers
+    ensure_search_triggers(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stocks', '0017_transaction_keyset_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stock',
+            name='symbol',
+            field=models.CharField(max_length=32, unique=True),
+        ),
+        migrations.RunPython(restore_search_triggers, restore_search_triggers),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 
 
@@ -38,7 +39,8 @@ class Stock(models.Model):
         ('BSE', 'BSE'),
     ]
 
-    symbol = models.CharField(max_length=10, unique=True)
+    # Yahoo tickers, exchange suffix included (RELIANCE.NS, BAJAJHLDNG.BO)
+    symbol = models.CharField(max_length=32, unique=True)
     name = models.CharField(max_length=255)
     exchange = models.CharField(max_length=3, choices=EXCHANGE_CHOICES, default='NSE')
     current_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
@@ -62,7 +64,7 @@ class Transaction(models.Model):
     transaction_type = models.CharField(max_length=10, choices=TRANSACTION_TYPES)
     quantity = models.DecimalField(max_digits=10, decimal_places=2)
     price = models.DecimalField(max_digits=10, decimal_places=2)
-    date = models.DateTimeField(auto_now_add=True)
+    date = models.DateTimeField(default=timezone.now)  # settable so imported trades keep their trade date
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='transactions')
     stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='transactions')
     brokerage = models.DecimalField(max_digits=10, decimal_places=2, default=0)
@@ -70,6 +72,15 @@ class Transaction(models.Model):
     gst = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     sebi_charges = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     stamp_duty = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)  # lets snapshots spot edited trades
+
+    class Meta:
+        indexes = [
+            # Per-position history and today's PnL (date range within a position)
+            models.Index(fields=['user', 'stock', 'date'], name='txn_user_stock_date_idx'),
+            # A user's trade list, newest first, paged on (date, id)
+            models.Index(fields=['user', 'date', 'id'], name='txn_user_date_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.transaction_type} - {self.stock.symbol}"
@@ -86,6 +97,15 @@ class Portfolio(models.Model):
     average_price = models.DecimalField(max_digits=10, decimal_places=2)
     last_updated = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'stock'], name='unique_portfolio_position'),
+        ]
+        indexes = [
+            # Dashboard: a user's open holdings only
+            models.Index(fields=['user'], condition=models.Q(quantity__gt=0), name='portfolio_open_idx'),
+        ]
+
     def __str__(self):
         user_display = self.user.email if self.user else "No User"
         return f"{user_display} - {self.stock.symbol}"
@@ -100,17 +120,151 @@ class CapitalGains(models.Model):
     long_term_gain = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     tax_liability = models.DecimalField(max_digits=12, decimal_places=2, default=0)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'stock'], name='unique_capital_gains_position'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.stock.symbol}"
 
 
+class TaxLot(models.Model):
+    """Shares acquired by one BUY, consumed oldest-first by later SELLs."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tax_lots')
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='tax_lots')
+    buy_transaction = models.OneToOneField(
+        Transaction, on_delete=models.SET_NULL, null=True, blank=True, related_name='tax_lot'
+    )
+    quantity = models.DecimalField(max_digits=10, decimal_places=2)
+    open_quantity = models.DecimalField(max_digits=10, decimal_places=2)
+    cost = models.DecimalField(max_digits=10, decimal_places=2)  # per share
+    acquired_at = models.DateTimeField()
+    is_open = models.BooleanField(default=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'stock', 'is_open', 'acquired_at'], name='taxlot_fifo_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.email} - {self.stock.symbol} - {self.open_quantity}/{self.quantity}"
+
+
+class RealizedGain(models.Model):
+    """Append-only: one row per tax lot (or part of one) closed by a SELL."""
+    TERM_CHOICES = (
+        ('STCG', 'Short term'),
+        ('LTCG', 'Long term'),
+    )
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='realized_gains')
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='realized_gains')
+    sell_transaction = models.ForeignKey(Transaction, on_delete=models.CASCADE, related_name='realized_gains')
+    lot = models.ForeignKey(TaxLot, on_delete=models.SET_NULL, null=True, blank=True, related_name='realized_gains')
+    quantity = models.DecimalField(max_digits=10, decimal_places=2)
+    buy_price = models.DecimalField(max_digits=10, decimal_places=2)
+    sell_price = models.DecimalField(max_digits=10, decimal_places=2)
+    gain = models.DecimalField(max_digits=12, decimal_places=2)
+    acquired_at = models.DateTimeField()
+    sold_at = models.DateTimeField()
+    holding_days = models.PositiveIntegerField()
+    term = models.CharField(max_length=4, choices=TERM_CHOICES)
+    financial_year = models.CharField(max_length=7)  # e.g. "2025-26"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'financial_year'], name='realizedgain_user_fy_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.email} - {self.stock.symbol} - {self.term} {self.gain}"
+
+
+class CapitalGainsYear(models.Model):
+    """CapitalGains totals for one financial year, kept up to date as gains are realized."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='capital_gains_years')
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='capital_gains_years')
+    financial_year = models.CharField(max_length=7)
+    realized_gain = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    short_term_gain = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    long_term_gain = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    tax_liability = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'financial_year', 'stock'], name='unique_capital_gains_year'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.email} - {self.stock.symbol} - FY {self.financial_year}"
+
+
 class Watchlist(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='watchlist')
     stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='watchlist_items')
     added_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'stock'], name='unique_watchlist_item'),
+        ]
+
     def __str__(self):
         return f"{getattr(self.user, 'email', 'Unknown')} - {self.stock.symbol}"
 
     
   
+
+
+class PriceBar(models.Model):
+    """One OHLCV bar of price history. `ts` is the start of the bar."""
+    INTERVAL_CHOICES = [
+        ('1m', '1 minute'),
+        ('5m', '5 minutes'),
+        ('15m', '15 minutes'),
+        ('1h', '1 hour'),
+        ('1d', '1 day'),
+    ]
+
+    # unique_price_bar leads with stock, so the FK needs no index of its own
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='price_bars', db_index=False)
+    interval = models.CharField(max_length=3, choices=INTERVAL_CHOICES)
+    ts = models.DateTimeField()
+    open = models.DecimalField(max_digits=12, decimal_places=2)
+    high = models.DecimalField(max_digits=12, decimal_places=2)
+    low = models.DecimalField(max_digits=12, decimal_places=2)
+    close = models.DecimalField(max_digits=12, decimal_places=2)
+    volume = models.BigIntegerField(default=0)
+
+    class Meta:
+        # Doubles as the natural key and the index every range query walks
+        constraints = [
+            models.UniqueConstraint(fields=['stock', 'interval', 'ts'], name='unique_price_bar'),
+        ]
+
+    def __str__(self):
+        return f"{self.stock.symbol} {self.interval} {self.ts:%Y-%m-%d %H:%M}"
+
+
+class PortfolioSnapshot(models.Model):
+    """A user's whole portfolio valued at one day's closing prices."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='portfolio_snapshots', db_index=False)
+    date = models.DateField()
+    market_value = models.DecimalField(max_digits=14, decimal_places=2)
+    cost_basis = models.DecimalField(max_digits=14, decimal_places=2)
+    realized_pnl = models.DecimalField(max_digits=14, decimal_places=2)
+    unrealized_pnl = models.DecimalField(max_digits=14, decimal_places=2)
+    # The trade history this row was computed from, so the next run can
+    # tell when trades were backdated, edited or deleted underneath it
+    transaction_count = models.PositiveIntegerField(default=0)
+    last_transaction_id = models.PositiveBigIntegerField(default=0)
+    transactions_updated_at = models.DateTimeField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date'], name='unique_portfolio_snapshot'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.email} - {self.date} - {self.market_value}"
@@ -0,0 +1,134 @@
+"""
+Keyset ("seek") pagination: each page is fetched with a WHERE on the last
+row's ordering values instead of an OFFSET, so page 500 costs the same as
+page 1 and rows inserted meanwhile don't shift pages. DRF's CursorPagination
+keys on the first ordering field only and falls back to an offset for ties;
+this compares the whole (date, id)-style tuple.
+"""
+import base64
+import binascii
+import json
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    # Must end in a unique field; prefix "-" for descending
+    ordering = ('-id',)
+    page_size = 50
+    max_page_size = 500
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        fields = [name.lstrip('-') for name in self.ordering]
+        self.model_fields = [queryset.model._meta.get_field(name) for name in fields]
+
+        position, reverse = self.decode_cursor(request)
+        ordering = self.ordering if not reverse else [self.flip(name) for name in self.ordering]
+        if position is not None:
+            queryset = queryset.filter(self.after(ordering, position))
+        rows = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        if reverse:
+            rows.reverse()
+            self.previous_position = self.key(rows[0]) if has_more else None
+            self.next_position = self.key(rows[-1]) if rows else None
+        else:
+            self.previous_position = self.key(rows[0]) if rows and position is not None else None
+            self.next_position = self.key(rows[-1]) if has_more else None
+        return rows
+
+    @staticmethod
+    def flip(name):
+        return name[1:] if name.startswith('-') else '-' + name
+
+    def after(self, ordering, position):
+        """Rows strictly after `position` in `ordering`: (a > x) OR (a = x AND b > y) OR ..."""
+        branches = []
+        for i, name in enumerate(ordering):
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            equal = {field.name: value for field, value in zip(self.model_fields[:i], position[:i])}
+            branches.append(Q(**equal, **{f'{self.model_fields[i].name}__{lookup}': position[i]}))
+        return reduce(or_, branches)
+
+    def key(self, obj):
+        return [getattr(obj, field.attname) for field in self.model_fields]
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            values, reverse = payload['p'], bool(payload.get('r'))
+            if len(values) != len(self.model_fields):
+                raise ValueError
+            position = [field.to_python(value) for field, value in zip(self.model_fields, values)]
+        except (binascii.Error, ValueError, KeyError, TypeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def encode_cursor(self, position, reverse):
+        values = [value.isoformat() if hasattr(value, 'isoformat') else value for value in position]
+        payload = {'p': values, 'r': True} if reverse else {'p': values}
+        encoded = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position, reverse=False)
+
+    def get_previous_link(self):
+        if self.previous_position is None:
+            return None
+        return self.encode_cursor(self.previous_position, reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class StockPagination(KeysetPagination):
+    ordering = ('id',)
+    page_size = 100
+
+
+class TransactionPagination(KeysetPagination):
+    # Newest trades first; served by the (user, date, id) index
+    ordering = ('-date', '-id')
@@ -0,0 +1,37 @@
+import codecs
+import csv
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class CSVParser(BaseParser):
+    """Parses a text/csv request body into a list of row dicts keyed by header."""
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            reader = csv.DictReader(codecs.iterdecode(stream, encoding))
+            return [{(k or '').strip(): v for k, v in row.items()} for row in reader]
+        except (csv.Error, UnicodeDecodeError) as e:
+            raise ParseError(f'CSV parse error - {e}')
+
+
+class FastJSONParser(JSONParser):
+    """JSONParser through orjson when it's installed; the stdlib parser otherwise."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as e:
+            raise ParseError(f'JSON parse error - {e}')
@@ -0,0 +1,57 @@
+from decimal import Decimal
+
+TWO_PLACES = Decimal('0.01')
+
+
+def _money(value):
+    return float(value.quantize(TWO_PLACES))
+
+
+def _return_pct(gain, investment):
+    return _money(gain / investment * 100) if investment else 0
+
+
+def summarize_holding(portfolio, price):
+    """
+    Investment, value, gain and return for one Portfolio row at `price`
+    (a live price, or None/0 when none could be fetched).
+    """
+    current_price = round(Decimal(str(price)), 2) if price else Decimal('0')
+    investment = portfolio.average_price * portfolio.quantity
+    value = current_price * portfolio.quantity
+    gain = value.quantize(TWO_PLACES) - investment.quantize(TWO_PLACES)
+    return {
+        'current_price': _money(current_price),
+        'total_investment': _money(investment),
+        'current_value': _money(value),
+        'unrealized_gain': _money(gain),
+        'percentage_return': _return_pct(gain, investment.quantize(TWO_PLACES)),
+        # Unrounded amounts for the totals block
+        '_investment': investment,
+        '_value': value,
+    }
+
+
+def summarize_portfolio(portfolios, prices):
+    """
+    Summarize every holding against `prices` ({symbol: price}) in one pass.
+    Returns ({portfolio pk: row}, totals).
+    """
+    rows = {}
+    total_investment = Decimal('0')
+    total_value = Decimal('0')
+
+    for p in portfolios:
+        row = rows[p.pk] = summarize_holding(p, prices.get(p.stock.symbol))
+        total_investment += row['_investment']
+        total_value += row['_value']
+
+    total_gain = total_value - total_investment
+    totals = {
+        'holdings': len(rows),
+        'total_investment': _money(total_investment),
+        'current_value': _money(total_value),
+        'unrealized_gain': _money(total_gain),
+        'percentage_return': _return_pct(total_gain, total_investment),
+    }
+    return rows, totals
@@ -1,5 +1,5 @@
 from django.urls import re_path
-from ..stockups import consumers
+from . import consumers
 
 websocket_urlpatterns = [
     re_path(r'ws/dashboard/$', consumers.DashboardConsumer.as_asgi()),
@@ -0,0 +1,281 @@
+"""
+Stock search for `search_stocks`, with two backends (STOCK_SEARCH['BACKEND']):
+
+- "memory": an in-process index over the Stock catalog. It is rebuilt
+  lazily after a Stock is saved or deleted, and at least every
+  STOCK_SEARCH['INDEX_TTL'] seconds to pick up bulk writes (which send no
+  signals) and writes made by other processes.
+- "database": indexed queries against SQLite FTS5 or Postgres pg_trgm
+  (stocks/search_schema.py), for deployments with several app processes. It also
+  matches typos.
+
+Both rank exact symbol > symbol prefix > name-word prefix > substring,
+shortest symbol first within a rank.
+"""
+import bisect
+import functools
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import OperationalError, connection
+from django.db.models import Q
+
+from .models import Stock
+from .search_schema import FTS_TABLE
+
+EXCHANGE_SUFFIXES = ('.NS', '.BO')
+SIMILARITY_THRESHOLD = 0.3  # pg_trgm's default
+_WORD = re.compile(r'[a-z0-9]+')
+
+
+def _search_settings():
+    # Read per call so override_settings applies
+    return getattr(settings, 'STOCK_SEARCH', {})
+
+
+def _words(text):
+    return _WORD.findall(text.lower())
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+@functools.lru_cache(maxsize=65536)
+def _word_trigrams(word):
+    # Padded the way pg_trgm pads words, so prefixes weigh more than suffixes
+    return frozenset(_trigrams(f'  {word} '))
+
+
+def similarity(query, text):
+    """
+    pg_trgm-style word similarity: for each query word, the best trigram
+    overlap with any word of `text`, averaged over the query words.
+    """
+    targets = [_word_trigrams(word) for word in _words(text)]
+    scores = []
+    for word in _words(query):
+        wanted = _word_trigrams(word)
+        scores.append(max((len(wanted & g) / len(wanted | g) for g in targets), default=0.0))
+    return sum(scores) / len(scores) if scores else 0.0
+
+
+def _prefixed(keys, prefix):
+    """Entries of a sorted list of (key, row) whose key starts with `prefix`."""
+    lo = bisect.bisect_left(keys, (prefix,))
+    hi = bisect.bisect_left(keys, (prefix + '\uffff',))
+    return keys[lo:hi]
+
+
+class StockIndex:
+    """
+    Immutable index over (id, symbol, name) rows.
+
+    Symbols and name words are kept as sorted (key, row) lists, so a prefix
+    lookup is two bisects (a flattened trie). Substrings go through a
+    trigram -> rows map, built on first use and only for larger indexes,
+    and are verified against the full text.
+    """
+    scan_below = 1000  # rows; a linear scan beats building the trigram map
+
+    def __init__(self, rows):
+        # Row order is the tie-break order: shortest symbol, then alphabetical
+        rows = sorted(((pk, symbol.upper(), name) for pk, symbol, name in rows),
+                      key=lambda r: (len(r[1]), r[1]))
+        self.ids = [r[0] for r in rows]
+        self._texts = [f'{symbol} {name}'.lower() for _, symbol, name in rows]
+        self._symbols = sorted((symbol, i) for i, (_, symbol, _) in enumerate(rows))
+        self._words = sorted({(word, i) for i, (_, _, name) in enumerate(rows) for word in _words(name)})
+        self._trigrams = None
+
+    def _trigram_map(self):
+        if self._trigrams is None:
+            grams = {}
+            for i, text in enumerate(self._texts):
+                for gram in _trigrams(text):
+                    grams.setdefault(gram, set()).add(i)
+            self._trigrams = grams
+        return self._trigrams
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _substring_rows(self, needle):
+        if len(needle) < 3 or len(self._texts) < self.scan_below:
+            return (i for i, text in enumerate(self._texts) if needle in text)
+        grams = self._trigram_map()
+        postings = sorted((grams.get(gram, ()) for gram in _trigrams(needle)), key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+        return (i for i in candidates if needle in self._texts[i])
+
+    def search(self, query, limit=20):
+        """Ids of the best `limit` matches for `query`, best first."""
+        query = query.strip()
+        if not query or limit <= 0:
+            return []
+        upper, lower = query.upper(), query.lower()
+
+        ranked, seen = [], set()
+
+        def take(rows):
+            for i in sorted(rows):
+                if i not in seen:
+                    seen.add(i)
+                    ranked.append(i)
+            return len(ranked) >= limit
+
+        by_symbol = _prefixed(self._symbols, upper)
+        exact = {upper} | {upper + suffix for suffix in EXCHANGE_SUFFIXES}
+        if take(i for symbol, i in by_symbol if symbol in exact):
+            return [self.ids[i] for i in ranked[:limit]]
+        if take(i for _, i in by_symbol):
+            return [self.ids[i] for i in ranked[:limit]]
+
+        # Every query word must prefix some word of the name ("tata mot")
+        tokens = _words(lower)
+        if tokens:
+            matches = None
+            for token in sorted(tokens, key=len, reverse=True):
+                rows = {i for _, i in _prefixed(self._words, token)}
+                matches = rows if matches is None else matches & rows
+                if not matches:
+                    break
+            if take(matches):
+                return [self.ids[i] for i in ranked[:limit]]
+
+        take(self._substring_rows(lower))
+        return [self.ids[i] for i in ranked[:limit]]
+
+
+class _IndexHolder:
+    def __init__(self):
+        self._index = None
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+
+    def _current(self):
+        index = self._index
+        if index is None or time.monotonic() - self._built_at > _search_settings().get('INDEX_TTL', 300):
+            return None
+        return index
+
+    def get(self):
+        index = self._current()
+        if index is None:
+            with self._lock:
+                index = self._current()
+                if index is None:
+                    index = StockIndex(Stock.objects.values_list('id', 'symbol', 'name').iterator())
+                    index._trigram_map()  # build now, not on a user's first keystroke
+                    self._index, self._built_at = index, time.monotonic()
+        return index
+
+    def invalidate(self):
+        self._index = None
+
+
+stock_index = _IndexHolder()
+
+
+def invalidate_stock_index(**kwargs):
+    """Signal receiver: drop the index so the next search rebuilds it."""
+    stock_index.invalidate()
+
+
+class DatabaseSearch:
+    """
+    Gathers up to `candidates` rows with indexed queries (symbol range, then
+    FTS5 or pg_trgm), ranks them with a StockIndex, and fills any remaining
+    slots with typo matches ordered by `similarity`.
+    """
+    candidates = 100
+
+    def search(self, query, limit=20):
+        query = query.strip()
+        if not query or limit <= 0:
+            return []
+
+        rows = {}
+        upper = query.upper()
+        # Symbol prefixes straight off the unique symbol index
+        prefixed = (Stock.objects.filter(symbol__gte=upper, symbol__lt=upper + '\uffff')
+                    .order_by('symbol').values_list('id', 'symbol', 'name')[:self.candidates])
+        for row in prefixed:
+            rows[row[0]] = row
+        if connection.vendor == 'postgresql':
+            self._postgres_candidates(query, rows)
+        else:
+            self._sqlite_candidates(query, rows, limit)
+
+        ranked = StockIndex(rows.values()).search(query, limit)
+        if len(ranked) < limit:
+            found = set(ranked)
+            fuzzy = []
+            for pk, symbol, name in rows.values():
+                if pk not in found:
+                    score = similarity(query, f'{symbol} {name}')
+                    if score >= SIMILARITY_THRESHOLD:
+                        fuzzy.append((-score, len(symbol), symbol, pk))
+            ranked += [pk for *_, pk in sorted(fuzzy)[:limit - len(ranked)]]
+        return ranked
+
+    def _fts(self, match, rows):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, symbol, name FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s ORDER BY rank LIMIT %s',
+                [match, self.candidates - len(rows)],
+            )
+            for row in cursor.fetchall():
+                rows.setdefault(row[0], row)
+
+    def _sqlite_candidates(self, query, rows, limit):
+        if len(query) >= 3:
+            try:
+                # A quoted string is a substring match under the trigram tokenizer
+                self._fts('"%s"' % query.replace('"', '""'), rows)
+                if len(rows) < limit:
+                    # Too few: any shared trigram, best bm25 first, for typos
+                    grams = sorted(_trigrams(query.lower()))
+                    self._fts(' OR '.join('"%s"' % g.replace('"', '""') for g in grams), rows)
+                return
+            except OperationalError:
+                pass  # no FTS5 table in this build, see migration 0014
+        like = Stock.objects.filter(Q(name__icontains=query) | Q(symbol__icontains=query))
+        for row in like.values_list('id', 'symbol', 'name')[:self.candidates]:
+            rows.setdefault(row[0], row)
+
+    def _postgres_candidates(self, query, rows):
+        pattern = '%' + query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        with connection.cursor() as cursor:
+            # ILIKE, % and <% are all served by the gin_trgm_ops indexes
+            cursor.execute(
+                'SELECT id, symbol, name FROM stocks_stock '
+                'WHERE symbol ILIKE %s OR name ILIKE %s OR %s <%% symbol OR %s <%% name '
+                'ORDER BY GREATEST(word_similarity(%s, symbol), word_similarity(%s, name)) DESC, length(symbol) '
+                'LIMIT %s',
+                [pattern, pattern, query, query, query, query, self.candidates],
+            )
+            for row in cursor.fetchall():
+                rows.setdefault(row[0], row)
+
+
+database_search = DatabaseSearch()
+
+
+def get_search_backend():
+    backend = _search_settings().get('BACKEND', 'memory')
+    if backend == 'memory':
+        return stock_index.get()
+    if backend == 'database':
+        return database_search
+    raise ImproperlyConfigured(f"Unknown STOCK_SEARCH['BACKEND'] {backend!r}, expected 'memory' or 'database'")
+
+
+def search_stocks(query, limit=20):
+    """Ranked Stock objects matching `query`, in one primary-key query."""
+    ids = get_search_backend().search(query, limit)
+    stocks = Stock.objects.in_bulk(ids)
+    return [stocks[pk] for pk in ids if pk in stocks]
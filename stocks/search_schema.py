@@ -0,0 +1,94 @@
+"""
+Full text search schema for search_stocks' "database" backend (migration 0014).
+
+SQLite: an external-content FTS5 table with the trigram tokenizer (SQLite
+3.34+), kept in sync by triggers so bulk writes are indexed too. Django
+rebuilds a SQLite table on some ALTERs and the rebuild drops its triggers,
+so `ensure_search_triggers` runs after every migrate (see StocksConfig) and
+puts them back, re-indexing the catalog if any were missing.
+
+PostgreSQL: pg_trgm GIN indexes on symbol and name, which serve the
+similarity (%, <%) and ILIKE operators.
+
+Kept free of model imports so migrations can use it.
+"""
+from django.db import DatabaseError
+
+FTS_TABLE = 'stocks_stock_fts'
+SQLITE_TRIGGERS = ('stocks_stock_fts_ai', 'stocks_stock_fts_ad', 'stocks_stock_fts_au')
+
+SQLITE_TABLE = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "symbol, name, content='stocks_stock', content_rowid='id', tokenize='trigram')"
+)
+SQLITE_TRIGGER_SQL = [
+    f"CREATE TRIGGER IF NOT EXISTS stocks_stock_fts_ai AFTER INSERT ON stocks_stock BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, symbol, name) VALUES (new.id, new.symbol, new.name); END",
+    f"CREATE TRIGGER IF NOT EXISTS stocks_stock_fts_ad AFTER DELETE ON stocks_stock BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, symbol, name) VALUES ('delete', old.id, old.symbol, old.name); END",
+    f"CREATE TRIGGER IF NOT EXISTS stocks_stock_fts_au AFTER UPDATE OF symbol, name ON stocks_stock BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, symbol, name) VALUES ('delete', old.id, old.symbol, old.name); "
+    f"INSERT INTO {FTS_TABLE}(rowid, symbol, name) VALUES (new.id, new.symbol, new.name); END",
+]
+SQLITE_REBUILD = f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+SQLITE_BACKWARD = [f"DROP TRIGGER IF EXISTS {name}" for name in SQLITE_TRIGGERS] + [
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS stock_symbol_trgm_idx ON stocks_stock USING gin (symbol gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS stock_name_trgm_idx ON stocks_stock USING gin (name gin_trgm_ops)",
+]
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS stock_symbol_trgm_idx",
+    "DROP INDEX IF EXISTS stock_name_trgm_idx",
+]
+
+
+def _run(connection, statements):
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def create_search_index(connection):
+    if connection.vendor == 'postgresql':
+        _run(connection, POSTGRES_FORWARD)
+    elif connection.vendor == 'sqlite':
+        try:
+            _run(connection, [SQLITE_TABLE, *SQLITE_TRIGGER_SQL, SQLITE_REBUILD])
+        except DatabaseError:
+            # No FTS5 / trigram tokenizer in this SQLite build: the backend
+            # falls back to LIKE queries, so leave nothing half-created.
+            _run(connection, SQLITE_BACKWARD)
+
+
+def drop_search_index(connection):
+    if connection.vendor == 'postgresql':
+        _run(connection, POSTGRES_BACKWARD)
+    elif connection.vendor == 'sqlite':
+        _run(connection, SQLITE_BACKWARD)
+
+
+def missing_search_triggers(connection):
+    """The sync triggers absent from a SQLite database that has the FTS table, else []."""
+    if connection.vendor != 'sqlite':
+        return []
+    with connection.cursor() as cursor:
+        names = [FTS_TABLE, *SQLITE_TRIGGERS]
+        cursor.execute(f"SELECT name FROM sqlite_master WHERE name IN ({', '.join(['%s'] * len(names))})", names)
+        found = {name for name, in cursor.fetchall()}
+    if FTS_TABLE not in found:
+        return []  # migration 0014 not applied, or no FTS5 in this build
+    return [name for name in SQLITE_TRIGGERS if name not in found]
+
+
+def ensure_search_triggers(connection):
+    """
+    Recreate any dropped sync triggers and re-index, since writes made
+    without them never reached the FTS table. Returns the names recreated.
+    """
+    missing = missing_search_triggers(connection)
+    if missing:
+        _run(connection, [*SQLITE_TRIGGER_SQL, SQLITE_REBUILD])
+    return missing
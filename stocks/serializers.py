@@ -1,22 +1,134 @@
-from rest_framework import serializers
-from .models import User, Stock, Transaction, Portfolio, CapitalGains
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+from .models import User, Stock, Transaction, Portfolio, CapitalGains, CapitalGainsYear, PortfolioSnapshot
 from .services import get_live_stock_price
 from rest_framework import serializers
 from .models import Watchlist
+
+
+def requested_fields(request):
+    """Field names from ?fields=a,b on a GET, or None for all of them."""
+    if request is None or request.method != 'GET':
+        return None
+    names = {name.strip() for name in request.query_params.get('fields', '').split(',') if name.strip()}
+    return names or None
+
+
+def only_requested(queryset, request, *always):
+    """Load just the columns ?fields= asks for (plus `always`, e.g. the pagination keys)."""
+    names = requested_fields(request)
+    if names is None:
+        return queryset
+    columns = {f.name for f in queryset.model._meta.concrete_fields} & names
+    return queryset.only(*columns, *always)
+
+
+class SparseFieldsMixin:
+    """?fields=id,symbol drops every other field from the output; unknown names are ignored."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        names = requested_fields(self.context.get('request'))
+        if names is not None:
+            for name in set(self.fields) - names:
+                self.fields.pop(name)
+
+
+# How ReadOnlyListSerializer turns an attribute into output
+RAW, DECIMAL, DATETIME, FIELD = 'raw', 'decimal', 'datetime', 'field'
+
+
+class ReadOnlyListSerializer(serializers.BaseSerializer):
+    """
+    Read-only stand-in for `model_serializer` on list endpoints, with the same
+    output. The model serializer's fields are introspected once per class
+    instead of once per request, and rows are built straight from model
+    attributes; only field types without a fast path go through DRF.
+    Honours ?fields= like SparseFieldsMixin.
+    """
+    model_serializer = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        names = requested_fields(self.context.get('request'))
+        self.plan = [step for step in self.class_plan() if names is None or step[0] in names]
+        # What DateTimeField.enforce_timezone would look up for every value
+        self.tz = timezone.get_current_timezone() if settings.USE_TZ else None
+
+    @classmethod
+    def class_plan(cls):
+        if '_plan' not in cls.__dict__:
+            fields = cls.model_serializer().fields
+            cls._plan = [(name, *cls.reader(field)) for name, field in fields.items() if not field.write_only]
+        return cls._plan
+
+    @staticmethod
+    def reader(field):
+        """(attribute to read or None for field.get_attribute, kind, field) for one output field."""
+        if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+            return field.source + '_id', RAW, field
+        if '.' in field.source or field.source == '*':
+            return None, FIELD, field
+        if type(field) in (serializers.IntegerField, serializers.CharField, serializers.BooleanField):
+            return field.source, RAW, field
+        if (type(field) is serializers.DecimalField and field.decimal_places
+                and getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+                and not (field.localize or field.normalize_output)):
+            return field.source, DECIMAL, field
+        if (type(field) is serializers.DateTimeField and not hasattr(field, 'timezone')
+                and getattr(field, 'format', api_settings.DATETIME_FORMAT) == ISO_8601):
+            return field.source, DATETIME, field
+        return field.source, FIELD, field
+
+    def to_representation(self, instance):
+        row = {}
+        for name, attribute, kind, field in self.plan:
+            value = field.get_attribute(instance) if attribute is None else getattr(instance, attribute)
+            if value is None or kind is RAW:
+                row[name] = value
+            elif kind is DECIMAL:
+                # Values read from the column already carry its scale
+                text = str(value)
+                dot = text.find('.')
+                if type(value) is Decimal and dot != -1 and len(text) - dot - 1 == field.decimal_places:
+                    row[name] = text
+                else:
+                    row[name] = field.to_representation(value)
+            elif kind is DATETIME and self.tz is not None and value.tzinfo is not None:
+                text = value.astimezone(self.tz).isoformat()
+                row[name] = text[:-6] + 'Z' if text.endswith('+00:00') else text
+            else:
+                row[name] = field.to_representation(value)
+        return row
+
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email']
-class StockSerializer(serializers.ModelSerializer):
+class StockSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Stock
         fields = '__all__'
 
-class TransactionSerializer(serializers.ModelSerializer):
+class TransactionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Transaction
         fields = '__all__'
-        read_only_fields = ['price', 'brokerage', 'stt', 'gst', 'sebi_charges', 'stamp_duty']
+        read_only_fields = ['price', 'date', 'brokerage', 'stt', 'gst', 'sebi_charges', 'stamp_duty']
+
+
+class StockListSerializer(ReadOnlyListSerializer):
+    model_serializer = StockSerializer
+
+
+class TransactionListSerializer(ReadOnlyListSerializer):
+    model_serializer = TransactionSerializer
+
 
 class PortfolioSerializer(serializers.ModelSerializer):
     class Meta:
@@ -29,7 +141,8 @@ class CapitalGainsSerializer(serializers.ModelSerializer):
                 
 # stocks/serializers.py
 
-from .services import get_live_stock_price
+from .utils import get_live_stock_price as get_exchange_price
+from .portfolio import summarize_holding
 class PortfolioSummarySerializer(serializers.ModelSerializer):
     stock_symbol = serializers.CharField(source='stock.symbol', read_only=True)
     stock_name = serializers.CharField(source='stock.name', read_only=True)
@@ -53,25 +166,34 @@ class PortfolioSummarySerializer(serializers.ModelSerializer):
             'percentage_return'
         ]
     
+    def get_summary(self, obj):
+        # Every field below reads from one computed row per holding; views
+        # precompute them all in bulk and pass them in as "summary_rows".
+        rows = self.context.setdefault('summary_rows', {})
+        row = rows.get(obj.pk)
+        if row is None:
+            prices = self.context.get('prices')
+            if prices is not None:
+                price = prices.get(obj.stock.symbol)
+            else:
+                price = get_exchange_price(obj.stock.symbol, obj.stock.exchange)
+            row = rows[obj.pk] = summarize_holding(obj, price)
+        return row
+
     def get_current_price(self, obj):
-        price = get_live_stock_price(obj.stock.symbol, obj.stock.exchange)
-        return round(price, 2) if price else 0
+        return self.get_summary(obj)['current_price']
 
     def get_total_investment(self, obj):
-        return round(float(obj.average_price) * float(obj.quantity), 2)
+        return self.get_summary(obj)['total_investment']
 
     def get_current_value(self, obj):
-        current_price = self.get_current_price(obj)
-        return round(current_price * float(obj.quantity), 2)
+        return self.get_summary(obj)['current_value']
 
     def get_unrealized_gain(self, obj):
-        return round(self.get_current_value(obj) - self.get_total_investment(obj), 2)
+        return self.get_summary(obj)['unrealized_gain']
 
     def get_percentage_return(self, obj):
-        investment = self.get_total_investment(obj)
-        if investment == 0:
-            return 0
-        return round((self.get_unrealized_gain(obj) / investment) * 100, 2)
+        return self.get_summary(obj)['percentage_return']
 
 class WatchlistSerializer(serializers.ModelSerializer):
     stock_name = serializers.CharField(source='stock.name', read_only=True)
@@ -101,3 +223,26 @@ class CapitalGainsSerializer(serializers.ModelSerializer):
             'long_term_gain',
             'tax_liability'
         ]
+
+class CapitalGainsYearSerializer(serializers.ModelSerializer):
+    stock_symbol = serializers.CharField(source='stock.symbol', read_only=True)
+    stock_name = serializers.CharField(source='stock.name', read_only=True)
+
+    class Meta:
+        model = CapitalGainsYear
+        fields = [
+            'id',
+            'financial_year',
+            'stock_symbol',
+            'stock_name',
+            'realized_gain',
+            'short_term_gain',
+            'long_term_gain',
+            'tax_liability'
+        ]
+
+
+class PortfolioSnapshotSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PortfolioSnapshot
+        fields = ['date', 'market_value', 'cost_basis', 'realized_pnl', 'unrealized_pnl']
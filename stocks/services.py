@@ -1,13 +1,23 @@
 import yfinance as yf
 
-def get_live_stock_price(symbol):
+from .cache import quote_cache
+from .throttling import UpstreamBusy
+from .utils import fetch_quote_for_request
+
+
+def get_live_stock_price(symbol, max_staleness=None):
+    """Latest price or None; at the upstream fetch cap, the last cached price or UpstreamBusy (a 429)."""
     try:
-        stock = yf.Ticker(symbol)
-        price = stock.history(period="1d")['Close'].iloc[-1]
-        return round(price, 2)
+        price = quote_cache.get(symbol, lambda: fetch_quote_for_request(symbol), max_staleness=max_staleness)
+        return round(price, 2) if price is not None else None
+    except UpstreamBusy:
+        stale, _ = quote_cache.peek(symbol)
+        if stale is None:
+            raise
+        return round(stale, 2)
     except Exception as e:
         return None
-    
+
 
 
 
@@ -21,4 +31,3 @@ def fetch_stock_info(query):
         'name': info.get('longName', query)
     }
 
-
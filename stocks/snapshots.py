@@ -0,0 +1,211 @@
+"""
+Daily PortfolioSnapshot rows, kept up to date incrementally.
+
+Each run compares every user's trade history (count, highest id and latest
+edit) with what their latest snapshot was computed from:
+
+- unchanged: only the days after the latest snapshot are added;
+- new trades only: days from the earliest new trade's date are redone
+  (a backdated import rewrites history from that day on);
+- trades deleted or edited: the user's history is rebuilt from their first
+  trade (an edit may have moved a trade, so its old date isn't known).
+
+Days are valued at the 1d PriceBar close, carried forward over days without
+one (weekends, holidays); before a stock's first bar, its last trade price
+is used. Cost basis is the FIFO cost of the open tax lots, so realized plus
+unrealized PnL add up to the portfolio's total gain.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from itertools import groupby
+
+from django.db import transaction as db_transaction
+from django.db.models import Count, Max, Min, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from .models import PortfolioSnapshot, PriceBar, Stock, Transaction
+from .trading import PositionReplay
+
+TWO_PLACES = Decimal('0.01')
+
+
+def local_day(when):
+    return timezone.localtime(when).date()
+
+
+def plan_snapshots(end, user_ids=None, since=None):
+    """
+    {user_id: first day to (re)compute, or None for a full rebuild} for every
+    user whose snapshots are behind `end` or out of date. Also returns the
+    trade state ({user_id: (count, last_id, updated_at)}) and the users with snapshots
+    but no trades left.
+    """
+    trades = Transaction.objects.all()
+    snapshots = PortfolioSnapshot.objects.all()
+    if user_ids is not None:
+        trades = trades.filter(user_id__in=user_ids)
+        snapshots = snapshots.filter(user_id__in=user_ids)
+
+    state = {row['user_id']: (row['count'], row['last_id'], row['updated_at'])
+             for row in trades.values('user_id')
+             .annotate(count=Count('id'), last_id=Max('id'), updated_at=Max('updated_at'))}
+    latest_date = PortfolioSnapshot.objects.filter(user_id=OuterRef('user_id')).order_by('-date').values('date')[:1]
+    latest = {s.user_id: s for s in snapshots.filter(date=Subquery(latest_date))
+              .only('user_id', 'date', 'transaction_count', 'last_transaction_id', 'transactions_updated_at')}
+
+    plan, appended = {}, {}
+    for user_id, (count, last_id, updated_at) in state.items():
+        snapshot = latest.get(user_id)
+        if snapshot is None or snapshot.transactions_updated_at is None:
+            plan[user_id] = None
+        elif (count, last_id, updated_at) == (snapshot.transaction_count, snapshot.last_transaction_id,
+                                              snapshot.transactions_updated_at):
+            if snapshot.date < end:
+                plan[user_id] = snapshot.date + timedelta(days=1)
+        elif count > snapshot.transaction_count:
+            appended[user_id] = snapshot
+        else:
+            plan[user_id] = None
+
+    if appended:
+        # Did the new trades only add to history, or were some removed or edited too?
+        where, old = Q(), Q()
+        for user_id, snapshot in appended.items():
+            where |= Q(user_id=user_id, id__gt=snapshot.last_transaction_id)
+            old |= Q(user_id=user_id, id__lte=snapshot.last_transaction_id,
+                     updated_at__gt=snapshot.transactions_updated_at)
+        new = {row['user_id']: row for row in Transaction.objects.filter(where).values('user_id')
+               .annotate(count=Count('id'), first=Min('date'))}
+        edited = set(Transaction.objects.filter(old).values_list('user_id', flat=True).distinct())
+        for user_id, snapshot in appended.items():
+            row = new.get(user_id)
+            if row and user_id not in edited and snapshot.transaction_count + row['count'] == state[user_id][0]:
+                plan[user_id] = min(snapshot.date, local_day(row['first']))
+            else:
+                plan[user_id] = None
+
+    if since is not None:
+        for user_id in state:
+            start = plan.get(user_id, since)
+            plan[user_id] = start if start is None else min(start, since)
+
+    orphaned = set(latest) - set(state)
+    return plan, state, orphaned
+
+
+class DailyCloses:
+    """Walks one stock's daily closes forward, a day at a time."""
+
+    def __init__(self, closes):
+        self.closes = closes  # [(day, close)] oldest first
+        self.position = 0
+        self.price = None
+
+    def advance(self, day):
+        while self.position < len(self.closes) and self.closes[self.position][0] <= day:
+            self.price = self.closes[self.position][1]
+            self.position += 1
+        return self.price
+
+
+def load_closes(stock_ids, start_day):
+    """{stock_id: [(day, close)]} from `start_day` on, led by the last close before it."""
+    start = timezone.make_aware(datetime.combine(start_day, time()))
+    previous = PriceBar.objects.filter(stock_id=OuterRef('pk'), interval='1d', ts__lt=start).order_by('-ts')
+    closes = {}
+    for stock_id, ts, close in (Stock.objects.filter(id__in=stock_ids)
+                                .annotate(ts=Subquery(previous.values('ts')[:1]),
+                                          close=Subquery(previous.values('close')[:1]))
+                                .filter(ts__isnull=False).values_list('id', 'ts', 'close')):
+        closes[stock_id] = [(local_day(ts), close)]
+    bars = (PriceBar.objects.filter(stock_id__in=stock_ids, interval='1d', ts__gte=start)
+            .order_by('stock_id', 'ts').values_list('stock_id', 'ts', 'close'))
+    for stock_id, ts, close in bars.iterator(chunk_size=5000):
+        closes.setdefault(stock_id, []).append((local_day(ts), close))
+    return closes
+
+
+def daily_snapshots(user_id, trades, closes, start, end, state):
+    """Unsaved PortfolioSnapshots for start..end, replaying `trades` (oldest first) from the beginning."""
+    count, last_id, updated_at = state
+    replays = {}
+    basis = {}  # stock_id -> FIFO cost of its open lots
+    trade_prices = {}
+    walkers = {}
+    realized = Decimal('0')
+    trades = iter(trades)
+    trade = next(trades, None)
+
+    def apply(trade):
+        nonlocal realized
+        replay = replays.get(trade.stock_id)
+        if replay is None:
+            replay = replays[trade.stock_id] = PositionReplay(user_id, trade.stock_id)
+            walkers[trade.stock_id] = DailyCloses(closes.get(trade.stock_id, []))
+        before = len(replay.gains)
+        replay.apply(trade)
+        realized += sum((g.gain for g in replay.gains[before:]), Decimal('0'))
+        basis[trade.stock_id] = sum((lot.open_quantity * lot.cost for lot in replay.lots), Decimal('0'))
+        trade_prices[trade.stock_id] = Decimal(str(trade.price))
+
+    day = start
+    while day <= end:
+        while trade is not None and local_day(trade.date) <= day:
+            apply(trade)
+            trade = next(trades, None)
+
+        market_value = Decimal('0')
+        for stock_id, replay in replays.items():
+            price = walkers[stock_id].advance(day)
+            if replay.quantity:
+                market_value += replay.quantity * (price if price is not None else trade_prices[stock_id])
+        cost_basis = sum(basis.values(), Decimal('0'))
+        yield PortfolioSnapshot(
+            user_id=user_id,
+            date=day,
+            market_value=market_value.quantize(TWO_PLACES),
+            cost_basis=cost_basis.quantize(TWO_PLACES),
+            realized_pnl=realized.quantize(TWO_PLACES),
+            unrealized_pnl=(market_value - cost_basis).quantize(TWO_PLACES),
+            transaction_count=count,
+            last_transaction_id=last_id,
+            transactions_updated_at=updated_at,
+        )
+        day += timedelta(days=1)
+
+
+def write_snapshots(plan, state, end, batch_size=1000):
+    """
+    Recompute the planned days of every user in `plan` and replace their rows
+    in one transaction. Returns the number of rows written.
+    """
+    user_ids = sorted(plan)
+    trades = list(Transaction.objects.filter(user_id__in=user_ids)
+                  .only('id', 'user_id', 'stock_id', 'transaction_type', 'quantity', 'price', 'date')
+                  .order_by('user_id', 'date', 'id'))
+    by_user = {user_id: list(rows) for user_id, rows in groupby(trades, key=lambda t: t.user_id)}
+
+    starts = {}
+    for user_id in user_ids:
+        first = local_day(by_user[user_id][0].date)
+        starts[user_id] = first if plan[user_id] is None else max(plan[user_id], first)
+    closes = load_closes({t.stock_id for t in trades}, min(starts.values()))
+
+    written = 0
+    with db_transaction.atomic():
+        stale = Q()
+        for user_id in user_ids:
+            stale |= Q(user_id=user_id) if plan[user_id] is None else Q(user_id=user_id, date__gte=starts[user_id])
+        PortfolioSnapshot.objects.filter(stale).delete()
+
+        rows = []
+        for user_id in user_ids:
+            rows.extend(daily_snapshots(user_id, by_user[user_id], closes, starts[user_id], end, state[user_id]))
+            if len(rows) >= batch_size:
+                PortfolioSnapshot.objects.bulk_create(rows, batch_size=batch_size)
+                written += len(rows)
+                rows = []
+        if rows:
+            PortfolioSnapshot.objects.bulk_create(rows, batch_size=batch_size)
+            written += len(rows)
+    return written
@@ -1,3 +1,1328 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import IntegrityError, connection
+from django.test import AsyncClient, SimpleTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from channels.exceptions import ChannelFull
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from rest_framework.exceptions import ParseError
+from rest_framework.test import APIClient
+
+from . import views
+from .cache import TTLCache, quote_cache
+from .models import (User, Stock, Portfolio, Transaction, Watchlist, TaxLot, CapitalGains, CapitalGainsYear,
+                     RealizedGain, PriceBar, PortfolioSnapshot)
+from .gains import financial_year
+from .imports import import_trades
+from .trading import book_trade
+from .charges import CHARGE_FIELDS, charges_batch, charges_for, price_trades, rates_for
+from .utils import get_live_stock_price, get_live_stock_prices
+from .broadcaster import BROADCASTER_CHANNEL, PriceBroadcaster, quote_group
+from .consumers import DashboardConsumer
+from .channel_layers import SQLiteChannelLayer
+from .search import StockIndex, database_search, similarity, stock_index
+from .search_schema import FTS_TABLE, SQLITE_TRIGGERS, missing_search_triggers
+from .throttling import TokenBucketLimiter
+from .serializers import StockListSerializer, StockSerializer, TransactionListSerializer, TransactionSerializer
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TTLCacheTests(SimpleTestCase):
+    def test_hit_miss_and_ttl(self):
+        clock = FakeClock()
+        cache = TTLCache(ttl=10, maxsize=8, clock=clock)
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            return 100.0
+
+        self.assertEqual(cache.get('RELIANCE.NS', fetch), 100.0)
+        self.assertEqual(cache.get('RELIANCE.NS', fetch), 100.0)
+        self.assertEqual(len(calls), 1)
+
+        clock.now = 11
+        cache.get('RELIANCE.NS', fetch)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 2)
+
+    def test_max_staleness_overrides_ttl(self):
+        clock = FakeClock()
+        cache = TTLCache(ttl=10, clock=clock)
+        cache.set('TCS.NS', 3500.0)
+        clock.now = 5
+        self.assertEqual(cache.get('TCS.NS', lambda: 1.0, max_staleness=60), 3500.0)
+        self.assertEqual(cache.get('TCS.NS', lambda: 1.0, max_staleness=1), 1.0)
+
+    def test_lru_eviction_keeps_recent_keys(self):
+        cache = TTLCache(ttl=60, maxsize=2)
+        cache.set('A', 1)
+        cache.set('B', 2)
+        cache.get('A', lambda: None)
+        cache.set('C', 3)
+        self.assertEqual(cache.peek('B'), (None, None))
+        self.assertEqual(cache.peek('A')[0], 1)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_none_is_not_cached(self):
+        cache = TTLCache(ttl=60)
+        self.assertIsNone(cache.get('BAD.NS', lambda: None))
+        self.assertEqual(cache.get('BAD.NS', lambda: 5.0), 5.0)
+
+    def test_concurrent_misses_fetch_once(self):
+        cache = TTLCache(ttl=60)
+        calls = []
+        results = []
+        start = threading.Barrier(10)
+
+        def fetch():
+            calls.append(1)
+            time.sleep(0.05)
+            return 2500.0
+
+        def worker():
+            start.wait()
+            results.append(cache.get('RELIANCE.NS', fetch))
+
+        threads = [threading.Thread(target=worker) for _ in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [2500.0] * 10)
+        self.assertEqual(cache.stats()['coalesced'], 9)
+
+    def test_get_many_fetches_only_missing_keys(self):
+        cache = TTLCache(ttl=60)
+        cache.set('A', 1.0)
+        requested = []
+
+        def fetch_many(keys):
+            requested.append(keys)
+            return {'B': 2.0}
+
+        self.assertEqual(cache.get_many(['A', 'B', 'C'], fetch_many), {'A': 1.0, 'B': 2.0})
+        self.assertEqual(requested, [['B', 'C']])
+        self.assertEqual(cache.peek('B')[0], 2.0)
+
+
+class BatchQuoteTests(TestCase):
+    def setUp(self):
+        quote_cache.invalidate()
+        self.user = User.objects.create_user(email='trader@example.com', password='secret123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_batch_uses_one_download_per_chunk(self):
+        pairs = [('RELIANCE', 'NSE'), ('TCS', 'NSE'), ('SBIN', 'BSE')]
+        with mock.patch('stocks.utils.fetch_quotes', return_value={
+            'RELIANCE.NS': 2900.0, 'TCS.NS': 3500.0,
+        }) as fetch, mock.patch('stocks.utils.QUOTE_BATCH_SIZE', 2):
+            prices = get_live_stock_prices(pairs)
+        self.assertEqual(prices, {'RELIANCE': 2900.0, 'TCS': 3500.0})
+        self.assertEqual(fetch.call_count, 2)
+
+    def test_dashboard_resolves_prices_in_one_batch(self):
+        for i in range(5):
+            stock = Stock.objects.create(symbol=f'SYM{i}', name=f'Company {i}', current_price=Decimal('10'))
+            Portfolio.objects.create(user=self.user, stock=stock, quantity=Decimal('2'), average_price=Decimal('10'))
+        Watchlist.objects.create(user=self.user, stock=Stock.objects.create(symbol='WATCH', name='Watched'))
+
+        with mock.patch('stocks.utils.get_live_stock_prices', return_value={'SYM0': 20.0}) as batch, \
+                mock.patch('stocks.views.get_live_stock_price') as single:
+            response = self.client.get('/api/dashboard/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(batch.call_count, 1)
+        self.assertEqual(len(batch.call_args[0][0]), 6)
+        single.assert_not_called()
+        self.assertEqual(response.json()['net_worth'], 20.0 * 2 + 10.0 * 2 * 4)
+
+
+class UpdateStockPricesCommandTests(TestCase):
+    def test_updates_in_chunks_and_retries_failures_once(self):
+        for symbol in ['AAA', 'BBB', 'CCC']:
+            Stock.objects.create(symbol=symbol, name=symbol)
+        with mock.patch('stocks.management.commands.update_stock_prices.fetch_quotes',
+                        side_effect=[{'AAA.NS': 10.0, 'BBB.NS': 20.0}, {}, {'CCC.NS': 30.0}]) as fetch:
+            out = StringIO()
+            call_command('update_stock_prices', chunk_size=2, workers=1, retry_delay=0, stdout=out)
+
+        self.assertEqual(fetch.call_count, 3)
+        self.assertEqual(
+            dict(Stock.objects.values_list('symbol', 'current_price')),
+            {'AAA': Decimal('10.00'), 'BBB': Decimal('20.00'), 'CCC': Decimal('30.00')},
+        )
+        self.assertIn('Updated 3/3 stocks', out.getvalue())
+
+    def test_failed_symbols_are_retried_once_by_default(self):
+        Stock.objects.create(symbol='AAA', name='AAA')
+        with mock.patch('stocks.management.commands.update_stock_prices.fetch_quotes', return_value={}) as fetch, \
+                mock.patch('stocks.management.commands.update_stock_prices.time.sleep') as sleep:
+            out = StringIO()
+            call_command('update_stock_prices', stdout=out)
+
+        self.assertEqual(fetch.call_count, 2)
+        self.assertEqual(sleep.call_count, 1)
+        self.assertIn('Price not found for AAA', out.getvalue())
+
+    def test_retries_back_off_exponentially_a_bounded_number_of_times(self):
+        Stock.objects.create(symbol='AAA', name='AAA')
+        with mock.patch('stocks.management.commands.update_stock_prices.fetch_quotes', return_value={}) as fetch, \
+                mock.patch('stocks.management.commands.update_stock_prices.time.sleep') as sleep, \
+                mock.patch('stocks.management.commands.update_stock_prices.random.uniform',
+                           side_effect=lambda low, high: high):
+            call_command('update_stock_prices', retries=4, retry_delay=1, max_retry_delay=5, stdout=StringIO())
+
+        self.assertEqual(fetch.call_count, 5)
+        self.assertEqual([c.args[0] for c in sleep.call_args_list], [1, 2, 4, 5])
+
+
+class ImportStocksCommandTests(TestCase):
+    def write_csv(self, text):
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(handle, 'w') as f:
+            f.write(text)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_bulk_upsert_and_dry_run(self):
+        Stock.objects.create(symbol='TCS.NS', name='Old Name')
+        Stock.objects.create(symbol='INFY.NS', name='Infosys Limited')
+        nse = self.write_csv(
+            'SYMBOL,NAME OF COMPANY, SERIES\n'
+            'TCS,Tata Consultancy Services Limited,EQ\n'
+            'INFY,Infosys Limited,EQ\n'
+            'SBIN,State Bank of India,EQ\n'
+        )
+        bse = self.write_csv(
+            'Security Code,Issuer Name,Security Id,Security Name,Status\n'
+            '500325,Reliance,RELIANCE,RELIANCE INDUSTRIES LTD.,Active\n'
+        )
+
+        out = StringIO()
+        call_command('import_stocks', file=nse, bse_file=bse, dry_run=True, stdout=out)
+        self.assertIn('2 new, 1 changed, 1 unchanged', out.getvalue())
+        self.assertEqual(Stock.objects.count(), 2)
+
+        with self.assertNumQueries(3):
+            call_command('import_stocks', file=nse, bse_file=bse, stdout=StringIO())
+        self.assertEqual(Stock.objects.get(symbol='TCS.NS').name, 'Tata Consultancy Services Limited')
+        self.assertEqual(Stock.objects.get(symbol='RELIANCE.BO').exchange, 'BSE')
+        self.assertEqual(Stock.objects.count(), 4)
+
+    def test_suffixed_symbols_longer_than_ten_characters(self):
+        nse = self.write_csv(
+            'SYMBOL,NAME OF COMPANY\n'
+            'BAJAJHLDNG,Bajaj Holdings & Investment Limited\n'
+            f'{"X" * 40},Far Too Long Limited\n'
+        )
+        out = StringIO()
+        call_command('import_stocks', file=nse, stdout=out)
+
+        stock = Stock.objects.get(symbol='BAJAJHLDNG.NS')
+        stock.full_clean()  # within max_length, which Postgres enforces
+        self.assertEqual(Stock.objects.count(), 1)
+        self.assertIn('symbol too long', out.getvalue())
+
+
+class PortfolioSummaryTests(TestCase):
+    def setUp(self):
+        quote_cache.invalidate()
+        self.user = User.objects.create_user(email='holder@example.com', password='secret123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_summary_rows_and_totals_from_one_batch(self):
+        tcs = Stock.objects.create(symbol='TCS', name='TCS')
+        infy = Stock.objects.create(symbol='INFY', name='Infosys')
+        Portfolio.objects.create(user=self.user, stock=tcs, quantity=Decimal('10'), average_price=Decimal('100'))
+        Portfolio.objects.create(user=self.user, stock=infy, quantity=Decimal('5'), average_price=Decimal('200'))
+
+        with mock.patch('stocks.views.get_live_stock_prices', return_value={'TCS': 110.0}) as batch, \
+                mock.patch('stocks.serializers.get_exchange_price') as single:
+            response = self.client.get('/api/portfolio/summary/', {'include': 'totals'})
+
+        self.assertEqual(response.status_code, 200)
+        batch.assert_called_once()
+        single.assert_not_called()
+        rows = {row['stock_symbol']: row for row in response.data['holdings']}
+        self.assertEqual(rows['TCS']['current_value'], 1100.0)
+        self.assertEqual(rows['TCS']['percentage_return'], 10.0)
+        self.assertEqual(rows['INFY']['current_price'], 0)
+        self.assertEqual(response.data['totals'], {
+            'holdings': 2,
+            'total_investment': 2000.0,
+            'current_value': 1100.0,
+            'unrealized_gain': -900.0,
+            'percentage_return': -45.0,
+        })
+
+    def test_summary_is_a_plain_list_by_default(self):
+        stock = Stock.objects.create(symbol='TCS', name='TCS')
+        Portfolio.objects.create(user=self.user, stock=stock, quantity=Decimal('10'), average_price=Decimal('100'))
+
+        with mock.patch('stocks.views.get_live_stock_prices', return_value={'TCS': 110.0}):
+            response = self.client.get('/api/portfolio/summary/')
+
+        self.assertIsInstance(response.data, list)
+        self.assertEqual([row['stock_symbol'] for row in response.data], ['TCS'])
+
+
+class DashboardQueryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='dash@example.com', password='secret123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        Watchlist.objects.create(user=self.user, stock=Stock.objects.create(symbol='WATCH', name='Watched'))
+
+    def add_holdings(self, count):
+        for i in range(count):
+            stock = Stock.objects.create(symbol=f'H{Stock.objects.count()}', name='Holding')
+            Portfolio.objects.create(user=self.user, stock=stock, quantity=Decimal('4'), average_price=Decimal('10'))
+            Transaction.objects.create(user=self.user, stock=stock, transaction_type='BUY',
+                                       quantity=Decimal('4'), price=Decimal('10'))
+            Transaction.objects.create(user=self.user, stock=stock, transaction_type='SELL',
+                                       quantity=Decimal('1'), price=Decimal('12.5'))
+
+    def get_dashboard(self, prices=None):
+        with mock.patch('stocks.views.aget_live_stock_prices', new_callable=mock.AsyncMock, return_value=prices or {}):
+            return self.client.get('/api/dashboard/')
+
+    def test_query_count_is_constant_in_holdings(self):
+        self.add_holdings(1)
+        with self.assertNumQueries(3):
+            response = self.get_dashboard()
+        self.assertEqual(response.json()['todays_pnl'], 12.5 - 40)
+
+        self.add_holdings(9)
+        with self.assertNumQueries(3):
+            response = self.get_dashboard()
+        self.assertEqual(response.json()['todays_pnl'], (12.5 - 40) * 10)
+
+    def test_requires_authentication(self):
+        self.assertEqual(APIClient().get('/api/dashboard/').status_code, 401)
+        self.assertEqual(APIClient(HTTP_AUTHORIZATION='Token nope').get('/api/dashboard/').status_code, 401)
+
+    def test_slow_quotes_fall_back_to_stored_price_at_the_deadline(self):
+        stock = Stock.objects.create(symbol='SLOW.NS', name='Slow', current_price=Decimal('12'))
+        Portfolio.objects.create(user=self.user, stock=stock, quantity=Decimal('2'), average_price=Decimal('10'))
+        fast = Stock.objects.create(symbol='FAST.NS', name='Fast', current_price=Decimal('1'))
+        Portfolio.objects.create(user=self.user, stock=fast, quantity=Decimal('1'), average_price=Decimal('1'))
+
+        def quotes(pairs, max_staleness=None):
+            if any(symbol == 'SLOW.NS' for symbol, _ in pairs):
+                time.sleep(0.5)
+            return {symbol: 5.0 for symbol, _ in pairs}
+
+        quote_cache.invalidate()
+        started = time.monotonic()
+        with mock.patch('stocks.utils.get_live_stock_prices', side_effect=quotes), \
+                mock.patch('stocks.utils.QUOTE_BATCH_SIZE', 1), \
+                override_settings(QUOTE_CACHE={**settings.QUOTE_CACHE, 'DEADLINE': 0.1}):
+            response = self.client.get('/api/dashboard/')
+        self.assertLess(time.monotonic() - started, 0.4)
+        # SLOW missed the deadline: 2 x stored 12; FAST made it: 1 x live 5
+        self.assertEqual(response.json()['net_worth'], 29.0)
+
+
+class StockSearchTests(TestCase):
+    ROWS = [
+        (1, 'TCS.NS', 'Tata Consultancy Services Limited'),
+        (2, 'TATAMOTORS.NS', 'Tata Motors Limited'),
+        (3, 'WSTCSTPAPR.NS', 'West Coast Paper Mills Limited'),
+        (4, 'TCSLTD.BO', 'Some Other Limited'),
+        (5, 'INFY.NS', 'Infosys Limited'),
+    ]
+
+    def test_ranking(self):
+        index = StockIndex(self.ROWS)
+        # exact symbol > symbol prefix > substring
+        self.assertEqual(index.search('tcs'), [1, 4, 3])
+        # name-word prefixes, every word must match
+        self.assertEqual(index.search('tata mot'), [2])
+        self.assertEqual(index.search('tata', limit=1), [2])
+        self.assertEqual(index.search('ltd'), [4])
+        self.assertEqual(index.search('zzz'), [])
+
+    def test_endpoint_follows_catalog_changes(self):
+        stock_index.invalidate()
+        Stock.objects.create(symbol='INFY.NS', name='Infosys Limited')
+        client = APIClient()
+        self.assertEqual([s['symbol'] for s in client.get('/api/search-stocks/', {'q': 'inf'}).data], ['INFY.NS'])
+
+        Stock.objects.create(symbol='INFIBEAM.NS', name='Infibeam Avenues Limited')
+        with self.assertNumQueries(2):  # index rebuild + one pk fetch
+            response = client.get('/api/search-stocks/', {'q': 'inf'})
+        self.assertEqual([s['symbol'] for s in response.data], ['INFY.NS', 'INFIBEAM.NS'])
+        self.assertEqual(client.get('/api/search-stocks/').status_code, 400)
+
+    def test_search_settings_are_optional(self):
+        stock_index.invalidate()
+        Stock.objects.create(symbol='INFY.NS', name='Infosys Limited')
+        with override_settings():
+            del settings.STOCK_SEARCH
+            response = APIClient().get('/api/search-stocks/', {'q': 'inf'})
+        self.assertEqual([s['symbol'] for s in response.data], ['INFY.NS'])
+
+
+@override_settings(STOCK_SEARCH={'BACKEND': 'database', 'INDEX_TTL': 300})
+class DatabaseSearchTests(TestCase):
+    def setUp(self):
+        Stock.objects.bulk_create([
+            Stock(symbol='RELIANCE.NS', name='Reliance Industries Limited'),
+            Stock(symbol='RPOWER.NS', name='Reliance Power Limited'),
+            Stock(symbol='INFY.NS', name='Infosys Limited'),
+            Stock(symbol='TCS.NS', name='Tata Consultancy Services Limited'),
+        ])
+
+    def symbols(self, query, limit=20):
+        ids = database_search.search(query, limit)
+        found = Stock.objects.in_bulk(ids)
+        return [found[pk].symbol for pk in ids]
+
+    def test_ranking_matches_memory_backend(self):
+        self.assertEqual(self.symbols('tcs'), ['TCS.NS'])
+        self.assertEqual(self.symbols('reliance'), ['RELIANCE.NS', 'RPOWER.NS'])
+        self.assertEqual(self.symbols('tata cons'), ['TCS.NS'])
+
+    def test_typos(self):
+        self.assertGreaterEqual(similarity('relaince', 'Reliance Industries'), 0.3)
+        self.assertIn('RELIANCE.NS', self.symbols('relaince'))
+        self.assertIn('INFY.NS', self.symbols('infosis'))
+        self.assertEqual(self.symbols('zzzz'), [])
+
+    def test_bulk_writes_are_searchable(self):
+        # Triggers keep the FTS table in step even without model signals
+        Stock.objects.filter(symbol='INFY.NS').update(name='Infosys Technologies')
+        self.assertIn('INFY.NS', self.symbols('technolog'))
+        Stock.objects.filter(symbol='INFY.NS').delete()
+        self.assertEqual(self.symbols('infosys'), [])
+
+    def test_endpoint_uses_configured_backend(self):
+        response = APIClient().get('/api/search-stocks/', {'q': 'infosis'})
+        self.assertEqual([s['symbol'] for s in response.data], ['INFY.NS'])
+
+    def requires_fts(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('FTS5 triggers are SQLite only')
+        if FTS_TABLE not in connection.introspection.table_names():
+            self.skipTest('This SQLite build has no FTS5 trigram tokenizer')
+
+    def test_sync_triggers_exist_after_all_migrations(self):
+        self.requires_fts()
+        self.assertEqual(missing_search_triggers(connection), [])
+
+    def test_post_migrate_restores_dropped_triggers_and_reindexes(self):
+        self.requires_fts()
+        with connection.cursor() as cursor:
+            for name in SQLITE_TRIGGERS:
+                cursor.execute(f'DROP TRIGGER {name}')
+        Stock.objects.filter(symbol='INFY.NS').update(name='Infosys Technologies')
+        self.assertEqual(missing_search_triggers(connection), list(SQLITE_TRIGGERS))
+
+        emit_post_migrate_signal(verbosity=0, interactive=False, db=connection.alias)
+
+        self.assertEqual(missing_search_triggers(connection), [])
+        self.assertIn('INFY.NS', self.symbols('technolog'))
+
+
+class PositionIndexTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='idx@example.com', password='secret123')
+        self.stock = Stock.objects.create(symbol='IDX', name='Index')
+
+    def assertUsesIndex(self, queryset, name):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Plan assertions are written against SQLite EXPLAIN QUERY PLAN')
+        self.assertIn(name, queryset.explain())
+
+    def test_open_positions_use_partial_index(self):
+        self.assertUsesIndex(Portfolio.objects.filter(user=self.user, quantity__gt=0), 'portfolio_open_idx')
+
+    def test_todays_trades_use_composite_index(self):
+        start = datetime.now(dt_timezone.utc)
+        qs = Transaction.objects.filter(user=self.user, stock_id__in=[self.stock.pk],
+                                        date__gte=start, date__lt=start + timedelta(days=1))
+        self.assertUsesIndex(qs, 'txn_user_stock_date_idx')
+
+    def assertIndexedOn(self, queryset, lookup):
+        # Unique constraints and FK indexes have generated names (sqlite_autoindex_*), so match the key instead
+        if connection.vendor != 'sqlite':
+            self.skipTest('Plan assertions are written against SQLite EXPLAIN QUERY PLAN')
+        plan = queryset.explain()
+        self.assertRegex(plan, r'SEARCH \S+ USING (COVERING )?INDEX \S+ \(' + re.escape(lookup) + r'\)')
+        self.assertNotIn('SCAN', plan)
+
+    def test_position_lookups_use_unique_constraints(self):
+        for model in (Portfolio, CapitalGains, Watchlist):
+            with self.subTest(model=model.__name__):
+                self.assertIndexedOn(model.objects.filter(user=self.user, stock=self.stock),
+                                     'user_id=? AND stock_id=?')
+
+    def test_watchlist_lookup_uses_user_index(self):
+        self.assertIndexedOn(Watchlist.objects.filter(user=self.user), 'user_id=?')
+
+    def test_one_portfolio_row_per_position(self):
+        Portfolio.objects.create(user=self.user, stock=self.stock, quantity=Decimal('1'), average_price=Decimal('1'))
+        with self.assertRaises(IntegrityError):
+            Portfolio.objects.create(user=self.user, stock=self.stock, quantity=Decimal('1'), average_price=Decimal('1'))
+
+
+class TradeBookingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='fifo@example.com', password='secret123')
+        self.stock = Stock.objects.create(symbol='TCS', name='TCS')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def book(self, transaction_type, quantity, price):
+        with mock.patch('stocks.views.get_live_stock_price', return_value=price):
+            response = self.client.post('/api/transactions/', {
+                'user': self.user.id,
+                'stock': self.stock.id,
+                'transaction_type': transaction_type,
+                'quantity': quantity,
+            })
+        self.assertEqual(response.status_code, 201, response.data)
+        return response
+
+    def test_sell_consumes_oldest_lots_without_touching_buys(self):
+        self.book('BUY', '10', 100)
+        self.book('BUY', '10', 120)
+        self.book('SELL', '15', 150)
+
+        self.assertEqual(
+            sorted(Transaction.objects.filter(transaction_type='BUY').values_list('quantity', flat=True)),
+            [Decimal('10'), Decimal('10')],
+        )
+        lots = list(TaxLot.objects.order_by('acquired_at').values_list('open_quantity', 'is_open'))
+        self.assertEqual(lots, [(Decimal('0'), False), (Decimal('5'), True)])
+
+    def test_sell_records_ledger_and_yearly_rollups(self):
+        self.book('BUY', '10', 100)
+        self.book('BUY', '10', 120)
+        self.book('SELL', '15', 150)
+
+        self.assertEqual(
+            list(RealizedGain.objects.order_by('id').values_list('quantity', 'gain', 'term')),
+            [(Decimal('10'), Decimal('500'), 'STCG'), (Decimal('5'), Decimal('150'), 'STCG')],
+        )
+        self.assertEqual(CapitalGains.objects.get().short_term_gain, Decimal('650'))
+        year = financial_year(Transaction.objects.filter(transaction_type='SELL').get().date)
+
+        response = self.client.get('/api/capital-gains/', {'financial_year': year})
+        self.assertEqual(response.data[0]['tax_liability'], '97.50')
+        response = self.client.get('/api/capital-gains/tax-report/')
+        self.assertEqual(response.data[0]['financial_year'], year)
+        self.assertEqual(response.data[0]['realized_gain'], Decimal('650'))
+
+    def test_buy_costs_three_writes(self):
+        self.book('BUY', '10', 100)
+        with CaptureQueriesContext(connection) as queries:
+            book_trade(self.user, self.stock, 'BUY', Decimal('5'), Decimal('110'))
+        writes = [q['sql'] for q in queries if q['sql'].startswith(('INSERT', 'UPDATE'))]
+        self.assertEqual(len(writes), 3)
+        self.assertEqual(Transaction.objects.last().brokerage, Decimal('0.16'))
+
+    def test_sell_upserts_each_rollup_once(self):
+        self.book('BUY', '10', 100)
+        self.book('BUY', '10', 120)
+        self.book('SELL', '5', 150)
+        with CaptureQueriesContext(connection) as queries:
+            book_trade(self.user, self.stock, 'SELL', Decimal('10'), Decimal('90'))
+        writes = [q['sql'] for q in queries if q['sql'].startswith(('INSERT', 'UPDATE'))]
+        self.assertEqual(len(writes), 6)
+
+        # 5 x (150 - 100) + 5 x (90 - 100) + 5 x (90 - 120)
+        gains = CapitalGains.objects.get()
+        self.assertEqual((gains.short_term_gain, gains.realized_gain), (Decimal('50'), Decimal('50')))
+        self.assertEqual(gains.tax_liability, Decimal('7.50'))
+        year = CapitalGainsYear.objects.get()
+        self.assertEqual((year.realized_gain, year.tax_liability), (Decimal('50'), Decimal('7.50')))
+
+    def test_financial_year_boundaries(self):
+        self.assertEqual(financial_year(datetime(2025, 3, 31, 12, tzinfo=dt_timezone.utc)), '2024-25')
+        self.assertEqual(financial_year(datetime(2025, 4, 1, 12, tzinfo=dt_timezone.utc)), '2025-26')
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    """
+    On SQLite this exercises the in-process position locks; on backends with
+    SELECT ... FOR UPDATE (PostgreSQL) the row locks alone serialize bookings.
+    """
+
+    def book_in_parallel(self):
+        user = User.objects.create_user(email='burst@example.com', password='secret123')
+        stock = Stock.objects.create(symbol='INFY', name='Infosys')
+        errors = []
+
+        def run(trade_type, count, price):
+            try:
+                for _ in range(count):
+                    book_trade(user, stock, trade_type, Decimal('1'), Decimal(price))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        def burst(trade_type, price, threads=8, count=5):
+            workers = [threading.Thread(target=run, args=(trade_type, count, price)) for _ in range(threads)]
+            for t in workers:
+                t.start()
+            for t in workers:
+                t.join()
+
+        burst('BUY', '100')
+        burst('SELL', '110', threads=4, count=4)
+
+        self.assertEqual(errors, [])
+        portfolio = Portfolio.objects.get(user=user, stock=stock)
+        self.assertEqual(portfolio.quantity, Decimal('24'))
+        self.assertEqual(portfolio.average_price, Decimal('100'))
+        self.assertEqual(Transaction.objects.count(), 56)
+        self.assertEqual(sum(TaxLot.objects.values_list('open_quantity', flat=True)), Decimal('24'))
+        self.assertEqual(CapitalGains.objects.get(user=user).realized_gain, Decimal('160'))
+        return user, stock
+
+    def test_parallel_trades_for_one_position(self):
+        self.book_in_parallel()
+
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_row_locks_serialize_without_process_locks(self):
+        with mock.patch('stocks.trading._position_locks', None):  # any use would raise
+            user, stock = self.book_in_parallel()
+            with CaptureQueriesContext(connection) as queries:
+                book_trade(user, stock, 'SELL', Decimal('1'), Decimal('110'))
+        self.assertTrue(any('FOR UPDATE' in q['sql'] for q in queries))
+
+
+class BulkTradeImportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='importer@example.com', password='secret123')
+        self.tcs = Stock.objects.create(symbol='TCS.NS', name='TCS')
+        self.infy = Stock.objects.create(symbol='INFY.NS', name='Infosys')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_invalid_rows_are_reported_and_nothing_is_written(self):
+        response = self.client.post('/api/transactions/bulk/', [
+            {'symbol': 'TCS', 'transaction_type': 'BUY', 'quantity': '5', 'price': '3000', 'date': '2024-01-10'},
+            {'symbol': 'NOPE', 'transaction_type': 'HOLD', 'quantity': '-1', 'price': '10', 'date': 'soon'},
+        ], format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'][0]['row'], 2)
+        self.assertEqual(set(response.data['errors'][0]['errors']),
+                         {'symbol', 'transaction_type', 'quantity', 'date'})
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_csv_import_replays_positions_in_trade_date_order(self):
+        body = (
+            'symbol,transaction_type,quantity,price,date\n'
+            'TCS,SELL,5,3300,15-03-2024\n'
+            'TCS,BUY,10,3000,10-01-2022\n'
+            'INFY,BUY,4,1500,2024-02-01\n'
+        )
+        response = self.client.post('/api/transactions/bulk/', body, content_type='text/csv')
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['imported'], 3)
+        self.assertEqual(Portfolio.objects.get(stock=self.tcs).quantity, Decimal('5'))
+        self.assertEqual(TaxLot.objects.get(stock=self.tcs).open_quantity, Decimal('5'))
+        gain = RealizedGain.objects.get()
+        self.assertEqual((gain.gain, gain.term, gain.financial_year), (Decimal('1500'), 'LTCG', '2023-24'))
+        self.assertEqual(CapitalGains.objects.get(stock=self.tcs).long_term_gain, Decimal('1500'))
+
+    def test_query_count_does_not_grow_with_rows(self):
+        def rows(count):
+            return [{'symbol': symbol, 'transaction_type': 'BUY', 'quantity': '1', 'price': '100',
+                     'date': f'2024-01-{day:02d}'}
+                    for day in range(1, count + 1) for symbol in ('TCS', 'INFY')]
+
+        # First import creates the positions; compare later imports that update them
+        self.client.post('/api/transactions/bulk/', rows(1), format='json')
+        with CaptureQueriesContext(connection) as small:
+            self.client.post('/api/transactions/bulk/', rows(2), format='json')
+        with CaptureQueriesContext(connection) as large:
+            self.client.post('/api/transactions/bulk/', rows(20), format='json')
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(Portfolio.objects.get(stock=self.infy).quantity, Decimal('23'))
+
+
+class ChargesEngineTests(SimpleTestCase):
+    def test_batch_matches_decimal_path_exactly(self):
+        rng = random.Random(7)
+        prices = [rng.randint(1, 2_000_000) for _ in range(3000)]
+        quantities = [rng.randint(1, 500_000) for _ in range(3000)]
+        # Round-half-even ties and the brokerage cap boundary
+        prices += [1650, 5000, 6666667, 100]
+        quantities += [100, 1_333_333, 100, 100]
+        buys = [i % 2 == 0 for i in range(len(prices))]
+        rates = rates_for()
+
+        batch = charges_batch(prices, quantities, buys, rates)
+        for i, (price, quantity) in enumerate(zip(prices, quantities)):
+            expected = charges_for(Decimal(price).scaleb(-2), Decimal(quantity).scaleb(-2),
+                                   'BUY' if buys[i] else 'SELL', rates)
+            actual = {field: Decimal(int(batch[field][i])).scaleb(-2) for field in CHARGE_FIELDS}
+            self.assertEqual(actual, expected, (price, quantity))
+
+    def test_price_trades_falls_back_for_huge_turnover(self):
+        trade = Transaction(transaction_type='BUY', quantity=Decimal('99999999.99'), price=Decimal('99999999.99'))
+        self.assertEqual(price_trades([trade]), [trade])
+        self.assertEqual(trade.brokerage, Decimal('20'))
+        self.assertEqual(trade.stt, charges_for(trade.price, trade.quantity, 'BUY')['stt'])
+
+
+class RecomputeChargesCommandTests(TestCase):
+    def test_reprices_only_stale_rows(self):
+        user = User.objects.create_user(email='charges@example.com', password='secret123')
+        stock = Stock.objects.create(symbol='TCS', name='TCS')
+        stale = Transaction.objects.create(user=user, stock=stock, transaction_type='BUY',
+                                           quantity=Decimal('10'), price=Decimal('3000'))
+        fresh = Transaction(user=user, stock=stock, transaction_type='SELL',
+                            quantity=Decimal('1'), price=Decimal('100'))
+        price_trades([fresh])
+        fresh.save()
+
+        out = StringIO()
+        call_command('recompute_charges', chunk_size=1, stdout=out)
+
+        self.assertIn('Updated 1 of 2', out.getvalue())
+        stale.refresh_from_db()
+        self.assertEqual((stale.brokerage, stale.stt, stale.gst), (Decimal('9.00'), Decimal('30.00'), Decimal('1.62')))
+
+
+class RebuildPortfoliosCommandTests(TestCase):
+    def test_rebuild_repairs_drifted_rows(self):
+        user = User.objects.create_user(email='drift@example.com', password='secret123')
+        tcs = Stock.objects.create(symbol='TCS', name='TCS')
+        gone = Stock.objects.create(symbol='GONE', name='Gone')
+        book_trade(user, tcs, 'BUY', Decimal('10'), Decimal('100'))
+        book_trade(user, tcs, 'SELL', Decimal('4'), Decimal('130'))
+
+        # Drift: double-counted gains, wrong quantity and a stale holding with no trades
+        CapitalGains.objects.filter(user=user).update(realized_gain=Decimal('240'), short_term_gain=Decimal('240'))
+        Portfolio.objects.filter(user=user, stock=tcs).update(quantity=Decimal('2'))
+        Portfolio.objects.create(user=user, stock=gone, quantity=Decimal('3'), average_price=Decimal('1'))
+
+        out = StringIO()
+        call_command('rebuild_portfolios', users=[user.email], stdout=out)
+
+        self.assertIn('Rebuilt 2 positions for 1 users from 2 transactions', out.getvalue())
+        self.assertEqual(Portfolio.objects.get(stock=tcs).quantity, Decimal('6'))
+        self.assertEqual(Portfolio.objects.get(stock=gone).quantity, Decimal('0'))
+        self.assertEqual(CapitalGains.objects.get(user=user, stock=tcs).realized_gain, Decimal('120'))
+        self.assertEqual(TaxLot.objects.get(stock=tcs).open_quantity, Decimal('6'))
+        self.assertEqual(RealizedGain.objects.count(), 1)
+
+    def legacy_position(self, user, stock, bought, sold):
+        # What migration 0009 left behind: the SELL reduced its BUY in place and has no ledger rows
+        buy = Transaction.objects.create(user=user, stock=stock, transaction_type='BUY',
+                                         quantity=bought - sold, price=Decimal('100'))
+        Transaction.objects.create(user=user, stock=stock, transaction_type='SELL', quantity=sold, price=Decimal('130'))
+        if bought > sold:
+            TaxLot.objects.create(user=user, stock=stock, buy_transaction=buy, quantity=bought - sold,
+                                  open_quantity=bought - sold, cost=buy.price, acquired_at=buy.date)
+        Portfolio.objects.create(user=user, stock=stock, quantity=bought - sold, average_price=Decimal('100'))
+        CapitalGains.objects.create(user=user, stock=stock, realized_gain=sold * 30, short_term_gain=sold * 30)
+
+    def test_legacy_positions_are_left_untouched(self):
+        user = User.objects.create_user(email='legacy@example.com', password='secret123')
+        tcs = Stock.objects.create(symbol='TCS', name='TCS')
+        infy = Stock.objects.create(symbol='INFY', name='Infosys')
+        wipro = Stock.objects.create(symbol='WIPRO', name='Wipro')
+        self.legacy_position(user, tcs, Decimal('10'), Decimal('4'))
+        self.legacy_position(user, infy, Decimal('5'), Decimal('5'))  # BUY consumed down to 0
+        book_trade(user, wipro, 'BUY', Decimal('3'), Decimal('50'))
+        Portfolio.objects.filter(stock=wipro).update(quantity=Decimal('1'))
+
+        with self.assertRaisesMessage(CommandError, '2 positions have BUY quantities reduced'):
+            call_command('rebuild_portfolios', stdout=StringIO())
+
+        self.assertEqual(Portfolio.objects.get(stock=tcs).quantity, Decimal('6'))
+        self.assertEqual(TaxLot.objects.get(stock=tcs).open_quantity, Decimal('6'))
+        self.assertEqual(CapitalGains.objects.get(stock=tcs).realized_gain, Decimal('120'))
+        self.assertEqual(CapitalGains.objects.get(stock=infy).realized_gain, Decimal('150'))
+        self.assertEqual(Portfolio.objects.get(stock=wipro).quantity, Decimal('3'))
+
+        # Importing into a legacy position would replay it too
+        result = import_trades(user, [{'symbol': 'TCS', 'transaction_type': 'BUY', 'quantity': '1',
+                                       'price': '120', 'date': '2024-01-10'}])
+        self.assertEqual(result['imported'], 0)
+        self.assertEqual(Transaction.objects.filter(stock=tcs).count(), 2)
+
+    def test_parallel_workers_are_refused_on_sqlite(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite only')
+        with self.assertRaisesMessage(CommandError, '--workers > 1'):
+            call_command('rebuild_portfolios', workers=2, stdout=StringIO())
+
+
+class FakePriceSource:
+    def __init__(self, prices):
+        self.prices = prices
+        self.calls = []
+
+    async def fetch(self, symbols):
+        self.calls.append(list(symbols))
+        return {s: self.prices[s] for s in symbols if s in self.prices}
+
+
+class PriceBroadcasterTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.layer = InMemoryChannelLayer()
+        self.source = FakePriceSource({'INFY.NS': 1500.0, 'TCS.NS': 3900.0})
+        self.broadcaster = PriceBroadcaster(source=self.source, layer=self.layer, interval=1, lease=30,
+                                            clock=lambda: self.now)
+
+    async def test_each_symbol_polled_once_and_only_changes_published(self):
+        viewers = [await self.layer.new_channel() for _ in range(3)]
+        for channel in viewers[:2]:
+            await self.layer.group_add(quote_group('INFY.NS'), channel)
+            await self.broadcaster.handle({'type': 'subscribe', 'channel': channel, 'symbols': ['INFY.NS']})
+        await self.layer.group_add(quote_group('TCS.NS'), viewers[2])
+        await self.broadcaster.handle({'type': 'subscribe', 'channel': viewers[2], 'symbols': ['TCS.NS']})
+
+        self.assertEqual(await self.broadcaster.tick(), 2)
+        self.assertEqual(self.source.calls, [['INFY.NS', 'TCS.NS']])
+        self.assertEqual(await self.broadcaster.tick(), 0)
+
+        self.source.prices['TCS.NS'] = 3910.0
+        self.assertEqual(await self.broadcaster.tick(), 1)
+        # Per-symbol groups: INFY viewers only ever see INFY
+        self.assertEqual(await self.layer.receive(viewers[0]), {'type': 'price.update', 'symbol': 'INFY.NS', 'price': 1500.0})
+        self.assertEqual((await self.layer.receive(viewers[2]))['price'], 3900.0)
+        self.assertEqual((await self.layer.receive(viewers[2]))['price'], 3910.0)
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(self.layer.receive(viewers[0]), 0.05)
+
+    async def test_late_subscriber_gets_last_price_immediately(self):
+        await self.broadcaster.handle({'type': 'subscribe', 'channel': 'first', 'symbols': ['INFY.NS']})
+        await self.broadcaster.tick()
+        late = await self.layer.new_channel()
+        await self.broadcaster.handle({'type': 'subscribe', 'channel': late, 'symbols': ['INFY.NS']})
+        self.assertEqual((await self.layer.receive(late))['price'], 1500.0)
+
+    def test_group_names_are_channel_layer_safe(self):
+        self.assertEqual(quote_group('RELIANCE.NS'), 'quote.RELIANCE.NS')
+        self.assertEqual(quote_group('M&M.NS'), 'quote.M_26M.NS')
+        self.assertEqual(quote_group('A_B'), 'quote.A_5FB')
+
+    async def test_unsubscribed_and_expired_symbols_stop_being_polled(self):
+        await self.broadcaster.handle({'type': 'subscribe', 'channel': 'a', 'symbols': ['INFY.NS']})
+        await self.broadcaster.handle({'type': 'subscribe', 'channel': 'b', 'symbols': ['TCS.NS']})
+        await self.broadcaster.handle({'type': 'unsubscribe', 'channel': 'a', 'symbols': ['INFY.NS']})
+        self.assertEqual(self.broadcaster.watched(), ['TCS.NS'])
+
+        self.now = 31
+        self.assertEqual(self.broadcaster.watched(), [])
+        self.assertEqual(await self.broadcaster.tick(), 0)
+        self.assertEqual(self.source.calls, [])
+
+    def test_http_price_reads_do_no_channel_work(self):
+        quote_cache.invalidate()
+        with mock.patch('stocks.utils.fetch_quote', return_value=101.0), \
+                mock.patch.object(InMemoryChannelLayer, 'group_send') as group_send:
+            self.assertEqual(get_live_stock_price('NOCHAN'), 101.0)
+        group_send.assert_not_called()
+
+
+@override_settings(PRICE_BROADCASTER={'SOURCE': 'stocks.broadcaster.YahooPriceSource', 'INTERVAL': 5,
+                                      'LEASE': 60, 'FRAME_INTERVAL': 0.2, 'IN_PROCESS': False})
+class DashboardConsumerTests(TransactionTestCase):
+    async def test_subscribes_holdings_and_coalesces_ticks(self):
+        user = await User.objects.acreate(email='ws@example.com')
+        stock = await Stock.objects.acreate(symbol='INFY.NS', name='Infosys')
+        await Stock.objects.acreate(symbol='TCS.NS', name='Tata Consultancy Services')
+        await Stock.objects.acreate(symbol='BAJAJHLDNG-SUFFIXED.NS', name='Bajaj Holdings')
+        await Portfolio.objects.acreate(user=user, stock=stock, quantity=Decimal('2'), average_price=Decimal('10'))
+
+        # channels.testing needs daphne; drive the ASGI websocket protocol directly
+        communicator = ApplicationCommunicator(DashboardConsumer.as_asgi(), {
+            'type': 'websocket', 'path': '/ws/dashboard/', 'headers': [], 'subprotocols': [], 'user': user,
+        })
+        await communicator.send_input({'type': 'websocket.connect'})
+        self.assertEqual((await communicator.receive_output(1))['type'], 'websocket.accept')
+
+        layer = get_channel_layer()
+        subscribe = await layer.receive(BROADCASTER_CHANNEL)
+        self.assertEqual((subscribe['type'], subscribe['symbols']), ('subscribe', ['INFY.NS']))
+
+        # Only catalog symbols reach the broadcaster
+        await communicator.send_input({'type': 'websocket.receive', 'text': json.dumps(
+            {'action': 'subscribe', 'symbols': ['tcs.ns', 'NOT-A-STOCK', 'BAJAJHLDNG-SUFFIXED.NS']})})
+        self.assertEqual(json.loads((await communicator.receive_output(1))['text']),
+                         {'subscribed': ['BAJAJHLDNG-SUFFIXED.NS', 'INFY.NS', 'TCS.NS'], 'unknown': ['NOT-A-STOCK']})
+        self.assertEqual(sorted((await layer.receive(BROADCASTER_CHANNEL))['symbols']),
+                         ['BAJAJHLDNG-SUFFIXED.NS', 'TCS.NS'])
+
+        async def tick(symbol, price):
+            await layer.group_send(quote_group(symbol), {'type': 'price.update', 'symbol': symbol, 'price': price})
+
+        await tick('INFY.NS', 1500.0)
+        frame = await communicator.receive_output(1)
+        self.assertEqual(json.loads(frame['text']), {'quotes': {'INFY.NS': 1500.0}})
+
+        # A burst inside one frame interval goes out as a single frame with the latest prices
+        await tick('INFY.NS', 1501.0)
+        await tick('WIPRO.NS', 400.0)  # not watched
+        await tick('INFY.NS', 1502.0)
+        await tick('TCS.NS', 3900.0)
+        frame = await communicator.receive_output(1)
+        self.assertEqual(json.loads(frame['text']), {'quotes': {'INFY.NS': 1502.0, 'TCS.NS': 3900.0}})
+        self.assertTrue(await communicator.receive_nothing(0.3))
+
+        await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await communicator.wait(1)
+        unsubscribe = await layer.receive(BROADCASTER_CHANNEL)
+        self.assertEqual(unsubscribe['type'], 'unsubscribe')
+
+
+class PriceFrameTests(SimpleTestCase):
+    @override_settings(PRICE_BROADCASTER={**settings.PRICE_BROADCASTER, 'FRAME_INTERVAL': 0.05})
+    async def test_ticks_arriving_during_a_send_get_their_own_frame(self):
+        consumer = DashboardConsumer()
+        consumer.symbols = {'INFY.NS'}
+        consumer.pending = {}
+        consumer.flusher = None
+        consumer.last_frame = float('-inf')
+        frames = []
+
+        async def send(text):
+            frames.append(json.loads(text))
+            if len(frames) == 1:
+                # The next tick lands while this frame is still going out
+                await consumer.price_update({'symbol': 'INFY.NS', 'price': 1501.0})
+
+        consumer.send = send
+        await consumer.price_update({'symbol': 'INFY.NS', 'price': 1500.0})
+        for _ in range(50):
+            if len(frames) == 2:
+                break
+            await asyncio.sleep(0.01)
+
+        self.assertEqual(frames, [{'quotes': {'INFY.NS': 1500.0}}, {'quotes': {'INFY.NS': 1501.0}}])
+        self.assertIsNone(consumer.flusher)
+
+
+class SQLiteChannelLayerTests(SimpleTestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'channels.sqlite3')
+
+    def layer(self, **config):
+        # Each instance stands in for one worker process sharing the file
+        return SQLiteChannelLayer(self.path, poll_interval=0.01, **config)
+
+    async def test_groups_reach_channels_in_other_processes(self):
+        a, b = self.layer(), self.layer()
+        try:
+            await self.check_groups(a, b)
+        finally:
+            await a.close()
+            await b.close()
+
+    async def check_groups(self, a, b):
+        alice, bob = await a.new_channel(), await b.new_channel()
+        await a.group_add('quote.INFY.NS', alice)
+        await b.group_add('quote.INFY.NS', bob)
+
+        await a.group_send('quote.INFY.NS', {'type': 'price.update', 'price': 1500.0})
+        self.assertEqual((await b.receive(bob))['price'], 1500.0)
+        self.assertEqual((await a.receive(alice))['price'], 1500.0)
+
+        await b.group_discard('quote.INFY.NS', bob)
+        await b.send('price-broadcaster', {'type': 'subscribe', 'n': 1})
+        await a.group_send('quote.INFY.NS', {'type': 'price.update', 'price': 1501.0})
+        self.assertEqual((await a.receive(alice))['price'], 1501.0)
+        self.assertEqual(await a.receive('price-broadcaster'), {'type': 'subscribe', 'n': 1})
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(b.receive(bob), 0.1)
+
+    async def test_channels_are_bounded_and_expire(self):
+        layer = self.layer(capacity=2, expiry=0.2)
+        try:
+            await layer.send('jobs', {'type': 'a'})
+            await layer.send('jobs', {'type': 'b'})
+            with self.assertRaises(ChannelFull):
+                await layer.send('jobs', {'type': 'c'})
+
+            # group_send skips full channels instead of raising
+            await layer.group_add('all', 'jobs')
+            await layer.group_send('all', {'type': 'd'})
+            self.assertEqual((await layer.receive('jobs'))['type'], 'a')
+
+            await asyncio.sleep(0.25)
+            await layer.send('jobs', {'type': 'e'})
+            self.assertEqual((await layer.receive('jobs'))['type'], 'e')
+        finally:
+            await layer.close()
+
+
+    async def test_abandoned_local_channels_are_evicted(self):
+        layer = self.layer(expiry=0.2)
+        try:
+            alive, dead = await layer.new_channel(), await layer.new_channel()
+            for channel in (alive, dead):
+                await layer.group_add('quote.INFY.NS', channel)
+            received = asyncio.ensure_future(layer.receive(alive))
+            await asyncio.sleep(0.05)
+            await layer.group_send('quote.INFY.NS', {'type': 'price.update', 'price': 1500.0})
+            self.assertEqual((await asyncio.wait_for(received, 1))['price'], 1500.0)
+            self.assertIn(dead, layer._local)
+
+            # Past expiry and the next cleanup: nobody ever read `dead`
+            await asyncio.sleep(1.3)
+            self.assertEqual(layer._local, {})
+            members = await layer._run(lambda: [row[0] for row in layer._db.execute(
+                'SELECT channel FROM channel_groups')])
+            self.assertEqual(members, [alive])
+
+            received = asyncio.ensure_future(layer.receive(alive))
+            await layer.group_send('quote.INFY.NS', {'type': 'price.update', 'price': 1501.0})
+            self.assertEqual((await asyncio.wait_for(received, 1))['price'], 1501.0)
+        finally:
+            await layer.close()
+
+
+class PriceHistoryTests(TestCase):
+    def setUp(self):
+        self.stock = Stock.objects.create(symbol='TCS.NS', name='Tata Consultancy Services')
+        self.client = APIClient()
+
+    def test_ingest_csv_upserts_and_skips_bad_rows(self):
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(handle, 'w') as f:
+            f.write(
+                'Date,Open,High,Low,Close,Adj Close,Volume\n'
+                '2024-01-01,100,110,95,105.126,105,1000\n'
+                '2024-01-02,,,,,,\n'
+                '2024-01-03,105,108,101,107,107,2000\n'
+            )
+        self.addCleanup(os.remove, path)
+
+        out = StringIO()
+        call_command('ingest_price_bars', path, interval='1d', symbol='TCS', stdout=out)
+        call_command('ingest_price_bars', path, interval='1d', symbol='TCS', stdout=StringIO())
+
+        self.assertIn('Loaded 2 1d bars (1 rows skipped)', out.getvalue())
+        bars = list(PriceBar.objects.order_by('ts').values_list('close', 'volume'))
+        self.assertEqual(bars, [(Decimal('105.13'), 1000), (Decimal('107.00'), 2000)])
+
+    def test_ingest_writes_a_repeated_bar_once_keeping_the_last(self):
+        paths = []
+        for text in ('Date,Open,High,Low,Close,Volume\n2024-01-01,100,110,95,105,1000\n'
+                     '2024-01-01,100,110,95,106,1100\n2024-01-02,106,108,101,107,2000\n',
+                     'Date,Open,High,Low,Close,Volume\n2024-01-02,106,108,101,108,2100\n'):
+            handle, path = tempfile.mkstemp(suffix='.csv')
+            with os.fdopen(handle, 'w') as f:
+                f.write(text)
+            self.addCleanup(os.remove, path)
+            paths.append(path)
+
+        with mock.patch.object(PriceBar.objects, 'bulk_create', wraps=PriceBar.objects.bulk_create) as bulk_create:
+            call_command('ingest_price_bars', *paths, interval='1d', symbol='TCS', stdout=StringIO())
+
+        keys = [(bar.stock_id, bar.interval, bar.ts) for bar in bulk_create.call_args.args[0]]
+        self.assertEqual(len(keys), len(set(keys)))
+        bars = list(PriceBar.objects.order_by('ts').values_list('close', 'volume'))
+        self.assertEqual(bars, [(Decimal('106.00'), 1100), (Decimal('108.00'), 2100)])
+
+    def minute_bars(self, start, count):
+        PriceBar.objects.bulk_create([
+            PriceBar(stock=self.stock, interval='1m', ts=start + timedelta(minutes=i),
+                     open=100 + i, high=101 + i, low=99 + i, close=100.5 + i, volume=10)
+            for i in range(count)
+        ])
+
+    def history(self, **params):
+        response = self.client.get(f'/api/stocks/{self.stock.id}/history/', params)
+        if response.status_code != 200:
+            return response.status_code, response.json()
+        return 200, json.loads(b''.join(response.streaming_content))
+
+    def test_downsamples_minute_bars(self):
+        start = datetime(2024, 3, 1, 9, 15, tzinfo=dt_timezone.utc)
+        self.minute_bars(start, 12)
+
+        status, data = self.history(interval='5m', **{'from': '2024-03-01', 'to': '2024-03-01'})
+        self.assertEqual(status, 200)
+        self.assertEqual(data['interval'], '5m')
+        self.assertEqual([bar['ts'] for bar in data['bars']],
+                         ['2024-03-01T09:15:00+00:00', '2024-03-01T09:20:00+00:00', '2024-03-01T09:25:00+00:00'])
+        self.assertEqual(data['bars'][0], {'ts': '2024-03-01T09:15:00+00:00', 'open': 100.0, 'high': 105.0,
+                                           'low': 99.0, 'close': 104.5, 'volume': 50})
+        self.assertEqual(data['bars'][2]['volume'], 20)
+
+        status, data = self.history(interval='1d', **{'from': '2024-03-01', 'to': '2024-03-02'})
+        self.assertEqual(len(data['bars']), 1)
+        self.assertEqual((data['bars'][0]['open'], data['bars'][0]['close'], data['bars'][0]['volume']),
+                         (100.0, 111.5, 120))
+
+    async def test_streams_chunk_by_chunk_under_asgi(self):
+        start = datetime(2024, 3, 1, 9, 15, tzinfo=dt_timezone.utc)
+        await sync_to_async(self.minute_bars)(start, 12)
+        pulled = []
+        real_history = views.price_history
+
+        def price_history(*args, **kwargs):
+            for row in real_history(*args, **kwargs):
+                pulled.append(row)
+                yield row
+
+        with mock.patch('stocks.views.price_history', price_history), mock.patch('stocks.views.HISTORY_CHUNK', 5):
+            response = await AsyncClient().get(f'/api/stocks/{self.stock.id}/history/',
+                                               {'interval': '1m', 'from': '2024-03-01', 'to': '2024-03-01'})
+            self.assertTrue(response.is_async)
+            parts = []
+            async for part in response.streaming_content:
+                parts.append(part)
+                if len(parts) == 2:
+                    # The first page of bars is out before the rest are read
+                    self.assertEqual(len(pulled), 5)
+
+        self.assertEqual(len(parts), 5)  # head, three chunks of bars, tail
+        self.assertEqual(len(json.loads(b''.join(parts))['bars']), 12)
+
+    def test_rejects_bad_parameters(self):
+        self.assertEqual(self.history(interval='2m')[0], 400)
+        self.assertEqual(self.history(**{'from': 'yesterday'})[0], 400)
+        self.assertEqual(self.history(**{'from': '2024-03-02', 'to': '2024-03-01'})[0], 400)
+
+
+class PortfolioSnapshotTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='snap@example.com', password='pass')
+        self.stock = Stock.objects.create(symbol='TCS.NS', name='Tata Consultancy Services')
+        self.trade('BUY', 10, 100, 1)
+        self.sell = self.trade('SELL', 4, 120, 3)
+        for day, close in ((2, 110), (4, 130)):
+            PriceBar.objects.create(stock=self.stock, interval='1d', ts=self.at(day),
+                                    open=close, high=close, low=close, close=close)
+
+    def at(self, day):
+        return datetime(2024, 1, day, 10, tzinfo=dt_timezone.utc)
+
+    def trade(self, kind, quantity, price, day):
+        return Transaction.objects.create(user=self.user, stock=self.stock, transaction_type=kind,
+                                          quantity=quantity, price=price, date=self.at(day))
+
+    def snapshot(self, until):
+        out = StringIO()
+        call_command('snapshot_portfolios', date=until, stdout=out)
+        return out.getvalue()
+
+    def values(self):
+        return {s.date.day: (s.market_value, s.cost_basis, s.realized_pnl, s.unrealized_pnl)
+                for s in PortfolioSnapshot.objects.filter(user=self.user)}
+
+    def test_values_each_day_at_carried_forward_closes(self):
+        self.assertIn('Wrote 5 snapshots for 1 users', self.snapshot('2024-01-05'))
+        D = Decimal
+        self.assertEqual(self.values(), {
+            1: (D('1000'), D('1000'), D('0'), D('0')),  # no close yet: last trade price
+            2: (D('1100'), D('1000'), D('0'), D('100')),
+            3: (D('660'), D('600'), D('80'), D('60')),  # no bar: 2nd's close carried forward
+            4: (D('780'), D('600'), D('80'), D('180')),
+            5: (D('780'), D('600'), D('80'), D('180')),
+        })
+
+    def test_later_runs_only_redo_changed_days(self):
+        self.snapshot('2024-01-05')
+        self.assertIn('Wrote 0 snapshots for 0 users', self.snapshot('2024-01-05'))
+        self.assertIn('Wrote 1 snapshots for 1 users', self.snapshot('2024-01-06'))
+
+        PortfolioSnapshot.objects.filter(user=self.user, date__day=2).update(market_value=0)
+        self.trade('BUY', 5, 90, 4)  # backdated import
+        self.assertIn('Wrote 3 snapshots', self.snapshot('2024-01-06'))
+        self.assertEqual(self.values()[2][0], 0)  # days before the new trade untouched
+        self.assertEqual(self.values()[4][:2], (Decimal('1430'), Decimal('1050')))
+
+        self.sell.delete()
+        self.assertIn('Wrote 6 snapshots', self.snapshot('2024-01-06'))
+        self.assertEqual(self.values()[2][0], Decimal('1100'))
+
+    def test_edited_trades_are_recomputed(self):
+        self.snapshot('2024-01-05')
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        response = client.patch(f'/api/transactions/{self.sell.id}/', {'quantity': '6'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Wrote 5 snapshots', self.snapshot('2024-01-05'))
+        self.assertEqual(self.values()[3], (Decimal('440'), Decimal('400'), Decimal('120'), Decimal('40')))
+
+        # An edit alongside a new trade still rebuilds from the first trade
+        self.trade('BUY', 5, 90, 5)
+        client.patch(f'/api/transactions/{self.sell.id}/', {'transaction_type': 'BUY'}, format='json')
+        self.assertIn('Wrote 5 snapshots', self.snapshot('2024-01-05'))
+        self.assertEqual(self.values()[3][:3], (Decimal('1760'), Decimal('1720'), Decimal('0')))
+
+    def test_history_endpoint(self):
+        today = timezone.localdate()
+        for days_ago in (400, 10, 1):
+            PortfolioSnapshot.objects.create(user=self.user, date=today - timedelta(days=days_ago),
+                                             market_value=days_ago, cost_basis=0, realized_pnl=0, unrealized_pnl=0)
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        response = client.get('/api/portfolio/history/')
+        self.assertEqual([s['market_value'] for s in response.json()['snapshots']], ['10.00', '1.00'])
+        response = client.get('/api/portfolio/history/', {'range': 'all'})
+        self.assertEqual(len(response.json()['snapshots']), 3)
+        self.assertEqual(client.get('/api/portfolio/history/', {'range': '2w'}).status_code, 400)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='pages@example.com', password='pass')
+        self.stock = Stock.objects.create(symbol='TCS.NS', name='Tata Consultancy Services', current_price=10)
+        when = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        # Pairs of trades share a timestamp, so pages must break ties on id
+        Transaction.objects.bulk_create([
+            Transaction(user=self.user, stock=self.stock, transaction_type='BUY', quantity=1, price=10,
+                        date=when + timedelta(days=i // 2))
+            for i in range(7)
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_pages_through_transactions_newest_first(self):
+        expected = list(Transaction.objects.order_by('-date', '-id').values_list('id', flat=True))
+        seen, pages = [], []
+        url = '/api/transactions/?page_size=3'
+        while url:
+            page = self.client.get(url).json()
+            pages.append(page)
+            seen += [t['id'] for t in page['results']]
+            url = page['next']
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(pages), 3)
+        self.assertIsNone(pages[0]['previous'])
+
+        back = self.client.get(pages[2]['previous']).json()
+        self.assertEqual([t['id'] for t in back['results']], expected[3:6])
+        self.assertEqual(self.client.get('/api/transactions/?cursor=bogus').status_code, 404)
+
+    def test_sparse_fields(self):
+        Stock.objects.create(symbol='INFY.NS', name='Infosys')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/stocks/', {'fields': 'id,symbol', 'page_size': 1})
+        self.assertEqual(response.json()['results'], [{'id': self.stock.id, 'symbol': 'TCS.NS'}])
+        self.assertIsNotNone(response.json()['next'])
+        self.assertNotIn('current_price', queries[-1]['sql'])
+
+        trades = self.client.get('/api/transactions/', {'fields': 'price'}).json()['results']
+        self.assertEqual(trades[0], {'price': '10.00'})
+
+
+class FastJSONTests(TestCase):
+    def test_list_serializers_match_model_serializers(self):
+        user = User.objects.create_user(email='json@example.com', password='pass')
+        stock = Stock.objects.create(symbol='TCS.NS', name='Tata Consultancy Services')
+        Stock.objects.create(symbol='INFY.NS', name='Infosys', current_price=Decimal('1500.5'))
+        Transaction.objects.create(user=user, stock=stock, transaction_type='BUY', quantity=Decimal('3'),
+                                   price=Decimal('3500.25'), brokerage=Decimal('20'))
+        trade = Transaction(user=user, stock=stock, transaction_type='SELL', quantity=Decimal('10'), price=10,
+                            date=timezone.now())  # unsaved: plain ints, not column-scaled Decimals
+
+        for fast, model, rows in (
+            (StockListSerializer, StockSerializer, list(Stock.objects.all())),
+            (TransactionListSerializer, TransactionSerializer, [*Transaction.objects.all(), trade]),
+        ):
+            self.assertEqual(fast(rows, many=True).data, model(rows, many=True).data)
+
+    def test_renderer_and_parser_match_drf(self):
+        from rest_framework.parsers import JSONParser
+        from rest_framework.renderers import JSONRenderer
+        from .parsers import FastJSONParser
+        from .renderers import FastJSONRenderer
+
+        data = {'price': Decimal('12.50'), 'at': datetime(2024, 1, 1, 9, 15, tzinfo=dt_timezone.utc),
+                'name': 'Bajaj Auto – Series A', 'ids': [1, 2]}
+        expected = JSONRenderer().render(data)
+        self.assertEqual(FastJSONRenderer().render(data), expected)
+        with mock.patch('stocks.renderers.orjson', None):
+            self.assertEqual(FastJSONRenderer().render(data), expected)
+
+        body = b'{"symbol": "TCS", "quantity": 2.5}'
+        self.assertEqual(FastJSONParser().parse(BytesIO(body)), JSONParser().parse(BytesIO(body)))
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(BytesIO(b'{"symbol": '))
+
+
+class AdmissionControlTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='busy@example.com', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        quote_cache.invalidate()
+        self.addCleanup(quote_cache.invalidate)
+
+    def test_token_bucket_refills_at_rate(self):
+        clock = FakeClock()
+        limiter = TokenBucketLimiter(rate=2, burst=2, clock=clock)
+        self.assertEqual([limiter.take('a'), limiter.take('a')], [0, 0])
+        self.assertEqual(limiter.take('a'), 0.5)
+        self.assertEqual(limiter.take('b'), 0)  # buckets are per key
+        clock.now = 0.5
+        self.assertEqual(limiter.take('a'), 0)
+
+    @override_settings(ADMISSION_CONTROL={'RATES': {'live_price': (1, 2), 'dashboard': (1, 1)}})
+    def test_clients_over_their_rate_get_429(self):
+        with mock.patch('stocks.utils.fetch_quote', return_value=100.0):
+            codes = [self.client.get('/api/live-price/TCS.NS/').status_code for _ in range(3)]
+        self.assertEqual(codes, [200, 200, 429])
+
+        with mock.patch('stocks.views.aget_live_stock_prices', new_callable=mock.AsyncMock, return_value={}):
+            self.assertEqual(self.client.get('/api/dashboard/').status_code, 200)
+            response = self.client.get('/api/dashboard/')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+
+    def test_full_upstream_cap_answers_from_cache_or_429(self):
+        clock = FakeClock()
+        with mock.patch('stocks.throttling._upstream', threading.BoundedSemaphore(1)) as slots, \
+                mock.patch.object(quote_cache, '_clock', clock), \
+                mock.patch('stocks.utils.fetch_quote', return_value=100.0) as fetch, \
+                mock.patch('stocks.utils.fetch_quotes', return_value={'INFY.NS': 1500.0}):
+            quote_cache.set('TCS.NS', 3500.0)
+            clock.now = 60  # long past the TTL
+            slots.acquire()  # every slot taken
+
+            self.assertEqual(self.client.get('/api/live-price/TCS.NS/').json()['current_price'], 3500.0)
+            self.assertEqual(self.client.get('/api/live-price/WIPRO.NS/').status_code, 429)
+            self.assertEqual(get_live_stock_prices([('TCS', 'NSE'), ('INFY', 'NSE')]), {'TCS': 3500.0})
+            fetch.assert_not_called()
+
+            slots.release()
+            self.assertEqual(self.client.get('/api/live-price/WIPRO.NS/').json()['current_price'], 100.0)
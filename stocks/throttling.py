@@ -0,0 +1,115 @@
+"""
+Admission control for endpoints that reach out to yfinance.
+
+- Per client token buckets (user, or IP when anonymous) for each endpoint
+  scope in ADMISSION_CONTROL['RATES']: over the rate, requests get a 429
+  with Retry-After straight away.
+- A process-wide cap on upstream price fetches made on behalf of requests
+  (ADMISSION_CONTROL['MAX_UPSTREAM_FETCHES']). A fetch that finds every
+  slot taken fails with UpstreamBusy instead of queueing; the price helpers
+  answer with the last cached price when there is one.
+
+Both are in-process: with several workers, each enforces its own limits.
+"""
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.conf import settings
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+
+_config = getattr(settings, 'ADMISSION_CONTROL', {})
+
+
+class TokenBucketLimiter:
+    """
+    One token bucket per key, refilled at `rate` tokens a second up to
+    `burst`. Past `maxsize` keys the least recently seen bucket is dropped
+    (it comes back full).
+    """
+
+    def __init__(self, rate, burst, maxsize=10000, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self._clock = clock
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def take(self, key):
+        """Take a token for `key`. Returns 0 if admitted, else seconds until a token is due."""
+        with self._lock:
+            now = self._clock()
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+            return wait
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(scope):
+    """The shared limiter for an ADMISSION_CONTROL['RATES'] scope, or None if it isn't limited."""
+    rates = getattr(settings, 'ADMISSION_CONTROL', {}).get('RATES', {})
+    if scope not in rates:
+        return None
+    with _limiters_lock:
+        limiter = _limiters.get(scope)
+        if limiter is None or (limiter.rate, limiter.burst) != tuple(rates[scope]):
+            limiter = _limiters[scope] = TokenBucketLimiter(*rates[scope])
+        return limiter
+
+
+def admit(scope, client):
+    """Take a token for `client` in `scope`: 0 if admitted, else seconds to wait."""
+    limiter = limiter_for(scope)
+    return 0 if limiter is None else limiter.take(client)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """DRF throttle over `admit`, for the class's `scope` or the view's `throttle_scope`."""
+    scope = None
+
+    def allow_request(self, request, view):
+        scope = self.scope or getattr(view, 'throttle_scope', None)
+        user = request.user
+        client = f'user:{user.pk}' if user and user.is_authenticated else f'ip:{self.get_ident(request)}'
+        self.retry_after = admit(scope, client)
+        return not self.retry_after
+
+    def wait(self):
+        return self.retry_after
+
+
+class LivePriceThrottle(TokenBucketThrottle):
+    scope = 'live_price'
+
+
+class UpstreamBusy(Throttled):
+    default_detail = 'Live prices are busy, try again shortly.'
+    default_code = 'upstream_busy'
+
+
+_upstream = threading.BoundedSemaphore(_config.get('MAX_UPSTREAM_FETCHES', 8))
+
+
+@contextmanager
+def upstream_slot():
+    """Hold one of the upstream fetch slots, or raise UpstreamBusy at once if none is free."""
+    if not _upstream.acquire(blocking=False):
+        raise UpstreamBusy(wait=1)
+    try:
+        yield
+    finally:
+        _upstream.release()
@@ -0,0 +1,337 @@
+import threading
+from contextlib import nullcontext
+from decimal import Decimal
+
+from django.db import connection, transaction as db_transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .charges import charges_for, rates_for
+from .gains import LTCG_TAX_RATE, STCG_TAX_RATE, realized_gain, record_realized_gains
+from .models import CapitalGains, CapitalGainsYear, Portfolio, RealizedGain, TaxLot, Transaction
+
+# Backends without SELECT ... FOR UPDATE (SQLite) serialize bookings for the
+# same position in-process instead; striped so unrelated positions rarely wait.
+# These locks don't reach other processes: on SQLite, book trades from a
+# single writer process. Concurrent writers from several processes aren't
+# corrupted, because SQLite locks the whole database, but they fail with
+# "database is locked" instead of queueing.
+_position_locks = [threading.Lock() for _ in range(64)]
+
+
+def position_lock(user_id, stock_id):
+    if connection.features.has_select_for_update:
+        return nullcontext()
+    return _position_locks[hash((user_id, stock_id)) % len(_position_locks)]
+
+
+# Calculate charges safely using Decimal, at the rates in force on the trade date
+def calculate_charges(transaction, commit=True):
+    values = charges_for(
+        transaction.price,
+        transaction.quantity,
+        transaction.transaction_type,
+        rates_for(transaction.date),
+    )
+    for field, value in values.items():
+        setattr(transaction, field, value)
+
+    if commit:
+        transaction.save()
+
+
+def update_portfolio(user, stock, transaction_type, quantity, price):
+    quantity = Decimal(str(quantity))
+    price = Decimal(str(price))
+
+    user_id = getattr(user, 'pk', user)
+    stock_id = getattr(stock, 'pk', stock)
+    bought = transaction_type == 'BUY'
+    portfolio, created = Portfolio.objects.select_for_update().get_or_create(
+        user_id=user_id,
+        stock_id=stock_id,
+        defaults={
+            'quantity': quantity if bought else Decimal('0'),
+            'average_price': price if bought else Decimal('0'),
+        },
+    )
+    if created:
+        return portfolio
+
+    if transaction_type == 'BUY':
+        total_quantity = portfolio.quantity + quantity
+        total_cost = (portfolio.average_price * portfolio.quantity) + (price * quantity)
+
+        portfolio.quantity = total_quantity
+        portfolio.average_price = total_cost / total_quantity if total_quantity != Decimal('0') else Decimal('0')
+
+    elif transaction_type == 'SELL':
+        portfolio.quantity -= quantity
+        if portfolio.quantity < Decimal('0'):
+            portfolio.quantity = Decimal('0')
+
+    portfolio.average_price = round(portfolio.average_price, 2)
+    portfolio.last_updated = timezone.now()
+    Portfolio.objects.filter(pk=portfolio.pk).update(
+        quantity=portfolio.quantity,
+        average_price=portfolio.average_price,
+        last_updated=portfolio.last_updated,
+    )
+    return portfolio
+
+
+def open_tax_lot(transaction):
+    """Record the shares bought by a BUY transaction as a new open lot."""
+    return TaxLot.objects.create(
+        user_id=transaction.user_id,
+        stock_id=transaction.stock_id,
+        buy_transaction=transaction,
+        quantity=transaction.quantity,
+        open_quantity=transaction.quantity,
+        cost=transaction.price,
+        acquired_at=transaction.date,
+    )
+
+
+def process_sell_with_fifo(transaction):
+    # FIFO: oldest open lots first, straight off the (user, stock, is_open, acquired_at) index
+    lots = TaxLot.objects.select_for_update().filter(
+        user_id=transaction.user_id,
+        stock_id=transaction.stock_id,
+        is_open=True,
+    ).order_by('acquired_at', 'id').only('open_quantity', 'cost', 'acquired_at')
+
+    remaining_quantity = Decimal(str(transaction.quantity))
+    consumed = []
+    gains = []
+    for lot in lots:
+        if remaining_quantity <= 0:
+            break
+
+        available_qty = min(lot.open_quantity, remaining_quantity)
+        gains.append(realized_gain(transaction, lot, available_qty))
+
+        remaining_quantity -= available_qty
+        lot.open_quantity -= available_qty
+        lot.is_open = lot.open_quantity > 0
+        consumed.append(lot)
+
+    TaxLot.objects.bulk_update(consumed, ['open_quantity', 'is_open'])
+
+    # Ledger rows plus the CapitalGains / CapitalGainsYear rollups
+    return record_realized_gains(gains)
+
+
+def book_trade(user, stock, transaction_type, quantity, price):
+    """
+    Record one trade and apply it to the portfolio, tax lots and gains in a
+    single DB transaction. Charges are priced before the insert, so a BUY
+    costs three writes: the transaction, the portfolio row and its lot. A
+    SELL costs six: the transaction, the portfolio row, the consumed lots
+    (one UPDATE), the ledger rows (one INSERT) and one upsert into each
+    gains rollup.
+    """
+    trade = Transaction(
+        user=user,
+        stock=stock,
+        transaction_type=transaction_type,
+        quantity=Decimal(str(quantity)),
+        price=Decimal(str(price)),
+    )
+    calculate_charges(trade, commit=False)
+
+    with position_lock(trade.user_id, trade.stock_id), db_transaction.atomic():
+        # Portfolio row lock first: it serializes everything else for this position
+        update_portfolio(user, stock, transaction_type, trade.quantity, trade.price)
+        trade.save()
+
+        if transaction_type == 'BUY':
+            open_tax_lot(trade)
+        elif transaction_type == 'SELL':
+            process_sell_with_fifo(trade)
+
+    return trade
+
+
+class PositionReplay:
+    """
+    Replays one (user, stock) trade history in memory, oldest first,
+    producing the Portfolio quantity/average, tax lots and realized gains
+    the live booking path would have written.
+    """
+
+    def __init__(self, user_id, stock_id):
+        self.user_id = user_id
+        self.stock_id = stock_id
+        self.quantity = Decimal('0')
+        self.average_price = Decimal('0')
+        self.lots = []
+        self.gains = []
+        self.emptied_buy = False  # a BUY consumed down to nothing, see legacy_replays
+        self._next_open = 0  # lots before this index are fully consumed
+
+    def apply(self, trade):
+        quantity = Decimal(str(trade.quantity))
+        price = Decimal(str(trade.price))
+
+        if trade.transaction_type == 'BUY':
+            self.emptied_buy = self.emptied_buy or quantity <= 0
+            total_quantity = self.quantity + quantity
+            total_cost = self.average_price * self.quantity + price * quantity
+            self.quantity = total_quantity
+            self.average_price = round(total_cost / total_quantity, 2) if total_quantity else Decimal('0')
+            self.lots.append(TaxLot(
+                user_id=self.user_id,
+                stock_id=self.stock_id,
+                buy_transaction=trade,
+                quantity=quantity,
+                open_quantity=quantity,
+                cost=price,
+                acquired_at=trade.date,
+            ))
+            return
+
+        self.quantity = max(self.quantity - quantity, Decimal('0'))
+        remaining_quantity = quantity
+        while remaining_quantity > 0 and self._next_open < len(self.lots):
+            lot = self.lots[self._next_open]
+            available_qty = min(lot.open_quantity, remaining_quantity)
+            if available_qty > 0:
+                self.gains.append(realized_gain(trade, lot, available_qty))
+            remaining_quantity -= available_qty
+            lot.open_quantity -= available_qty
+            if lot.open_quantity <= 0:
+                lot.is_open = False
+                self._next_open += 1
+
+
+def _pairs_filter(pairs):
+    """Q matching every (user_id, stock_id) pair, one OR branch per user."""
+    by_user = {}
+    for user_id, stock_id in pairs:
+        by_user.setdefault(user_id, set()).add(stock_id)
+    query = Q()
+    for user_id, stock_ids in by_user.items():
+        query |= Q(user_id=user_id, stock_id__in=stock_ids)
+    return query
+
+
+def write_positions(replays, batch_size=1000):
+    """
+    Replace the derived Portfolio, TaxLot, RealizedGain, CapitalGains and
+    CapitalGainsYear rows of every replayed position. Query count depends on
+    the number of rows written, not on the number of positions.
+    """
+    replays = list(replays)
+    if not replays:
+        return
+    where = _pairs_filter((r.user_id, r.stock_id) for r in replays)
+
+    gains_rollup = {}
+    yearly_rollup = {}
+    for r in replays:
+        for g in r.gains:
+            for rollup, key in ((gains_rollup, (r.user_id, r.stock_id)),
+                                (yearly_rollup, (r.user_id, r.stock_id, g.financial_year))):
+                short_term, long_term = rollup.get(key, (Decimal('0'), Decimal('0')))
+                if g.term == 'STCG':
+                    short_term += g.gain
+                else:
+                    long_term += g.gain
+                rollup[key] = (short_term, long_term)
+
+    def totals(short_term, long_term):
+        return {
+            'realized_gain': short_term + long_term,
+            'short_term_gain': short_term,
+            'long_term_gain': long_term,
+            'tax_liability': short_term * STCG_TAX_RATE + long_term * LTCG_TAX_RATE,
+        }
+
+    now = timezone.now()
+    with db_transaction.atomic():
+        RealizedGain.objects.filter(where).delete()
+        TaxLot.objects.filter(where).delete()
+        CapitalGainsYear.objects.filter(where).delete()
+
+        # Portfolio and CapitalGains rows keep their ids: upsert on the (user, stock) constraint
+        Portfolio.objects.bulk_create(
+            [Portfolio(user_id=r.user_id, stock_id=r.stock_id, quantity=r.quantity,
+                       average_price=r.average_price, last_updated=now) for r in replays],
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['user', 'stock'],
+            update_fields=['quantity', 'average_price', 'last_updated'],
+        )
+
+        # Positions without gains only need a row if one exists already (to zero it)
+        existing = set(CapitalGains.objects.filter(where).values_list('user_id', 'stock_id'))
+        CapitalGains.objects.bulk_create(
+            [CapitalGains(user_id=r.user_id, stock_id=r.stock_id,
+                          **totals(*gains_rollup.get((r.user_id, r.stock_id), (Decimal('0'), Decimal('0')))))
+             for r in replays if (r.user_id, r.stock_id) in gains_rollup or (r.user_id, r.stock_id) in existing],
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['user', 'stock'],
+            update_fields=list(totals(0, 0)),
+        )
+
+        CapitalGainsYear.objects.bulk_create(
+            [CapitalGainsYear(user_id=u, stock_id=s, financial_year=fy, **totals(*amounts))
+             for (u, s, fy), amounts in yearly_rollup.items()],
+            batch_size=batch_size,
+        )
+        TaxLot.objects.bulk_create([lot for r in replays for lot in r.lots], batch_size=batch_size)
+        RealizedGain.objects.bulk_create([g for r in replays for g in r.gains], batch_size=batch_size)
+
+
+class LegacyHistoryError(Exception):
+    """Positions whose history predates tax lots and can't be replayed."""
+
+    def __init__(self, pairs):
+        self.pairs = sorted(pairs)
+        shown = ', '.join(f'user {u} stock {s}' for u, s in self.pairs[:10])
+        super().__init__(
+            f'{len(self.pairs)} positions have BUY quantities reduced by sells from before migration 0009; '
+            f'replaying them would count those sells twice ({shown}{", ..." if len(self.pairs) > 10 else ""}).'
+        )
+
+
+def legacy_replays(replays, new_sells=()):
+    """
+    The replayed positions that still carry history from before migration
+    0009, when a SELL reduced the BUY rows it consumed: replaying those
+    would subtract the sells a second time. Such a position has a BUY
+    consumed down to nothing, or a SELL that closes lots on replay but has
+    no RealizedGain rows (booking and earlier rebuilds always write them).
+    Pass the ids of SELLs inserted but not yet replayed as `new_sells`.
+    Must run before write_positions replaces the ledger.
+    """
+    replays = list(replays)
+    if not replays:
+        return []
+    ledger = set(new_sells)
+    ledger.update(RealizedGain.objects.filter(_pairs_filter((r.user_id, r.stock_id) for r in replays))
+                  .values_list('sell_transaction_id', flat=True).distinct())
+    return [r for r in replays
+            if r.emptied_buy or any(g.sell_transaction_id not in ledger for g in r.gains)]
+
+
+def rebuild_positions(pairs, batch_size=1000, new_sells=()):
+    """
+    Replay every listed (user_id, stock_id) position from its full trade
+    history. Raises LegacyHistoryError, writing nothing, if any of them
+    predates tax lots.
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return []
+    replays = {pair: PositionReplay(*pair) for pair in pairs}
+    trades = Transaction.objects.filter(_pairs_filter(pairs)).order_by('user_id', 'stock_id', 'date', 'id')
+    for trade in trades.iterator(chunk_size=2000):
+        replays[(trade.user_id, trade.stock_id)].apply(trade)
+    legacy = legacy_replays(replays.values(), new_sells)
+    if legacy:
+        raise LegacyHistoryError((r.user_id, r.stock_id) for r in legacy)
+    write_positions(replays.values(), batch_size=batch_size)
+    return list(replays.values())
@@ -23,7 +23,9 @@ from .views import (
     live_price,
     search_stocks,
     PortfolioSummaryView,
-    DashboardView
+    DashboardView,
+    PortfolioHistoryView,
+    quote_cache_stats,
 )
 
 router = routers.DefaultRouter()
@@ -33,9 +35,12 @@ router.register(r'portfolio', PortfolioViewSet)
 router.register(r'capital-gains', CapitalGainsViewSet)
 
 urlpatterns = [
-    path('', include(router.urls)),
+    # Listed before the router so "portfolio/<pk>/" doesn't swallow them
     path('live-price/<str:symbol>/', live_price, name='live-price'),
     path('search-stocks/', search_stocks, name='search-stocks'),
     path('portfolio/summary/', PortfolioSummaryView.as_view(), name='portfolio-summary'),
+    path('portfolio/history/', PortfolioHistoryView.as_view(), name='portfolio-history'),
     path('dashboard/', DashboardView.as_view(), name='dashboard'),
+    path('quote-cache/stats/', quote_cache_stats, name='quote-cache-stats'),
+    path('', include(router.urls)),
 ]
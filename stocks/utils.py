@@ -1,31 +1,137 @@
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
 import yfinance as yf
 
-def get_live_stock_price(symbol, exchange='NSE'):
+from .cache import quote_cache
+from .throttling import UpstreamBusy, upstream_slot
+
+# Tickers per yf.download() call in get_live_stock_prices
+QUOTE_BATCH_SIZE = getattr(settings, 'QUOTE_CACHE', {}).get('BATCH_SIZE', 50)
+
+# Own pool so a page's batches run side by side instead of queueing behind
+# the loop's small default executor
+_quote_pool = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'QUOTE_CACHE', {}).get('FETCH_WORKERS', 16),
+    thread_name_prefix='quotes',
+)
+
+
+def yahoo_ticker(symbol, exchange='NSE'):
+    """Map a Stock symbol to its Yahoo ticker, leaving already-suffixed symbols alone."""
+    if symbol.upper().endswith(('.NS', '.BO')):
+        return symbol
+    suffix = '.NS' if (exchange or 'NSE').upper() == 'NSE' else '.BO'
+    return symbol + suffix
+
+
+def fetch_quote(ticker):
+    """Fetch the latest close for a Yahoo ticker straight from yfinance, or None."""
+    data = yf.Ticker(ticker).history(period="1d")
+    if data.empty:
+        print(f"No data returned for {ticker}")
+        return None
+    return float(data['Close'].iloc[-1])
+
+
+def fetch_quotes(tickers):
+    """Fetch latest closes for many Yahoo tickers with one multi-ticker download."""
+    tickers = list(tickers)
+    if not tickers:
+        return {}
+    data = yf.download(tickers, period="1d", group_by='ticker', threads=True, progress=False)
+    prices = {}
+    if data is None or data.empty:
+        return prices
+    multi = getattr(data.columns, 'nlevels', 1) > 1
+    for ticker in tickers:
+        try:
+            closes = data[ticker]['Close'] if multi else data['Close']
+        except KeyError:
+            continue
+        closes = closes.dropna()
+        if not closes.empty:
+            prices[ticker] = float(closes.iloc[-1])
+    return prices
+
+
+def fetch_quote_for_request(ticker):
+    """fetch_quote within the cap on concurrent upstream fetches (raises UpstreamBusy)."""
+    with upstream_slot():
+        return fetch_quote(ticker)
+
+
+def get_live_stock_price(symbol, exchange='NSE', max_staleness=None):
+    ticker = yahoo_ticker(symbol, exchange)
     try:
-        suffix = '.NS' if exchange.upper() == 'NSE' else '.BO'
-        ticker = yf.Ticker(symbol + suffix)
-        data = ticker.history(period="1d")
-        if not data.empty:
-            price = float(data['Close'].iloc[-1])
-            
-            # Notify dashboard via WebSocket
-            send_dashboard_update(symbol, price)
+        price = quote_cache.get(ticker, lambda: fetch_quote_for_request(ticker), max_staleness=max_staleness)
+        if price is not None:
             return price
-        else:
-            print(f"No data returned for {symbol}{suffix}")
+    except UpstreamBusy:
+        stale, _ = quote_cache.peek(ticker)
+        if stale is not None:
+            return stale
     except Exception as e:
         print(f"Error fetching price for {symbol} ({exchange}): {e}")
     return 0.0
 
 
-def send_dashboard_update(symbol, price):
-    layer = get_channel_layer()
-    async_to_sync(layer.group_send)(
-        f"stocks",  # Your WebSocket group name
-        {
-            "type": "send_update",
-            "message": {"symbol": symbol, "price": price}
-        }
-    )
+def get_live_stock_prices(symbols, max_staleness=None):
+    """
+    Resolve many (symbol, exchange) pairs at once. Returns {symbol: price}
+    for every symbol a price was found for; callers fall back for the rest.
+    """
+    tickers = {}
+    for symbol, exchange in symbols:
+        tickers[yahoo_ticker(symbol, exchange)] = symbol
+
+    busy = []
+
+    def fetch_many(missing):
+        prices = {}
+        for i in range(0, len(missing), QUOTE_BATCH_SIZE):
+            chunk = missing[i:i + QUOTE_BATCH_SIZE]
+            try:
+                with upstream_slot():
+                    prices.update(fetch_quotes(chunk))
+            except UpstreamBusy:
+                busy.extend(chunk)
+            except Exception as e:
+                print(f"Error fetching prices for {', '.join(chunk)}: {e}")
+        return prices
+
+    found = quote_cache.get_many(list(tickers), fetch_many, max_staleness=max_staleness)
+    # Turned away at the fetch cap: the last known price beats none
+    for ticker in busy:
+        stale, _ = quote_cache.peek(ticker)
+        if stale is not None:
+            found[ticker] = stale
+    return {tickers[ticker]: price for ticker, price in found.items()}
+
+
+async def aget_live_stock_prices(symbols, timeout=None, max_staleness=None):
+    """
+    Async get_live_stock_prices with a deadline. Batches of QUOTE_BATCH_SIZE
+    are fetched concurrently, so the wait is the slowest batch rather than
+    their sum; whatever hasn't arrived after `timeout` seconds is left out
+    (the fetch still finishes in the background and warms the cache).
+    """
+    symbols = list(dict.fromkeys(symbols))
+    if not symbols:
+        return {}
+    if timeout is None:
+        timeout = getattr(settings, 'QUOTE_CACHE', {}).get('DEADLINE', 1.5)
+
+    loop = asyncio.get_running_loop()
+    batches = [
+        loop.run_in_executor(_quote_pool, get_live_stock_prices, symbols[i:i + QUOTE_BATCH_SIZE], max_staleness)
+        for i in range(0, len(symbols), QUOTE_BATCH_SIZE)
+    ]
+    done, _ = await asyncio.wait(batches, timeout=timeout)
+
+    prices = {}
+    for batch in done:
+        if batch.exception() is None:
+            prices.update(batch.result())
+    return prices
@@ -1,11 +1,29 @@
+import asyncio
+import json
+import math
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_date, parse_datetime
 from django.shortcuts import render
+from django.views import View
+from rest_framework.exceptions import AuthenticationFailed, NotAuthenticated
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from django.db.models import DecimalField, ExpressionWrapper, F, Q, Sum
+from django.utils import timezone
 from decimal import Decimal
-from datetime import date
+from datetime import date, datetime, timedelta
 from django.db import models
 from decimal import Decimal
-from rest_framework import viewsets
-from .models import Stock, Transaction, Portfolio, CapitalGains
-from .serializers import StockSerializer, TransactionSerializer, PortfolioSerializer, CapitalGainsSerializer
+from rest_framework import status, viewsets
+from rest_framework.parsers import MultiPartParser
+from rest_framework.decorators import action
+from .models import Stock, Transaction, Portfolio, CapitalGains, CapitalGainsYear, PortfolioSnapshot
+from .serializers import StockSerializer, TransactionSerializer, PortfolioSerializer, CapitalGainsSerializer, CapitalGainsYearSerializer, PortfolioSnapshotSerializer, only_requested
+from .serializers import StockListSerializer, TransactionListSerializer
+from .pagination import StockPagination, TransactionPagination
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
 from .services import get_live_stock_price
 from decimal import Decimal
@@ -14,37 +32,102 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from .models import Portfolio, Transaction, Watchlist  # Make sure Watchlist exists
-from .utils import get_live_stock_price  # your live price fetcher
+from .utils import aget_live_stock_prices, get_live_stock_price, get_live_stock_prices  # your live price fetcher
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.generics import ListAPIView
 from .models import Portfolio
 from .serializers import PortfolioSummarySerializer
+from .portfolio import summarize_portfolio
+from .imports import import_trades
+from .parsers import CSVParser, FastJSONParser
+from .renderers import dumps
+from .trading import book_trade
+from .history import DEFAULT_SPAN, INTERVALS, price_history
+
+HISTORY_CHUNK = 500  # bars per streamed chunk
+
+
+def _history_bound(value, end=False):
+    """?from= / ?to= as an aware datetime; a bare date `to` covers that whole day."""
+    if not value:
+        return None
+    try:
+        day = parse_date(value)
+        parsed = None if day else parse_datetime(value)
+    except ValueError:
+        day = parsed = None
+    if day is not None:
+        parsed = datetime.combine(day + timedelta(days=1) if end else day, datetime.min.time())
+    elif parsed is None:
+        raise ValueError(f'Expected an ISO date or datetime, got "{value}".')
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+def _history_json(stock, interval, start, end):
+    head = json.dumps({'symbol': stock.symbol, 'interval': interval})
+    yield head[:-1] + ', "bars": ['
+    chunk, first = [], True
+    for ts, open_, high, low, close, volume in price_history(stock, interval, start, end):
+        chunk.append(json.dumps({'ts': ts.isoformat(), 'open': float(open_), 'high': float(high),
+                                 'low': float(low), 'close': float(close), 'volume': volume}))
+        if len(chunk) >= HISTORY_CHUNK:
+            yield ('' if first else ',') + ','.join(chunk)
+            chunk, first = [], False
+    if chunk:
+        yield ('' if first else ',') + ','.join(chunk)
+    yield ']}'
+
+
+async def _pull_in_thread(chunks):
+    """
+    Async iterator over a sync one, building each chunk in the sync thread
+    (which holds the DB cursor) only when the previous one has been sent.
+    Under ASGI, StreamingHttpResponse collects a sync iterator into a list
+    before sending anything.
+    """
+    done = object()
+    pull = sync_to_async(next, thread_sensitive=True)
+    try:
+        while (chunk := await pull(chunks, done)) is not done:
+            yield chunk
+    finally:
+        await sync_to_async(chunks.close, thread_sensitive=True)()
+
 
 # Stocks CRUD
 class StockViewSet(viewsets.ModelViewSet):
     queryset = Stock.objects.all()
     serializer_class = StockSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = StockPagination
 
-# Calculate charges safely using Decimal
-def calculate_charges(transaction):
-    amount = Decimal(str(transaction.price)) * Decimal(str(transaction.quantity))
-
-    brokerage = min(Decimal('20'), Decimal('0.0003') * amount)
-    stt = Decimal('0.001') * amount
-    gst = Decimal('0.18') * brokerage
-    sebi = Decimal('10') / Decimal('10000000') * amount
-    stamp = Decimal('0.00003') * amount if transaction.transaction_type == 'BUY' else Decimal('0')
-
-    transaction.brokerage = round(brokerage, 2)
-    transaction.stt = round(stt, 2)
-    transaction.gst = round(gst, 2)
-    transaction.sebi_charges = round(sebi, 2)
-    transaction.stamp_duty = round(stamp, 2)
-
-    transaction.save()
+    def get_queryset(self):
+        return only_requested(super().get_queryset(), self.request, 'id')
+
+    def get_serializer_class(self):
+        return StockListSerializer if self.action == 'list' else StockSerializer
+
+    @action(detail=True, methods=['get'])
+    def history(self, request, pk=None):
+        """OHLCV bars for ?from=&to= (ISO dates/datetimes) at ?interval=1m|5m|15m|1h|1d, streamed as JSON."""
+        stock = self.get_object()
+        interval = request.query_params.get('interval', '1d')
+        if interval not in INTERVALS:
+            return Response({'error': f'interval must be one of {", ".join(INTERVALS)}.'}, status=400)
+        try:
+            end = _history_bound(request.query_params.get('to'), end=True) or timezone.now()
+            start = _history_bound(request.query_params.get('from')) or end - DEFAULT_SPAN[interval]
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        if start >= end:
+            return Response({'error': '"from" must be before "to".'}, status=400)
+        # Rows go from the DB cursor to the socket a chunk at a time
+        chunks = _history_json(stock, interval, start, end)
+        if isinstance(request._request, ASGIRequest):
+            chunks = _pull_in_thread(chunks)
+        return StreamingHttpResponse(chunks, content_type='application/json')
 
 from .services import get_live_stock_price
 
@@ -52,66 +135,83 @@ class TransactionViewSet(viewsets.ModelViewSet):
     queryset = Transaction.objects.all()
     serializer_class = TransactionSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = TransactionPagination
 
     def get_queryset(self):
         if self.request.user.is_authenticated:
-            return Transaction.objects.filter(user=self.request.user)
+            trades = Transaction.objects.filter(user=self.request.user)
+            return only_requested(trades, self.request, 'id', 'date')
         return Transaction.objects.none()  
 
+    def get_serializer_class(self):
+        return TransactionListSerializer if self.action == 'list' else TransactionSerializer
+
 
     def perform_create(self, serializer):
         stock = serializer.validated_data['stock']
         stock_symbol = stock.symbol
 
-        # ✅ Fetch live price (fallback to 0)
+        # ✅ Fetch live price (fallback to 0) before opening the DB transaction
         live_price = get_live_stock_price(stock_symbol) or 0
 
-        # ✅ Save transaction with user + live price
-        transaction = serializer.save(user=self.request.user, price=live_price)
-
-        # ✅ Calculate charges (STT, etc.)
-        calculate_charges(transaction)
-
-        # ✅ Update portfolio
-        update_portfolio(
-            user=transaction.user,
-            stock=transaction.stock,
-            transaction_type=transaction.transaction_type,
-            quantity=transaction.quantity,
-            price=transaction.price
+        # ✅ Transaction + charges, portfolio, tax lots and capital gains in one atomic write
+        serializer.instance = book_trade(
+            user=self.request.user,
+            stock=stock,
+            transaction_type=serializer.validated_data['transaction_type'],
+            quantity=serializer.validated_data['quantity'],
+            price=live_price,
         )
 
-        # ✅ Capital Gains for SELL
-        if transaction.transaction_type == 'SELL':
-            portfolio = Portfolio.objects.filter(user=transaction.user, stock=transaction.stock).first()
-            avg_price = portfolio.average_price if portfolio else 0
-
-            update_capital_gains(
-                user=transaction.user,
-                stock=transaction.stock,
-                quantity_sold=transaction.quantity,
-                sell_price=transaction.price,
-                buy_price=avg_price,
-                sell_date=transaction.date
-            )
+    @action(detail=False, methods=['post'], url_path='bulk',
+            parser_classes=[FastJSONParser, CSVParser, MultiPartParser])
+    def bulk(self, request):
+        """Import historical trades (JSON list, text/csv body or a "file" upload) with explicit prices and dates."""
+        rows = request.data
+        upload = request.FILES.get('file') if hasattr(request.data, 'getlist') else None
+        if upload is not None:
+            rows = CSVParser().parse(upload, parser_context={'encoding': 'utf-8-sig'})
+        elif isinstance(rows, dict):
+            rows = rows.get('trades', rows)
+
+        result = import_trades(request.user, rows)
+        return Response(result, status=status.HTTP_400_BAD_REQUEST if result['errors'] else status.HTTP_201_CREATED)
 
-            process_sell_with_fifo(
-                user=transaction.user,
-                stock=transaction.stock,
-                quantity_sold=transaction.quantity,
-                sell_price=transaction.price,
-                sell_date=transaction.date
-            )
-            
 class PortfolioSummaryView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
         user = request.user
-        portfolios = Portfolio.objects.filter(user=user)
-        serializer = PortfolioSummarySerializer(portfolios, many=True)
+        portfolios = list(Portfolio.objects.filter(user=user).select_related('stock'))
+        prices = get_live_stock_prices({(p.stock.symbol, p.stock.exchange) for p in portfolios})
+        rows, totals = summarize_portfolio(portfolios, prices)
+        serializer = PortfolioSummarySerializer(
+            portfolios, many=True, context={'prices': prices, 'summary_rows': rows}
+        )
+        # Plain list by default, as existing clients expect; totals are opt-in
+        if 'totals' in request.query_params.get('include', '').split(','):
+            return Response({'holdings': serializer.data, 'totals': totals})
         return Response(serializer.data)
 
+
+# ?range= -> days back from today (None: everything)
+HISTORY_RANGES = {'1m': 30, '3m': 91, '6m': 182, '1y': 365, '3y': 1096, '5y': 1826, 'all': None}
+
+
+class PortfolioHistoryView(APIView):
+    """Net worth over time, one snapshot per day (see the snapshot_portfolios command)."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        span = request.query_params.get('range', '1y')
+        if span not in HISTORY_RANGES:
+            return Response({'error': f'range must be one of {", ".join(HISTORY_RANGES)}.'}, status=400)
+        snapshots = PortfolioSnapshot.objects.filter(user=request.user)
+        if HISTORY_RANGES[span] is not None:
+            snapshots = snapshots.filter(date__gt=timezone.localdate() - timedelta(days=HISTORY_RANGES[span]))
+        serializer = PortfolioSnapshotSerializer(snapshots.order_by('date'), many=True)
+        return Response({'range': span, 'snapshots': serializer.data})
+
 class PortfolioViewSet(viewsets.ModelViewSet):
     queryset = Portfolio.objects.all()
     serializer_class = PortfolioSerializer
@@ -122,68 +222,44 @@ class CapitalGainsViewSet(viewsets.ModelViewSet):
     serializer_class = CapitalGainsSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
 
-from .models import Portfolio
-
-def update_portfolio(user, stock, transaction_type, quantity, price):
-    portfolio, created = Portfolio.objects.get_or_create(user=user, stock=stock, defaults={
-        'quantity': Decimal('0'),
-        'average_price': Decimal('0')
-    })
-
-    quantity = Decimal(str(quantity))
-    price = Decimal(str(price))
-
-    if transaction_type == 'BUY':
-        total_quantity = portfolio.quantity + quantity
-        total_cost = (portfolio.average_price * portfolio.quantity) + (price * quantity)
-
-        portfolio.quantity = total_quantity
-        portfolio.average_price = total_cost / total_quantity if total_quantity != Decimal('0') else Decimal('0')
-
-    elif transaction_type == 'SELL':
-        portfolio.quantity -= quantity
-        if portfolio.quantity < Decimal('0'):
-            portfolio.quantity = Decimal('0')
-
-    portfolio.save()
-
-from .models import CapitalGains
-
-def update_capital_gains(user, stock, quantity_sold, sell_price, buy_price, sell_date):
-    quantity_sold = Decimal(str(quantity_sold))
-    sell_price = Decimal(str(sell_price))
-    buy_price = Decimal(str(buy_price))
-
-    gain_per_unit = sell_price - buy_price
-    total_gain = gain_per_unit * quantity_sold
-
-    is_short_term = True  # Placeholder logic
-
-    capital_gains, created = CapitalGains.objects.get_or_create(user=user, stock=stock, defaults={
-        'realized_gain': Decimal('0'),
-        'short_term_gain': Decimal('0'),
-        'long_term_gain': Decimal('0'),
-        'tax_liability': Decimal('0'),
-    })
-
-    capital_gains.realized_gain += total_gain
-
-    if is_short_term:
-        capital_gains.short_term_gain += total_gain
-    else:
-        capital_gains.long_term_gain += total_gain
-
-    short_term_tax = Decimal('0.15') * capital_gains.short_term_gain
-    long_term_tax = Decimal('0.10') * capital_gains.long_term_gain
-
-    capital_gains.tax_liability = short_term_tax + long_term_tax
-
-    capital_gains.save()
-
+    def get_queryset(self):
+        if not self.request.user.is_authenticated:
+            return CapitalGains.objects.none()
+        return CapitalGains.objects.filter(user=self.request.user).select_related('stock')
+
+    def list(self, request, *args, **kwargs):
+        # ?financial_year=2025-26 reads that year's precomputed rollup instead of all-time totals
+        year = request.query_params.get('financial_year')
+        if year:
+            rows = CapitalGainsYear.objects.filter(
+                user=request.user, financial_year=year
+            ).select_related('stock') if request.user.is_authenticated else CapitalGainsYear.objects.none()
+            return Response(CapitalGainsYearSerializer(rows, many=True).data)
+        return super().list(request, *args, **kwargs)
+
+    @action(detail=False, methods=['get'], url_path='tax-report', permission_classes=[IsAuthenticated])
+    def tax_report(self, request):
+        years = (
+            CapitalGainsYear.objects.filter(user=request.user)
+            .values('financial_year')
+            .annotate(
+                realized_gain=Sum('realized_gain'),
+                short_term_gain=Sum('short_term_gain'),
+                long_term_gain=Sum('long_term_gain'),
+                tax_liability=Sum('tax_liability'),
+            )
+            .order_by('-financial_year')
+        )
+        return Response(list(years))
 
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
+from rest_framework.permissions import IsAdminUser
+from .cache import quote_cache
+from .throttling import LivePriceThrottle, admit
+from . import search
 
 @api_view(['GET'])
+@throttle_classes([LivePriceThrottle])
 def live_price(request, symbol):
     price = get_live_stock_price(symbol)
     if price is not None:
@@ -191,17 +267,21 @@ def live_price(request, symbol):
     else:
         return Response({'error': 'Unable to fetch price'}, status=400)
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def quote_cache_stats(request):
+    return Response(quote_cache.stats())
+
+@api_view(['GET'])
 def search_stocks(request):
     query = request.GET.get('q', '').strip()
 
     if not query:
         return Response({'error': 'Please provide a search query.'}, status=400)
 
-    stocks = Stock.objects.filter(
-        models.Q(name__icontains=query) | models.Q(symbol__icontains=query)
-    )[:20]  # Limit to top 20 results for performance
+    stocks = search.search_stocks(query, limit=20)  # ranked, top 20
 
-    serializer = StockSerializer(stocks, many=True)
+    serializer = StockSerializer(stocks, many=True, context={'request': request})
     return Response(serializer.data)
 
 
@@ -209,120 +289,134 @@ def search_stocks(request):
 from decimal import Decimal
 from datetime import datetime, date
 
-def process_sell_with_fifo(user, stock, quantity_sold, sell_price, sell_date):
-    buys = Transaction.objects.filter(
-        user=user,
-        stock=stock,
-        transaction_type='BUY',
-        quantity__gt=0
-    ).order_by('date')  # FIFO: oldest first
-
-    remaining_quantity = quantity_sold
-    total_gain = Decimal('0.00')
-    short_term_gain = Decimal('0.00')
-    long_term_gain = Decimal('0.00')
-    for buy in buys:
-        if remaining_quantity <= 0:
-            break
-
-        available_qty = min(buy.quantity, remaining_quantity)
-        buy_price = Decimal(buy.price)
-        gain_per_unit = Decimal(sell_price) - buy_price
-        gain = gain_per_unit * available_qty
-
-        holding_period = (sell_date - buy.date).days
-        if holding_period < 365:
-            short_term_gain += gain
-        else:
-            long_term_gain += gain
-
-        total_gain += gain
-        remaining_quantity -= available_qty
-        buy.quantity -= available_qty  # reduce quantity of the buy transaction
-        buy.save()
-
-    # Update Capital Gains record
-    cap, _ = CapitalGains.objects.get_or_create(user=user, stock=stock)
-    cap.realized_gain += total_gain
-    cap.short_term_gain += short_term_gain
-    cap.long_term_gain += long_term_gain
-    cap.tax_liability = cap.short_term_gain * Decimal('0.15') + cap.long_term_gain * Decimal('0.10')
-    cap.save()
-class DashboardView(APIView):
-    permission_classes = [IsAuthenticated]
-
-    def get(self, request):
-        user = request.user
-        portfolios = Portfolio.objects.filter(user=user, quantity__gt=0).select_related('stock')
-
-        net_worth = Decimal('0')
-        todays_pnl = Decimal('0')
-        alerts = []
-
-        today = date.today()
-
-        # -------------------
-        # Portfolio Calculations
-        # -------------------
-        for p in portfolios:
-            symbol = p.stock.symbol
-            latest_price = get_live_stock_price(symbol) or p.average_price
-            latest_price = Decimal(str(latest_price))  # Convert float to Decimal
-
-            total_value = p.quantity * latest_price
-            net_worth += total_value
-
-            # Today's PnL
-            todays_transactions = Transaction.objects.filter(user=user, stock=p.stock, date=today)
-            for txn in todays_transactions:
-                txn_price = Decimal(str(txn.price))
-                if txn.transaction_type == 'BUY':
-                    todays_pnl -= txn_price * txn.quantity
-                elif txn.transaction_type == 'SELL':
-                    todays_pnl += txn_price * txn.quantity
-
-            # Alerts
-            if latest_price > p.average_price * Decimal('1.05'):
-                alerts.append(f"{symbol} price up by more than 5%")
-            elif latest_price < p.average_price * Decimal('0.95'):
-                alerts.append(f"{symbol} price down by more than 5%")
-
-        alerts = list(dict.fromkeys(alerts))[:5]  # Remove duplicates, max 5
-
-        # -------------------
-        # Watchlist
-        # -------------------
-        watchlist_items = []
-        watchlist_qs = Watchlist.objects.filter(user=user).select_related('stock')
-
-        for w in watchlist_qs:
-            symbol = w.stock.symbol
-            latest_price = get_live_stock_price(symbol) or w.stock.current_price or Decimal('0')
-            latest_price = Decimal(str(latest_price))
-            prev_price = w.stock.current_price or latest_price
-            prev_price = Decimal(str(prev_price))
-
-            change = ((latest_price - prev_price) / prev_price * 100) if prev_price != 0 else Decimal('0')
-
-            watchlist_items.append({
-                "name": w.stock.name,
-                "ticker": symbol,
-                "price": float(latest_price),
-                "change": float(change),
-            })
-
-        # -------------------
-        # Response Data
-        # -------------------
-        data = {
-            "username": user.get_username() or "User",
-            "net_worth": float(net_worth),
-            "equity": float(net_worth),
-            "sip": 0,
-            "mtf": 0,
-            "todays_pnl": float(todays_pnl),
-            "alerts": alerts or ["No alerts for today!"],
-            "watchlist": watchlist_items
-        }
-
-        return Response(data)
+def todays_pnl_for(user, stock_ids):
+    """Net cash flow of today's trades in `stock_ids`, in one grouped query."""
+    if not stock_ids:
+        return Decimal('0')
+
+    amount = ExpressionWrapper(F('price') * F('quantity'), output_field=DecimalField(max_digits=20, decimal_places=4))
+    # A plain range (not date__date) so the (user, stock, date) index applies
+    start = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    rows = (
+        Transaction.objects
+        .filter(user=user, stock_id__in=stock_ids, date__gte=start, date__lt=start + timedelta(days=1))
+        .values('stock_id')
+        .annotate(
+            bought=Sum(amount, filter=Q(transaction_type='BUY'), default=Decimal('0')),
+            sold=Sum(amount, filter=Q(transaction_type='SELL'), default=Decimal('0')),
+        )
+    )
+    return sum((row['sold'] - row['bought'] for row in rows), Decimal('0'))
+
+
+def dashboard_data(user, portfolios, watchlist, prices, todays_pnl):
+    """The dashboard payload from already loaded rows and live prices."""
+    net_worth = Decimal('0')
+    alerts = []
+
+    # -------------------
+    # Portfolio Calculations
+    # -------------------
+    for p in portfolios:
+        symbol = p.stock.symbol
+        # Live price, else the last stored price, else cost
+        latest_price = prices.get(symbol) or p.stock.current_price or p.average_price
+        latest_price = Decimal(str(latest_price))  # Convert float to Decimal
+
+        total_value = p.quantity * latest_price
+        net_worth += total_value
+
+        # Alerts
+        if latest_price > p.average_price * Decimal('1.05'):
+            alerts.append(f"{symbol} price up by more than 5%")
+        elif latest_price < p.average_price * Decimal('0.95'):
+            alerts.append(f"{symbol} price down by more than 5%")
+
+    alerts = list(dict.fromkeys(alerts))[:5]  # Remove duplicates, max 5
+
+    # -------------------
+    # Watchlist
+    # -------------------
+    watchlist_items = []
+
+    for w in watchlist:
+        symbol = w['stock__symbol']
+        latest_price = prices.get(symbol) or w['stock__current_price'] or Decimal('0')
+        latest_price = Decimal(str(latest_price))
+        prev_price = w['stock__current_price'] or latest_price
+        prev_price = Decimal(str(prev_price))
+
+        change = ((latest_price - prev_price) / prev_price * 100) if prev_price != 0 else Decimal('0')
+
+        watchlist_items.append({
+            "name": w['stock__name'],
+            "ticker": symbol,
+            "price": float(latest_price),
+            "change": float(change),
+        })
+
+    # -------------------
+    # Response Data
+    # -------------------
+    return {
+        "username": user.get_username() or "User",
+        "net_worth": float(net_worth),
+        "equity": float(net_worth),
+        "sip": 0,
+        "mtf": 0,
+        "todays_pnl": float(todays_pnl),
+        "alerts": alerts or ["No alerts for today!"],
+        "watchlist": watchlist_items
+    }
+
+
+class DashboardView(View):
+    """
+    Async so one ASGI worker can serve many dashboards while their quotes are
+    in flight. DRF views can't be async, so authentication runs the configured
+    DRF authenticators by hand. Quotes get QUOTE_CACHE['DEADLINE'] seconds;
+    symbols that miss it fall back to Stock.current_price. Each user gets
+    ADMISSION_CONTROL['RATES']['dashboard'] requests before a 429.
+    """
+    authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+
+    @sync_to_async
+    def authenticate(self, request):
+        drf_request = Request(request, authenticators=[auth() for auth in self.authentication_classes])
+        try:
+            user = drf_request.user
+        except AuthenticationFailed as e:
+            return None, e.detail
+        if not user or not user.is_authenticated:
+            return None, NotAuthenticated.default_detail
+        return user, None
+
+    async def get(self, request):
+        user, error = await self.authenticate(request)
+        if user is None:
+            return JsonResponse({'detail': str(error)}, status=401)
+        wait = admit('dashboard', f'user:{user.pk}')
+        if wait:
+            response = JsonResponse({'detail': 'Too many dashboard requests, slow down.'}, status=429)
+            response['Retry-After'] = str(math.ceil(wait))
+            return response
+
+        portfolios = [
+            p async for p in Portfolio.objects.filter(user=user, quantity__gt=0)
+            .select_related('stock')
+            .only('stock_id', 'quantity', 'average_price', 'stock__symbol', 'stock__exchange', 'stock__current_price')
+        ]
+        watchlist = [
+            w async for w in Watchlist.objects.filter(user=user)
+            .values('stock__symbol', 'stock__name', 'stock__exchange', 'stock__current_price')
+        ]
+
+        # Quotes are fetched while today's P&L query runs
+        prices = asyncio.ensure_future(aget_live_stock_prices(
+            {(p.stock.symbol, p.stock.exchange) for p in portfolios}
+            | {(w['stock__symbol'], w['stock__exchange']) for w in watchlist}
+        ))
+        todays_pnl = await sync_to_async(todays_pnl_for)(user, [p.stock_id for p in portfolios])
+
+        data = dashboard_data(user, portfolios, watchlist, await prices, todays_pnl)
+        return HttpResponse(dumps(data), content_type='application/json')
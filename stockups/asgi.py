@@ -10,14 +10,17 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 # stockups/asgi.py
 import os
 from django.core.asgi import get_asgi_application
-from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
-import stocks.routing  # we will create this
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stockups.settings')
+# Set up Django before anything that imports models
+django_asgi_app = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter
+from channels.auth import AuthMiddlewareStack
+import stocks.routing
 
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
+    "http": django_asgi_app,
     "websocket": AuthMiddlewareStack(
         URLRouter(
             stocks.routing.websocket_urlpatterns
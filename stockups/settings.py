@@ -51,11 +51,75 @@ CHANNEL_LAYERS = {
         'BACKEND': 'channels.layers.InMemoryChannelLayer'
     }
 }
+# The in-memory layer only reaches consumers in the same process. With more
+# than one ASGI worker on a host, share a SQLite file instead (no broker), set
+# PRICE_BROADCASTER['IN_PROCESS'] = False and run `manage.py run_price_broadcaster`:
+# CHANNEL_LAYERS = {
+#     'default': {
+#         'BACKEND': 'stocks.channel_layers.SQLiteChannelLayer',
+#         'CONFIG': {'path': BASE_DIR / 'channels.sqlite3'},
+#     }
+# }
+
+# Live quote cache in front of yfinance (seconds / number of tickers)
+QUOTE_CACHE = {
+    'TTL': 15,
+    'MAXSIZE': 4096,
+    'BATCH_SIZE': 50,  # tickers per multi-ticker download
+    'FETCH_WORKERS': 16,  # threads async views fetch batches on
+    'DEADLINE': 1.5,  # seconds an async view waits for quotes before falling back
+}
+
+# Live price pushes (stocks/broadcaster.py). IN_PROCESS starts the broadcaster
+# inside the ASGI worker; with a cross-process CHANNEL_LAYERS backend turn it
+# off and run `manage.py run_price_broadcaster` once instead.
+PRICE_BROADCASTER = {
+    'SOURCE': 'stocks.broadcaster.YahooPriceSource',
+    'INTERVAL': 5,   # seconds between polls
+    'LEASE': 60,     # seconds a subscription lives unless renewed
+    'FRAME_INTERVAL': 1.0,  # min seconds between price frames to one socket
+    'IN_PROCESS': True,
+}
+
+# search_stocks: 'memory' (per-process index) or 'database' (FTS5 / pg_trgm, see stocks/search.py)
+STOCK_SEARCH = {
+    'BACKEND': 'memory',
+    'INDEX_TTL': 300,  # memory index is rebuilt on Stock saves, and at least this often (seconds)
+}
+
+# stocks/throttling.py. RATES: (requests per second, burst) per user (client
+# IP when anonymous) and endpoint. MAX_UPSTREAM_FETCHES: yfinance calls made
+# for requests at once, per process; past it requests get the last cached
+# price or a 429 rather than waiting.
+ADMISSION_CONTROL = {
+    'RATES': {
+        'live_price': (5, 20),
+        'dashboard': (2, 10),
+    },
+    'MAX_UPSTREAM_FETCHES': 8,
+}
+
+# Token -> user lookups remembered by accounts.authentication. Changes made
+# in one worker reach the others' caches within TTL seconds.
+AUTH_CACHE = {
+    'TTL': 60,
+    'MAXSIZE': 10000,
+}
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedTokenAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
+    ],
+    # orjson-backed when it's installed, plain DRF JSON otherwise
+    'DEFAULT_RENDERER_CLASSES': [
+        'stocks.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'stocks.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
 }
 